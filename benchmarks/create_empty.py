@@ -0,0 +1,20 @@
+# Scaling of PatternData.create_empty against grid size.
+# Run from the repository root: python -m benchmarks.create_empty
+import time
+
+from obplanner.model.pattern import PatternData
+
+plate_size = 100.0  # mm
+repeats = 3
+
+print(f"{'type':>11} {'distance [mm]':>14} {'points':>10} {'time [ms]':>10} {'ns/point':>9}")
+for pattern_type in ("square", "triangular"):
+    for point_distance in (1.0, 0.5, 0.2, 0.1, 0.05):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            pattern = PatternData.create_empty(0.0, 0.0, plate_size, plate_size, point_distance,
+                                               pattern_type=pattern_type, rotation_deg=67.0)
+            best = min(best, time.perf_counter() - start)
+        points = pattern.grid.size
+        print(f"{pattern_type:>11} {point_distance:>14} {points:>10} {best * 1e3:>10.1f} {best * 1e9 / points:>9.1f}")
@@ -0,0 +1,54 @@
+# Pattern masking with 1, 10 and 100 components spread over the plate: the previous per-polygon contains_xy
+# over the whole grid against mask_exact and mask_raster. "equal" compares mask_exact with the previous mask,
+# "raster diff" counts the points where mask_raster differs from it (points on a boundary).
+# Run from the repository root: python -m benchmarks.masking
+import time
+
+import numpy as np
+import shapely
+from shapely import contains_xy
+
+from obplanner.model.pattern import PatternData
+from obplanner.pattern.masking import mask_exact, mask_raster
+
+plate_size = 100.0  # mm
+part_radius = 4.0  # mm
+repeats = 3
+
+
+def plate(components: int):
+    # Rings (circles with a hole) on a regular lattice over the plate
+    per_side = int(np.ceil(np.sqrt(components)))
+    pitch = plate_size / per_side
+    centers = [((n % per_side + 0.5) * pitch, (n // per_side + 0.5) * pitch) for n in range(components)]
+    parts = [shapely.Point(c).buffer(part_radius).difference(shapely.Point(c).buffer(part_radius / 3)) for c in centers]
+    return shapely.union_all(parts)
+
+def contains_per_polygon(x, y, geometry):
+    inside = np.zeros_like(x, dtype=bool)
+    for polygon in shapely.get_parts(geometry):
+        inside |= contains_xy(polygon, x, y)
+    return inside
+
+def best_time(function, *args):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+print(f"{'parts':>5} {'distance [mm]':>14} {'points':>10} {'per polygon [ms]':>17} {'mask_exact [ms]':>16} "
+      f"{'mask_raster [ms]':>17} {'equal':>6} {'raster diff':>12}")
+for components in (1, 10, 100):
+    geometry = plate(components)
+    for point_distance in (0.1, 0.05):
+        pattern = PatternData.create_empty(*geometry.bounds, point_distance, rotation_deg=67.0)
+        x, y = pattern.grid["x"], pattern.grid["y"]
+        reference_time, reference = best_time(contains_per_polygon, x, y, geometry)
+        exact_time, inside = best_time(mask_exact, x, y, geometry)
+        raster_time, burned = best_time(mask_raster, x, y, geometry, point_distance, 67.0)
+        print(f"{components:>5} {point_distance:>14} {x.size:>10} {reference_time * 1e3:>17.1f} "
+              f"{exact_time * 1e3:>16.1f} {raster_time * 1e3:>17.1f} {str(np.array_equal(reference, inside)):>6} "
+              f"{np.count_nonzero(burned != reference):>12}")
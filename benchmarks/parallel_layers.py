@@ -0,0 +1,40 @@
+# Speedup of prepare_build against the number of worker processes.
+# Run from the repository root: python -m benchmarks.parallel_layers [layer_height]
+import os
+import sys
+import tempfile
+import time
+
+import py3mf_slicer.load
+import py3mf_slicer.slice
+
+import obplanner.model.pattern as pattern
+from obplanner.model.strategies import Strategy
+from obplanner.model.layer_default import LayerStrategies
+from obplanner.model.build import Build
+from obplanner.main import prepare_build
+
+layer_height = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+geometries = [os.path.join("tests", "geometries", f"test_geometry{i}.stl") for i in (1, 2, 3)]
+model = py3mf_slicer.load.load_files(geometries)
+sliced_model = py3mf_slicer.slice.slice_model(model, layer_height)
+
+pattern_settings = pattern.PatternSettings(point_distance=0.2, type="square", layer_rotation=67.0)
+build = Build(layer_strategies=LayerStrategies(melt=[
+    Strategy(geometry=[0, 1, 2], pattern=pattern_settings, strategy="LineSnake", power=660, spot_size=150, speed=100000),
+    Strategy(geometry=[0, 1, 2], pattern=pattern_settings, strategy="SpotOrdered", power=660, spot_size=150, dwell_time=10000,
+             settings={"x_jump": 2, "y_jump": 2}),
+]))
+
+cores = os.cpu_count() or 1
+worker_counts = [w for w in (1, 2, 4, 8, 16, 32) if w <= cores]
+timings = {}
+for workers in worker_counts:
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        prepare_build(build, sliced_model, tmp, workers=workers)
+        timings[workers] = time.perf_counter() - start
+
+print(f"{'workers':>8} {'time [s]':>10} {'speedup':>8}")
+for workers, t in timings.items():
+    print(f"{workers:>8} {t:>10.2f} {timings[1] / t:>8.2f}")
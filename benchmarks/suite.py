@@ -0,0 +1,303 @@
+# Benchmark suite over the bundled test geometries and synthetic plates with 1, 10 and 100 parts. For every model
+# and point distance it times the slice lookup, generate_pattern for every pattern type, every sort function in
+# strategy_mapping.sort_function_map and OBP writing, and the end-to-end prepare_build per model. The results are
+# stored as JSON together with a digest of every OBP output, and the optimized paths are checked against their
+# reference implementations (mask_exact against contains_xy, sparse and island patterns against the dense grid,
+# compensated sparse patterns against compensated dense ones, obp_writer against obplib.write_obp).
+# With --compare the digests and timings are compared with an earlier result file, a changed digest means that
+# the OBP output is no longer the same.
+# Run from the repository root: python -m benchmarks.suite [-o results.json] [--compare earlier.json] [--quick]
+import argparse
+import dataclasses
+import glob
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import obplib as obp
+import pyvista as pv
+import py3mf_slicer.load
+import py3mf_slicer.slice
+from py3mf_slicer.get_items import get_number_layers, get_py3mf_from_pyvista
+from shapely import contains_xy
+
+import obplanner.obf.obp_writer as obp_writer
+import obplanner.pattern.generator as pattern_generator
+from obplanner.pattern.compensator import compensate_pattern
+from obplanner.main import prepare_build
+from obplanner.model.build import Build
+from obplanner.model.layer_default import LayerStrategies
+from obplanner.model.pattern import PatternSettings
+from obplanner.model.strategies import Strategy
+from obplanner.pattern.grid_cache import grid_cache
+from obplanner.pattern.layer_cache import layer_cache
+from obplanner.strategy.strategy_mapping import sort_function_map
+
+repeats = 3
+plate_size = 150.0  # mm
+part_radius = 5.0  # mm
+# Pattern type and masking of every generate_pattern benchmark
+pattern_cases = [("square", "exact"), ("square", "raster"), ("triangular", "exact"), ("hatch", "exact"),
+                 ("contour", "exact")]
+# Compensation radii (mm), the time should hardly depend on them
+compensation_radii = [0.5, 4.0]
+# Settings of the sort functions, ContourLine runs on contour patterns and all others on square patterns
+strategy_settings = {"SpotRandom": {"seed": 1}, "SpotOrdered": {"x_jump": 2, "y_jump": 2}}
+
+
+def test_geometries():
+    geometries = [os.path.join("tests", "geometries", f"test_geometry{i}.stl") for i in (1, 2, 3)]
+    model = py3mf_slicer.load.load_files(geometries)
+    return py3mf_slicer.slice.slice_model(model, 1.0), [0, 1, 2]
+
+def plate(parts: int):
+    # Cylinders on a regular lattice over the plate, all in one mesh
+    per_side = int(np.ceil(np.sqrt(parts)))
+    pitch = plate_size / per_side
+    meshes = [pv.Cylinder(center=((n % per_side + 0.5) * pitch, (n // per_side + 0.5) * pitch, 1.5),
+                          direction=(0, 0, 1), radius=part_radius, height=3.0, resolution=64) for n in range(parts)]
+    model = get_py3mf_from_pyvista([pv.merge(meshes)])
+    return py3mf_slicer.slice.slice_model(model, 0.5), [0]
+
+def sample_layers(sliced_model, count: int = 3):
+    # Layers spread over the height where all components are sliced
+    layers = min(get_number_layers(sliced_model))
+    return sorted({int(layers * (n + 1) / (count + 1)) for n in range(count)})
+
+def best_time(function, *args, setup=None):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def strategy_for(name: str, components, pattern_settings: PatternSettings) -> Strategy:
+    return Strategy(geometry=components, pattern=pattern_settings, strategy=name, power=660, spot_size=150,
+                    speed=100000, dwell_time=10000, settings=dict(strategy_settings.get(name, {})))
+
+def obp_bytes(path) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        obp_writer.write_obp(path, f"{tmp}/path.obp")
+        with open(f"{tmp}/path.obp", "rb") as f:
+            return f.read()
+
+def obplib_bytes(path) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        obp.write_obp(path.to_obp(), f"{tmp}/path.obp")
+        with open(f"{tmp}/path.obp", "rb") as f:
+            return f.read()
+
+
+def run_stages(model_name, sliced_model, components, point_distances, results, checks):
+    layers = sample_layers(sliced_model)
+    for point_distance in point_distances:
+        case = {"model": model_name, "point_distance": point_distance}
+        # Slice lookup and union, with an empty cache every time
+        seconds = sum(best_time(layer_cache.get_union, sliced_model, i, components, 0.0, setup=layer_cache.clear)[0]
+                      for i in layers)
+        results.append({**case, "stage": "slicing", "name": "get_union", "time": seconds})
+
+        patterns = {}
+        for pattern_type, masking in pattern_cases:
+            settings = PatternSettings(point_distance=point_distance, type=pattern_type, masking=masking,
+                                       layer_rotation=67.0)
+            seconds, points = 0.0, 0
+            output = hashlib.blake2b(digest_size=16)
+            for i in layers:
+                t, pattern = best_time(pattern_generator.generate_pattern, sliced_model, i, components, settings,
+                                       setup=grid_cache.clear)
+                seconds += t
+                points += int(np.count_nonzero(pattern.grid["energy"] > 0))
+                output.update(pattern.grid.tobytes())
+                patterns[(pattern_type, masking, i)] = (settings, pattern)
+            results.append({**case, "stage": "pattern", "name": f"{pattern_type}/{masking}", "time": seconds,
+                            "active_points": points, "digest": output.hexdigest()})
+
+        # The masks of the exact path against a point in polygon test of the whole grid
+        for i in layers:
+            settings, pattern = patterns[("square", "exact", i)]
+            union = layer_cache.get_union(sliced_model, i, components, 0.0)
+            reference = contains_xy(union, pattern.grid["x"], pattern.grid["y"])
+            checks.append({**case, "name": f"mask_exact layer {i}",
+                           "ok": bool(np.array_equal(reference, pattern.grid["energy"] > 0))})
+
+        # The sparse pattern against the exact dense one
+        settings = PatternSettings(point_distance=point_distance, layer_rotation=67.0, sparse=True)
+        seconds, points = 0.0, 0
+        for i in layers:
+            t, pattern = best_time(pattern_generator.generate_pattern, sliced_model, i, components, settings,
+                                       setup=grid_cache.clear)
+            seconds += t
+            points += pattern.count_active()
+            dense = patterns[("square", "exact", i)][1].grid
+            checks.append({**case, "name": f"sparse layer {i}",
+                           "ok": bool(np.array_equal(pattern.to_dense().grid, dense))})
+        results.append({**case, "stage": "pattern", "name": "square/sparse", "time": seconds,
+                        "active_points": points})
+
+        # The island sub-grids against the exact dense grid
+        settings = PatternSettings(point_distance=point_distance, layer_rotation=67.0, islands=True)
+        seconds, points = 0.0, 0
+        for i in layers:
+            t, pattern = best_time(pattern_generator.generate_pattern, sliced_model, i, components, settings,
+                                       setup=grid_cache.clear)
+            seconds += t
+            points += pattern.count_active()
+            dense = patterns[("square", "exact", i)][1].grid
+            checks.append({**case, "name": f"islands layer {i}",
+                           "ok": bool(np.array_equal(pattern.to_dense().grid, dense))})
+        results.append({**case, "stage": "pattern", "name": "square/islands", "time": seconds,
+                        "active_points": points})
+
+        # Compensation of a copy of the exact square pattern, the sparse pattern is compensated in the same way
+        for radius in compensation_radii:
+            compensation = {"fill_radius": radius, "fill_weight": 0.3, "edge_distance": radius, "edge_weight": 0.2,
+                            "overhang_radius": radius, "overhang_weight": 0.3}
+            seconds = 0.0
+            for i in layers:
+                settings, pattern = patterns[("square", "exact", i)]
+
+                def compensate():
+                    copy = dataclasses.replace(pattern, grid=pattern.grid.copy())
+                    return compensate_pattern(copy, compensation, sliced_model, i, components)
+
+                t, compensated = best_time(compensate)
+                seconds += t
+                sparse = pattern_generator.generate_pattern(sliced_model, i, components,
+                                                            dataclasses.replace(settings, sparse=True))
+                sparse = compensate_pattern(sparse, compensation, sliced_model, i, components)
+                checks.append({**case, "name": f"compensated sparse layer {i} radius {radius}",
+                               "ok": bool(np.array_equal(sparse.to_dense().grid, compensated.grid))})
+            results.append({**case, "stage": "compensate", "name": f"radius {radius}", "time": seconds})
+
+        for name, sort_function in sort_function_map.items():
+            pattern_type = "contour" if name == "ContourLine" else "square"
+            seconds, write_seconds, elements = 0.0, 0.0, 0
+            output = hashlib.blake2b(digest_size=16)
+            for i in layers:
+                settings, pattern = patterns[(pattern_type, "exact", i)]
+                strategy = strategy_for(name, components, settings)
+                t, path = best_time(sort_function, pattern, strategy)
+                seconds += t
+                elements += len(path)
+                t, data = best_time(obp_bytes, path)
+                write_seconds += t
+                output.update(data)
+                # The writer against obplib on the coarsest grid (obplib is slow on large paths)
+                if point_distance == max(point_distances):
+                    checks.append({**case, "name": f"obp_writer {name} layer {i}", "ok": data == obplib_bytes(path)})
+            results.append({**case, "stage": "strategy", "name": name, "time": seconds, "elements": elements})
+            results.append({**case, "stage": "write", "name": name, "time": write_seconds,
+                            "digest": output.hexdigest()})
+
+def run_build(model_name, sliced_model, components, point_distance, results):
+    # Every strategy in one build, once per layer
+    strategies = []
+    for name in sort_function_map:
+        pattern_type = "contour" if name == "ContourLine" else "square"
+        settings = PatternSettings(point_distance=point_distance, type=pattern_type, layer_rotation=67.0)
+        strategies.append(strategy_for(name, components, settings))
+    build = Build(layer_strategies=LayerStrategies(melt=strategies))
+    with tempfile.TemporaryDirectory() as tmp:
+        layer_cache.clear()
+        grid_cache.clear()
+        start = time.perf_counter()
+        obf_path = prepare_build(build, sliced_model, tmp)
+        seconds = time.perf_counter() - start
+        output = hashlib.blake2b(digest_size=16)
+        for file in sorted(glob.glob(f"{obf_path}/obp/*.obp")):
+            with open(file, "rb") as f:
+                output.update(os.path.basename(file).encode() + f.read())
+        with open(f"{obf_path}/buildInfo.json", "rb") as f:
+            output.update(f.read())
+    results.append({"model": model_name, "point_distance": point_distance, "stage": "build",
+                    "name": "prepare_build", "time": seconds, "digest": output.hexdigest()})
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {"created": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count()}
+
+def compare(results, earlier_path, threshold: float = 1.2):
+    # Timing ratios and output digests against an earlier result file, returns the number of changed outputs.
+    # Digests only exist for the stages with an output (patterns, OBP files and builds).
+    with open(earlier_path) as f:
+        earlier = {result_key(r): r for r in json.load(f)["results"]}
+    changed = 0
+    print(f"\n{'model':>12} {'distance':>9} {'stage':>9} {'name':>20} {'before [ms]':>12} {'now [ms]':>10} "
+          f"{'ratio':>6}  output")
+    for result in results:
+        before = earlier.get(result_key(result))
+        if before is None:
+            continue
+        ratio = result["time"] / before["time"] if before["time"] > 0 else float("nan")
+        output = "-"
+        if "digest" in result:
+            same = before.get("digest") == result["digest"]
+            changed += not same
+            output = "same" if same else "CHANGED"
+        flag = " slower" if ratio > threshold else ""
+        print(f"{result['model']:>12} {result['point_distance']:>9} {result['stage']:>9} {result['name']:>20} "
+              f"{before['time'] * 1e3:>12.1f} {result['time'] * 1e3:>10.1f} {ratio:>6.2f}  {output}{flag}")
+    return changed
+
+def result_key(result):
+    return result["model"], result["point_distance"], result["stage"], result["name"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite of the obplanner stages")
+    parser.add_argument("-o", "--output", help="Result file (default benchmark_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare timings and output digests with")
+    parser.add_argument("--quick", action="store_true", help="Coarse point distances and no 100 part plate")
+    args = parser.parse_args(argv)
+
+    point_distances = [0.5] if args.quick else [0.5, 0.2, 0.1]
+    models = [("geometries", test_geometries)]
+    part_counts = (1, 10) if args.quick else (1, 10, 100)
+    models += [(f"plate_{parts}", lambda parts=parts: plate(parts)) for parts in part_counts]
+
+    results, checks = [], []
+    for model_name, load in models:
+        print(f"Benchmarking {model_name}")
+        sliced_model, components = load()
+        run_stages(model_name, sliced_model, components, point_distances, results, checks)
+        run_build(model_name, sliced_model, components, max(point_distances), results)
+
+    print(f"{'model':>12} {'distance':>9} {'stage':>9} {'name':>20} {'time [ms]':>10}")
+    for result in results:
+        print(f"{result['model']:>12} {result['point_distance']:>9} {result['stage']:>9} {result['name']:>20} "
+              f"{result['time'] * 1e3:>10.1f}")
+    failed = [check for check in checks if not check["ok"]]
+    print(f"\nEquivalence checks: {len(checks) - len(failed)}/{len(checks)} passed")
+    for check in failed:
+        print(f"  FAILED {check['model']} {check['point_distance']} {check['name']}")
+
+    report = {**environment(), "results": results, "checks": checks}
+    output = args.output or f"benchmark_{report['commit'] or 'results'}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    changed = compare(results, args.compare) if args.compare else 0
+    return 1 if failed or changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
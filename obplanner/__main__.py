@@ -0,0 +1,87 @@
+import argparse
+
+import py3mf_slicer.load
+
+from obplanner.model.build import Build
+from obplanner.model.estimate import BuildEstimate, DEFAULT_JUMP_SPEED
+from obplanner.main import prepare_build, update_build
+from obplanner.pattern.layer_source import LazySlicedModel
+from obplanner.pattern.slice_cache import SliceCache, DEFAULT_CACHE_DIR
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="obplanner", description="Generate an OBF build from a Build json file.")
+    parser.add_argument("build", help="Path to the Build json file")
+    parser.add_argument("geometries", nargs="+", help="Geometry files (stl/3mf), one slicestack per file")
+    parser.add_argument("-o", "--output", default=".", help="Folder in which the build directory is created")
+    parser.add_argument("-l", "--layer-height", type=float, default=0.1, help="Layer height in mm")
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="Number of layers sliced ahead in the background (0 = slice when needed)")
+    parser.add_argument("--slice-cache", nargs="?", const=DEFAULT_CACHE_DIR, metavar="DIR",
+                        help=f"Keep the sliced layers between runs in DIR (default {DEFAULT_CACHE_DIR}). The first "
+                             f"run slices all layers before the first layer file is written, and the cached models "
+                             f"are never removed")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes (0 = all cores)")
+    parser.add_argument("-z", "--gzip", action="store_true", help="Write gzip compressed .obp.gz files")
+    parser.add_argument("--dedup", action="store_true", help="Share identical layer OBP files between layers")
+    parser.add_argument("-u", "--update", metavar="OBF", help="Update an existing build directory, only regenerating "
+                                                              "the layer files whose inputs changed")
+    parser.add_argument("--manifest", action="store_true", help="Write the content keys of the layer files to "
+                                                                "inputManifest.json, so that a later --update only "
+                                                                "regenerates the files whose inputs changed")
+    parser.add_argument("--layers", type=layer_range, help="With --update, always regenerate the layers START:STOP")
+    parser.add_argument("--dry-run", nargs="?", const="", metavar="CSV",
+                        help="Only estimate the scan time and energy of the build, optionally writing the per-layer "
+                             "estimate to CSV")
+    parser.add_argument("--jump-speed", type=float, default=DEFAULT_JUMP_SPEED,
+                        help="Jump speed in µm/s used by --dry-run")
+    parser.add_argument("--profile", action="store_true", help="Write the time and element counts of every stage and "
+                                                                 "layer to buildProfile.json/.csv")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="As --profile, also tracing the peak memory of every stage. The tracing slows the "
+                             "stages down, use --profile alone for the times")
+    args = parser.parse_args(argv)
+
+    build = Build.from_json(args.build)
+    model = py3mf_slicer.load.load_files(args.geometries)
+    if args.slice_cache is None:
+        # Layers are sliced as they are generated instead of all before the first one
+        sliced_model = LazySlicedModel(model, args.layer_height, prefetch=args.prefetch)
+    else:
+        # Sliced once per geometry and layer height, later runs read the layers from the cache
+        sliced_model = SliceCache.open(model, args.layer_height, args.slice_cache, prefetch=args.prefetch)
+    if args.dry_run is not None:
+        estimate = prepare_build(build, sliced_model, args.output, workers=args.jobs, dry_run=True,
+                                 jump_speed=args.jump_speed)
+        print_estimate(estimate)
+        if args.dry_run:
+            estimate.to_csv(args.dry_run)
+    elif args.update:
+        update_build(build, sliced_model, args.update, layers=args.layers, workers=args.jobs, compress=args.gzip,
+                     deduplicate=args.dedup, profile=args.profile, profile_memory=args.profile_memory)
+    else:
+        prepare_build(build, sliced_model, args.output, workers=args.jobs, compress=args.gzip,
+                      deduplicate=args.dedup, profile=args.profile, manifest=args.manifest,
+                      profile_memory=args.profile_memory)
+
+
+def print_estimate(estimate: BuildEstimate):
+    total = estimate.total()
+    print(f"Layers: {len(estimate.layers)}")
+    print(f"Spots: {total['spots']}, lines: {total['lines']}")
+    print(f"Line length: {total['line_length'] / 1000:.2f} m, jump length: {total['jump_length'] / 1000:.2f} m")
+    print(f"Beam on time: {total['beam_time']:.1f} s, jump time: {total['jump_time']:.1f} s")
+    print(f"Energy: {total['energy'] / 1000:.2f} kJ")
+    print("Slowest layers:")
+    for row in estimate.slowest(5):
+        print(f"  layer {row['layer']}: {row['beam_time'] + row['jump_time']:.2f} s, {row['energy']:.1f} J")
+
+
+def layer_range(value: str) -> range:
+    # "START:STOP" (STOP excluded) or a single layer
+    start, separator, stop = value.partition(":")
+    return range(int(start), int(stop) if separator else int(start) + 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,77 @@
-from py3mf_slicer.get_items import get_number_layers, get_py3mf_from_pyvista
+from py3mf_slicer.get_items import get_py3mf_from_pyvista
 import py3mf_slicer.slice as slice
-import obplib as obp
-import json
+import math
+import os
+import numpy as np
+import multiprocessing as mp
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pyvista as pv
 from tqdm import tqdm
 
 from obplanner.obf.generate_obf import generate_obf_directories, generate_other_files
+import obplanner.obf.obp_writer as obp_writer
+from obplanner.obf.build_info import BuildInfoWriter
+from obplanner.obf.build_manifest import BuildManifest
+from obplanner.obf.build_profile import (StageTimer, profile_record, write_profile, print_profile_summary,
+                                         trace_memory)
 from obplanner.model.build import Build
 from obplanner.model.strategies import Strategy
 from obplanner.model.single_file import SingleShape
+from obplanner.model.scan_path import ScanPath
+from obplanner.model.estimate import BuildEstimate, estimate_dtype, DEFAULT_JUMP_SPEED
 import obplanner.pattern.generator as pattern_generator
 import obplanner.pattern.compensator as pattern_compensator
 import obplanner.strategy.generate_strategy as generate_strategy
+from obplanner.strategy.content_key import strategy_content_key
+from obplanner.pattern.layer_cache import layer_cache, model_fingerprint, number_layers
+from obplanner.pattern.grid_cache import grid_cache
+import obplanner.pattern.islands as pattern_islands
 
 
-def prepare_build(build_input: Build, sliced_model, path):
-    build_info = {}
+def prepare_build(build_input: Build, sliced_model, path, workers: int = 1, compress: bool = False,
+                  deduplicate: bool = False, dry_run: bool = False, jump_speed: float = DEFAULT_JUMP_SPEED,
+                  profile: bool = False, manifest: bool = False, profile_memory: bool = False):
+    # A dry run only estimates the build, nothing is written
+    if dry_run:
+        return estimate_build(build_input, sliced_model, workers, jump_speed)
     # Create build path
     obf_path = generate_obf_directories(path)
+    # The content keys for inputManifest.json cost time on every layer, only worth it when the build is updated
+    write_build(build_input, sliced_model, obf_path, workers, compress, deduplicate,
+                BuildManifest.load(obf_path) if manifest else BuildManifest(), profile=profile,
+                profile_memory=profile_memory)
+    return obf_path
+
+def update_build(build_input: Build, sliced_model, obf_path, layers=None, workers: int = 1, compress: bool = False,
+                 deduplicate: bool = False, profile: bool = False, profile_memory: bool = False):
+    """
+    Update an existing OBF directory in place. The content keys of all layer files are compared with the
+    manifest written by the previous prepare_build(manifest=True)/update_build and only the OBP files whose
+    strategy or slice inputs changed are generated again, together with every file of the given layers (e.g.
+    range(100, 200)).
+    buildInfo.json and the layer defaults are always rewritten. Without a manifest all layers are generated.
+    """
+    os.makedirs(f"{obf_path}/obp", exist_ok=True)
+    write_build(build_input, sliced_model, obf_path, workers, compress, deduplicate, BuildManifest.load(obf_path),
+                layers, profile, profile_memory)
+    return obf_path
+
+def write_build(build_input: Build, sliced_model, obf_path, workers: int = 1, compress: bool = False,
+                deduplicate: bool = False, manifest: BuildManifest = None, regenerate=None, profile: bool = False,
+                profile_memory: bool = False):
+    """
+    Writes the OBP files and buildInfo.json of a build into obf_path. With profile, the wall time and element
+    counts of every stage of every generated layer file are written to buildProfile.json and buildProfile.csv
+    and the slowest layers are printed. profile_memory (which implies profile) also traces the peak memory of
+    every stage with tracemalloc; tracing slows the stages down unevenly, so the times of such a build are not
+    comparable with those of a build profiled without it. The peaks are 0 without profile_memory.
+    """
+    profile = profile or profile_memory
+    build_info = {}
     # Create start_heat
     if build_input.start_heat is not None:
-        path = prepare_single_obp(build_input.start_heat.shape, obf_path, "start_heat")
+        path = prepare_single_obp(build_input.start_heat.shape, obf_path, "start_heat", compress)
         build_info["startHeat"] = {
             "file": path[0]["file"],
             "temperatureSensor": build_input.start_heat.temp_sensor,
@@ -31,68 +82,333 @@ def prepare_build(build_input: Build, sliced_model, path):
     # Create layer_defaults
     build_info["layerDefaults"] = build_input.layer_default.layer_feed.to_camel_dict()
     if build_input.layer_default.jump_safe is not None:
-        path = prepare_single_obp(build_input.layer_default.jump_safe, obf_path, "jump")
+        path = prepare_single_obp(build_input.layer_default.jump_safe, obf_path, "jump", compress)
         build_info["layerDefaults"]["jumpSafe"] = path
     if build_input.layer_default.spatter_safe is not None:
-        path = prepare_single_obp(build_input.layer_default.spatter_safe, obf_path, "spatter")
+        path = prepare_single_obp(build_input.layer_default.spatter_safe, obf_path, "spatter", compress)
         build_info["layerDefaults"]["spatterSafe"] = path
     if build_input.layer_default.melt is not None:
-        path = prepare_single_obp(build_input.layer_default.melt, obf_path, "melt")
+        path = prepare_single_obp(build_input.layer_default.melt, obf_path, "melt", compress)
         build_info["layerDefaults"]["melt"] = path
     if build_input.layer_default.heat_balance is not None:
-        path = prepare_single_obp(build_input.layer_default.heat_balance, obf_path, "balance")
+        path = prepare_single_obp(build_input.layer_default.heat_balance, obf_path, "balance", compress)
         build_info["layerDefaults"]["heatBalance"] = path
     # Create layer_strategies
     obp_directory = obf_path + r"/obp"
-    num_layers = get_number_layers(sliced_model)
-    layers = []
-    for i in tqdm(range(max(num_layers)), desc="Processing layers", unit="layer"):
-        layer = {}
-        # jump safe
-        for ii, strategy in enumerate(build_input.layer_strategies.jump_safe):
-            path = prepare_layer_obp(strategy, sliced_model, obp_directory, i, ii, "jump")
-            layer.setdefault("jumpSafe", []).append({"file": path, "repetitions": strategy.repetitions})
-        # spatter safe
-        for ii, strategy in enumerate(build_input.layer_strategies.spatter_safe):
-            path = prepare_layer_obp(strategy, sliced_model, obp_directory, i, ii, "spatter")
-            layer.setdefault("spatterSafe", []).append({"file": path, "repetitions": strategy.repetitions})
-        # melt
-        for ii, strategy in enumerate(build_input.layer_strategies.melt):
-            path = prepare_layer_obp(strategy, sliced_model, obp_directory, i, ii, "melt")
-            layer.setdefault("melt", []).append({"file": path, "repetitions": strategy.repetitions})
-        # heat_balance
-        for ii, strategy in enumerate(build_input.layer_strategies.heat_balance):
-            path = prepare_layer_obp(strategy, sliced_model, obp_directory, i, ii, "melt")
-            layer.setdefault("heatBalance", []).append({"file": path, "repetitions": strategy.repetitions})
-        layers.append(layer)
-    build_info["layers"] = layers
-    with open(f"{obf_path}/buildInfo.json", "w") as f:
-        json.dump(build_info, f, indent=2)
+    num_layers = number_layers(sliced_model)
+    manifest = manifest if manifest is not None else BuildManifest()
+    previous_files = dict(manifest.files)
+    profile_records = [] if profile else None
+    layers = iter_layers(build_input, sliced_model, obp_directory, range(max(num_layers)), workers, compress,
+                         deduplicate, manifest, regenerate, profile_records, profile_memory)
+    # Layers are written to buildInfo.json as they are finished
+    tracing = profile_memory and trace_memory()
+    try:
+        with BuildInfoWriter(f"{obf_path}/buildInfo.json", build_info) as build_info_writer:
+            for layer in layers:
+                build_info_writer.add_layer(layer)
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    # Remove the layer files of the previous build that are no longer referenced
+    for file in previous_files.keys() - manifest.files.keys():
+        if os.path.exists(f"{obf_path}/{file}"):
+            os.remove(f"{obf_path}/{file}")
+    if profile:
+        write_profile(obf_path, profile_records)
+        print_profile_summary(profile_records)
     # Create other obf file
     generate_other_files(obf_path)
 
 
+def layer_sections(build_input: Build):
+    # (buildInfo key, file type, strategies) of the strategies that are run on every layer
+    return [
+        ("jumpSafe", "jump", build_input.layer_strategies.jump_safe),
+        ("spatterSafe", "spatter", build_input.layer_strategies.spatter_safe),
+        ("melt", "melt", build_input.layer_strategies.melt),
+        ("heatBalance", "balance", build_input.layer_strategies.heat_balance),
+    ]
+
+def prepare_layer(build_input: Build, sliced_model, obp_directory, i, compress: bool = False, plan: dict = None,
+                  profile: list = None):
+    """
+    Generate the OBP files of one layer and return its buildInfo entry. plan maps (section, strategy index)
+    to (file, generate): the file the entry refers to and whether it has to be generated. Without a plan every
+    file of the layer is generated. A profile record of every generated file is appended to profile.
+    """
+    layer = {}
+    for section, type, strategies in layer_sections(build_input):
+        for ii, strategy in enumerate(strategies):
+            path, generate = plan[(section, ii)] if plan is not None else (None, True)
+            if generate:
+                path = prepare_layer_obp(strategy, sliced_model, obp_directory, i, ii, type, compress, profile)
+            layer.setdefault(section, []).append({"file": path, "repetitions": strategy.repetitions})
+    return layer
+
+def layer_keys(build_input: Build, sliced_model, i, digests: dict = None, previous_digests: dict = None):
+    """
+    Content keys of the entries of a layer and the geometry digests they were computed from, keyed by the
+    selected components ("0,1,2"). Digests that are passed in (previous_digests for layer i - 1) are used instead
+    of reading the slices again. Strategies whose compensation looks at the previous layer also key its digest.
+    """
+    digests = digests or {}
+    previous_digests = previous_digests or {}
+    used = {}
+    previous = {}
+    keys = {}
+    for section, _, strategies in layer_sections(build_input):
+        for ii, strategy in enumerate(strategies):
+            components = ",".join(map(str, strategy.geometry))
+            if components not in used:
+                used[components] = digests.get(components) or layer_cache.get_digest(sliced_model, i, strategy.geometry).hex()
+            previous_digest = None
+            if i > 0 and pattern_compensator.uses_previous_layer(strategy.pattern.compensation):
+                if components not in previous:
+                    previous[components] = (previous_digests.get(components)
+                                            or layer_cache.get_digest(sliced_model, i - 1, strategy.geometry).hex())
+                previous_digest = previous[components]
+            keys[(section, ii)] = strategy_content_key(strategy, i, used[components], previous_digest)
+    return keys, used
+
+def plan_layers(build_input: Build, obp_directory, layer_indices, keys, compress: bool = False,
+                deduplicate: bool = False, existing: dict = None, regenerate=None):
+    """
+    The prepare_layer plan of every layer. A file is kept when the manifest of the existing build (existing, file
+    -> content key) records the same key for it and the layer is not in regenerate. With deduplicate, entries
+    whose key was already seen on an earlier layer refer to the file of that first layer.
+    """
+    types = {section: type for section, type, _ in layer_sections(build_input)}
+    existing = existing or {}
+    regenerate = set(regenerate or ())
+    first = {}
+    plans = []
+    for i, keys_of_layer in zip(layer_indices, keys):
+        plan = {}
+        for (section, ii), key in keys_of_layer.items():
+            if deduplicate and key in first:
+                plan[(section, ii)] = (first[key], False)
+                continue
+            file_name = layer_obp_name(i, types[section], ii, compress)
+            path = f"obp/{file_name}"
+            first.setdefault(key, path)
+            generate = (i in regenerate or existing.get(path) != key
+                        or not os.path.exists(f"{obp_directory}/{file_name}"))
+            plan[(section, ii)] = (path, generate)
+        plans.append(plan)
+    return plans
+
+def iter_layers(build_input: Build, sliced_model, obp_directory, layer_indices, workers: int = 1,
+                compress: bool = False, deduplicate: bool = False, manifest: BuildManifest = None, regenerate=None,
+                profile: list = None, profile_memory: bool = False):
+    """
+    Generate the OBP files for the given layers and yield their buildInfo entries in layer order.
+
+    With workers > 1 the layers are split into contiguous ranges and handed to a process pool.
+    File names only depend on the layer index, so the output is identical to the serial path.
+    The sliced model cannot be pickled, so the workers inherit it by forking; on platforms
+    without fork the layers are processed serially.
+
+    With deduplicate, the content key of every layer file is computed first and layers that would
+    produce an already generated file point to it in buildInfo.json instead.
+
+    When the manifest lists files of an earlier build, the files whose content key is unchanged are kept and
+    only the others (and all files of the layers in regenerate) are generated. The manifest is updated with the
+    keys of the new build once all layers are done. A manifest without a path is not written, then the keys are
+    only computed when deduplicate or regenerate need them.
+
+    When profile is a list, the profile records of the generated files are added to it, with the peak memory of
+    the stages when profile_memory is set.
+    """
+    layer_indices = list(layer_indices)
+    manifest = manifest if manifest is not None else BuildManifest()
+    state = {"build_input": build_input, "sliced_model": sliced_model,
+             "obp_directory": obp_directory, "compress": compress, "profile": profile is not None,
+             "profile_memory": profile is not None and profile_memory, "keys": manifest.path is not None}
+    # Geometry digests of the previous build can be used as long as the slices are the same
+    fingerprint = model_fingerprint(sliced_model)
+    known_geometry = manifest.geometry if manifest.fingerprint == fingerprint else {}
+    executor, workers = _layer_executor(state, workers, len(layer_indices))
+    try:
+        plans = [None] * len(layer_indices)
+        hashed = None
+        if deduplicate or manifest.files or regenerate:
+            known = [(known_geometry.get(str(i)), known_geometry.get(str(i - 1))) for i in layer_indices]
+            hashed = list(_map_layers(executor, workers, state, _layer_keys_task, layer_indices, known, "Hashing layers"))
+            plans = plan_layers(build_input, obp_directory, layer_indices, [keys for keys, _ in hashed], compress,
+                                deduplicate, manifest.files, regenerate)
+            # Files that are about to be overwritten lose their key, so an interrupted update never keeps them
+            for plan in plans:
+                for path, generate in plan.values():
+                    if generate:
+                        manifest.files.pop(path, None)
+            manifest.save()
+
+        files = {}
+        geometry = {}
+        results = _map_layers(executor, workers, state, _prepare_layer_task, layer_indices, plans, "Processing layers")
+        for n, (i, (layer, computed, records)) in enumerate(zip(layer_indices, results)):
+            # Without a plan the keys are computed by the worker after generating the layer
+            computed = computed or (hashed[n] if hashed is not None else None)
+            if computed is not None:
+                keys, digests = computed
+                for section, entries in layer.items():
+                    for ii, entry in enumerate(entries):
+                        files[entry["file"]] = keys[(section, ii)]
+                geometry[str(i)] = digests
+            if profile is not None:
+                profile.extend(records)
+            yield layer
+        manifest.fingerprint = fingerprint
+        manifest.files = files
+        manifest.geometry = geometry
+        manifest.save()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def estimate_build(build_input: Build, sliced_model, workers: int = 1, jump_speed: float = DEFAULT_JUMP_SPEED,
+                   layer_indices=None) -> BuildEstimate:
+    """
+    Dry run of the layer strategies: the patterns and scan paths of every layer are generated as in
+    prepare_build, but instead of writing OBP files their spots, line and jump lengths, beam on time and energy
+    are summed per layer. Jump times use jump_speed (µm/s).
+    """
+    if layer_indices is None:
+        layer_indices = range(max(number_layers(sliced_model)))
+    layer_indices = list(layer_indices)
+    state = {"build_input": build_input, "sliced_model": sliced_model, "jump_speed": jump_speed}
+    executor, workers = _layer_executor(state, workers, len(layer_indices))
+    try:
+        rows = list(_map_layers(executor, workers, state, _estimate_layer_task, layer_indices,
+                                [None] * len(layer_indices), "Estimating layers"))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return BuildEstimate(layers=np.array(rows, dtype=estimate_dtype))
 
-def prepare_layer_obp(strategy: Strategy, sliced_model, obp_directory, layer, strat_numb, type):
+def estimate_layer(build_input: Build, sliced_model, i, jump_speed: float = DEFAULT_JUMP_SPEED) -> tuple:
+    # Row of estimate_dtype for layer i
+    total = dict.fromkeys(estimate_dtype.names[1:], 0)
+    for _, _, strategies in layer_sections(build_input):
+        for strategy in strategies:
+            pattern = pattern_generator.generate_pattern(sliced_model, i, strategy.geometry, strategy.pattern)
+            compensated_pattern = pattern_compensator.compensate_pattern(pattern, strategy.pattern.compensation,
+                                                                         sliced_model, i, strategy.geometry)
+            stats = generate_strategy.create_obp_elements(compensated_pattern, strategy).stats()
+            for name, value in stats.items():
+                total[name] += value * strategy.repetitions
+    total["jump_time"] = total["jump_length"] * 1000 / jump_speed
+    return (i, *total.values())
+
+def _layer_executor(state, workers, layer_count):
+    # Process pool for _map_layers, None when the layers are processed serially
+    if workers is None or workers < 1:
+        workers = os.cpu_count() or 1
+    if workers > 1 and "fork" not in mp.get_all_start_methods():
+        print("Parallel layer generation requires the fork start method, processing layers serially.")
+        workers = 1
+    if workers > 1 and layer_count > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork"),
+                                       initializer=_init_layer_worker, initargs=({**state, "workers": workers},))
+        return executor, workers
+    return None, workers
+
+def _map_layers(executor, workers, state, task, layer_indices, extras, desc):
+    # Run task(state, layer, extra) for every layer and yield the results in layer order
+    items = list(zip(layer_indices, extras))
+    if executor is None:
+        for i, extra in tqdm(items, desc=desc, unit="layer"):
+            yield task(state, i, extra)
+        return
+
+    # A few chunks per worker keeps the pool balanced when layer cost varies along the build
+    chunk_size = max(1, math.ceil(len(items) / (workers * 4)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    finished = {}
+    next_chunk = 0
+    futures = {executor.submit(_run_layer_chunk, task, chunk): n for n, chunk in enumerate(chunks)}
+    with tqdm(total=len(items), desc=desc, unit="layer") as progress:
+        for future in as_completed(futures):
+            n = futures[future]
+            finished[n] = future.result()
+            progress.update(len(chunks[n]))
+            # Hand out the finished chunks in layer order
+            while next_chunk in finished:
+                yield from finished.pop(next_chunk)
+                next_chunk += 1
+
+def _prepare_layer_task(state, i, plan):
+    records = [] if state["profile"] else None
+    if state["profile_memory"]:
+        trace_memory()  # forked workers keep tracing, others start here
+    layer = prepare_layer(state["build_input"], state["sliced_model"], state["obp_directory"], i,
+                          state["compress"], plan, records)
+    if plan is not None or not state["keys"]:
+        return layer, None, records
+    # The slices of the layer are still cached, so the keys for the manifest are cheap here
+    return layer, layer_keys(state["build_input"], state["sliced_model"], i), records
+
+def _estimate_layer_task(state, i, _):
+    return estimate_layer(state["build_input"], state["sliced_model"], i, state["jump_speed"])
+
+def _layer_keys_task(state, i, digests):
+    return layer_keys(state["build_input"], state["sliced_model"], i, *digests)
+
+_worker_state = {}
+
+def _init_layer_worker(state):
+    _worker_state.update(state)
+    # The workers share the memory budget of the empty grid cache
+    grid_cache.set_workers(state["workers"])
+    # and the CPUs, the islands of a pattern are generated one after the other
+    pattern_islands.set_threads(1)
+
+def _run_layer_chunk(task, chunk):
+    return [task(_worker_state, i, extra) for i, extra in chunk]
+
+
+def prepare_layer_obp(strategy: Strategy, sliced_model, obp_directory, layer, strat_numb, type, compress: bool = False,
+                      profile: list = None):
+    timer = StageTimer()
+    # look up the slices, generate_pattern then finds them in the cache
+    with timer.stage("slicing"):
+        layer_cache.get_union(sliced_model, layer, strategy.geometry, strategy.pattern.offset)
     # create pattern
-    pattern = pattern_generator.generate_pattern(sliced_model, layer, strategy.geometry, strategy.pattern)
+    with timer.stage("pattern"):
+        pattern = pattern_generator.generate_pattern(sliced_model, layer, strategy.geometry, strategy.pattern)
     # compensate pattern
-    compensated_patter = pattern_compensator.compensate_pattern(pattern, {}, sliced_model, layer)
+    with timer.stage("compensate"):
+        compensated_patter = pattern_compensator.compensate_pattern(pattern, strategy.pattern.compensation,
+                                                                    sliced_model, layer, strategy.geometry)
     # create obp elements
-    obp_elements = generate_strategy.create_obp_elements(compensated_patter, strategy)
-    #print("obp_elements", obp_elements)
-    # Create backscatter sync points
-    if strategy.backscatter:
-        obp_elements.insert(0, obp.SyncPoint("BseImage", True, 0))
-        obp_elements.insert(0, obp.SyncPoint("BSEGain", True, 0))
-        obp_elements.append(obp.SyncPoint("BseImage", False, 0))
+    order_stats = {} if profile is not None else None
+    with timer.stage("strategy"):
+        scan_path = generate_strategy.create_obp_elements(compensated_patter, strategy, order_stats)
+    if profile is not None:
+        points = {"points": int(np.prod(pattern.shape)), "active_points": pattern.count_active()}
+    # The strategies order the whole layer, so the pattern and the scan path are held at once. Only the
+    # scan path is needed from here on, it is encoded in chunks of obp_writer.CHUNK_SIZE elements.
+    del pattern, compensated_patter
+    # backscatter sync points around the scan path
+    with timer.stage("sync"):
+        elements = list(obp_stream(scan_path, strategy.backscatter))
     # export obp file
-    obp_path = f"{obp_directory}/layer{layer}{type}{strat_numb}.obp"
-    obp.write_obp(obp_elements, obp_path)
+    file_name = layer_obp_name(layer, type, strat_numb, compress)
+    with timer.stage("write"):
+        obp_writer.write_obp(elements, f"{obp_directory}/{file_name}", compress)
+    if profile is not None:
+        stats = scan_path.stats()
+        counts = {**points,
+                  "elements": sum(len(e) for e in elements), "spots": stats["spots"], "lines": stats["lines"],
+                  "bytes": os.path.getsize(f"{obp_directory}/{file_name}"),
+                  "jump_length": round(stats["jump_length"], 3),
+                  "unordered_jump_length": round(order_stats.get("unordered_jump_length", stats["jump_length"]), 3)}
+        profile.append(profile_record(layer, f"obp/{file_name}", timer, counts))
     # return path
-    return f"obp/layer{layer}{type}{strat_numb}.obp"
+    return f"obp/{file_name}"
 
-def prepare_single_obp(single_shape: SingleShape, obp_directory: str, type: str):
+def prepare_single_obp(single_shape: SingleShape, obp_directory: str, type: str, compress: bool = False):
     # create pattern
     if single_shape.shape == "circle":
         mesh = pv.Cylinder(
@@ -115,13 +431,23 @@ def prepare_single_obp(single_shape: SingleShape, obp_directory: str, type: str)
     for i, strategy in enumerate(single_shape.strategies):
         pattern = pattern_generator.generate_pattern(sliced_model, 0, [0], strategy.pattern)
         # create obp elements
-        obp_elements = generate_strategy.create_obp_elements(pattern, strategy)
-        # Create backscatter sync points
-        if strategy.backscatter:
-            obp_elements.insert(0, obp.SyncPoint("BseImage", True, 0))
-            obp_elements.insert(0, obp.SyncPoint("BSEGain", True, 0))
-            obp_elements.append(obp.SyncPoint("BseImage", False, 0))
-        obp_path = f"{obp_directory}/obp/{type}{i}.obp"
-        obp.write_obp(obp_elements, obp_path)
-        my_list.append({"file": f"obp/{type}{i}.obp", "repetitions": strategy.repetitions})
+        scan_path = generate_strategy.create_obp_elements(pattern, strategy)
+        file_name = f"{type}{i}{obp_extension(compress)}"
+        obp_writer.write_obp(obp_stream(scan_path, strategy.backscatter), f"{obp_directory}/obp/{file_name}", compress)
+        my_list.append({"file": f"obp/{file_name}", "repetitions": strategy.repetitions})
     return my_list
+
+def obp_stream(scan_path: ScanPath, backscatter: bool = False):
+    # Elements of one OBP file in write order, with the backscatter sync points around the scan path
+    if backscatter:
+        yield ScanPath.sync("BSEGain", True, 0)
+        yield ScanPath.sync("BseImage", True, 0)
+    yield scan_path
+    if backscatter:
+        yield ScanPath.sync("BseImage", False, 0)
+
+def obp_extension(compress: bool = False) -> str:
+    return ".obp.gz" if compress else ".obp"
+
+def layer_obp_name(layer, type, strat_numb, compress: bool = False) -> str:
+    return f"layer{layer}{type}{strat_numb}{obp_extension(compress)}"
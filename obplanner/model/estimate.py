@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+import numpy as np
+
+# Beam deflection speed used for the jumps between lines and spots when no other speed is given
+DEFAULT_JUMP_SPEED = 50_000_000  # µm/s
+
+estimate_dtype = np.dtype([
+    ("layer", np.int64),
+    ("spots", np.int64),
+    ("lines", np.int64),
+    ("line_length", np.float64),  # mm
+    ("jump_length", np.float64),  # mm
+    ("beam_time", np.float64),    # s
+    ("jump_time", np.float64),    # s
+    ("energy", np.float64),       # J
+])
+
+
+@dataclass
+class BuildEstimate:
+    """
+    Predicted scan statistics of a build without its OBP files, one row of estimate_dtype per layer summed over
+    all layer strategies and their repetitions.
+    """
+    layers: np.ndarray  # 1D structured array of estimate_dtype
+
+    def total(self) -> dict:
+        return {name: self.layers[name].sum().item() for name in estimate_dtype.names if name != "layer"}
+
+    def slowest(self, count: int = 10) -> np.ndarray:
+        """The count layers with the longest beam on and jump time, slowest first."""
+        order = np.argsort(-(self.layers["beam_time"] + self.layers["jump_time"]), kind="stable")
+        return self.layers[order[:count]]
+
+    def to_csv(self, path: str):
+        np.savetxt(path, self.layers, delimiter=",", header=",".join(estimate_dtype.names), comments="",
+                   fmt=["%d", "%d", "%d", "%.6g", "%.6g", "%.6g", "%.6g", "%.6g"])
@@ -1,15 +1,20 @@
 from dataclasses import dataclass, field
-from typing import Tuple, Literal
+from typing import List, Tuple, Literal, Optional
 import numpy as np
 
 
 @dataclass
 class PatternSettings:
     point_distance: float  # Distance between points in the grid
-    type: Literal["square", "triangular", "contour"] = "square"  # e.g., "square", "triangular", "hex", "contour_offset", etc.
+    type: Literal["square", "triangular", "contour", "hatch"] = "square"  # e.g., "square", "triangular", "hex", "contour_offset", etc.
     offset: float = 0.0 # Offset distance compared against 3mf file contour
     start_rotation: float = 0.0 # Rotation angle in degrees for first layer
     layer_rotation: float = 0.0  # Rotation angle in degrees between layers
+    masking: Literal["exact", "raster"] = "exact"  # Point in polygon test ("exact") or rasterized mask ("raster")
+    sparse: bool = False  # Keep only the runs of points inside the parts (square and triangular grids, exact masking)
+    islands: bool = False  # One bounded sub-grid per part of the slice instead of a grid over all parts
+    anchored: bool = False  # Square and triangular grids on a lattice fixed on the plate for every rotation
+    compensation: dict = field(default_factory=dict)  # Geometric energy compensation, see compensate_pattern
 
 point_dtype = np.dtype([
     ("x", np.float32),
@@ -18,26 +23,40 @@ point_dtype = np.dtype([
 ])
 
 @dataclass
-class PatternData:
-    grid: np.ndarray  # 2D structured array
-    shape: Tuple[int, int]
+class GridFrame:
+    """
+    Lattice of a grid made by PatternData.create_empty. In the frame of the grid, the plate rotated by rotation_deg
+    around (cx, cy), point (row, col) lies at (x0 + (col0 + col) * spacing + row_shift * ((row0 + row) % 2),
+    y0 + (row0 + row) * row_height). Grids with the same lattice (all fields but row0, col0 and shape) are windows
+    of each other with identical coordinates.
+    """
+    cx: float
+    cy: float
+    rotation_deg: float
+    x0: float
+    y0: float
     spacing: float
+    row_height: float
+    row_shift: float  # shift of the odd rows along the rows, half a point for triangular grids
+    shape: Tuple[int, int]
+    pattern_type: Literal["square", "triangular"] = "square"
+    row0: int = 0  # lattice row and column of the first point of the grid
+    col0: int = 0
 
     @classmethod
-    def create_empty(
-        cls,
-        xmin: float,
-        ymin: float,
-        xmax: float,
-        ymax: float,
-        point_distance: float,
-        pattern_type: Literal["square", "triangular"] = "square",
-        rotation_deg: float = 0.0,
-    ) -> "PatternData":
-
+    def from_bounds(cls, xmin: float, ymin: float, xmax: float, ymax: float, point_distance: float,
+                    pattern_type: Literal["square", "triangular"] = "square", rotation_deg: float = 0.0,
+                    anchored: bool = False) -> "GridFrame":
+        """
+        Frame of the grid over the bounding box, rotated around its center and starting at the corner of the
+        rotated box. Anchored frames are rotated around the plate origin and cut from the lattice through it, so
+        all anchored frames with the same rotation, point distance and type share their lattice.
+        """
         # Center of bounding box
         cx = (xmin + xmax) / 2
         cy = (ymin + ymax) / 2
+        if anchored:
+            cx = cy = 0.0
 
         # Rotation matrix components
         theta = np.deg2rad(rotation_deg)
@@ -66,49 +85,272 @@ class PatternData:
         height = rot_ymax - rot_ymin
 
         if pattern_type == "square":
-            cols = int(np.floor(width / point_distance)) + 1
-            rows = int(np.floor(height / point_distance)) + 1
-
-            xs = rot_xmin + np.arange(cols) * point_distance
-            ys = rot_ymin + np.arange(rows) * point_distance
-
-            X, Y = np.meshgrid(xs, ys)
-
+            row_height = point_distance
+            row_shift = 0.0
         elif pattern_type == "triangular":
-            cols = int(np.floor(width / point_distance)) + 1
+            # Every second row is shifted half a point distance
             row_height = point_distance * np.sqrt(3) / 2
-            rows = int(np.floor(height / row_height)) + 1
-
-            X = np.zeros((rows, cols), dtype=np.float32)
-            Y = np.zeros((rows, cols), dtype=np.float32)
-
-            for r in range(rows):
-                offset = (point_distance / 2) if (r % 2 == 1) else 0
-                for c in range(cols):
-                    x = rot_xmin + c * point_distance + offset
-                    y = rot_ymin + r * row_height
-                    X[r, c] = x
-                    Y[r, c] = y
-
+            row_shift = point_distance / 2
         else:
             raise ValueError(f"Unsupported pattern type: {pattern_type}")
+        if anchored:
+            # The lattice points of the rotated bounding box, triangular grids start on an unshifted row
+            row0 = int(np.floor(rot_ymin / row_height))
+            if pattern_type == "triangular":
+                row0 -= row0 % 2
+            col0 = int(np.floor(rot_xmin / point_distance))
+            rows = int(np.floor(rot_ymax / row_height)) - row0 + 1
+            cols = int(np.floor(rot_xmax / point_distance)) - col0 + 1
+            return cls(cx=cx, cy=cy, rotation_deg=rotation_deg, x0=0.0, y0=0.0, spacing=point_distance,
+                       row_height=row_height, row_shift=row_shift, shape=(rows, cols), pattern_type=pattern_type,
+                       row0=row0, col0=col0)
+        cols = int(np.floor(width / point_distance)) + 1
+        rows = int(np.floor(height / row_height)) + 1
+        return cls(cx=cx, cy=cy, rotation_deg=rotation_deg, x0=rot_xmin, y0=rot_ymin, spacing=point_distance,
+                   row_height=row_height, row_shift=row_shift, shape=(rows, cols), pattern_type=pattern_type)
+
+    def frame_coordinates(self, rows: np.ndarray, cols: np.ndarray):
+        """Coordinates of the points (rows, cols) in the frame of the grid, float32 for triangular grids."""
+        rows, cols = self.row0 + rows, self.col0 + cols
+        x = self.x0 + cols * self.spacing
+        y = self.y0 + rows * self.row_height
+        if self.pattern_type == "triangular":
+            x = (x + np.where(rows % 2 == 1, self.row_shift, 0.0)).astype(np.float32)
+            y = y.astype(np.float32)
+        return x, y
 
-        # Rotate points back by inverse rotation
-        points = np.vstack((X.ravel(), Y.ravel()))
-        centered_points = points - np.array([[cx], [cy]])
+    def to_plate(self, x: np.ndarray, y: np.ndarray):
+        """Rotates frame coordinates back onto the plate."""
+        theta = np.deg2rad(self.rotation_deg)
+        cos_theta = np.cos(theta)
+        sin_theta = np.sin(theta)
+        points = np.vstack((np.ravel(x), np.ravel(y)))
+        centered_points = points - np.array([[self.cx], [self.cy]])
         inv_rot_matrix = np.array([[cos_theta, sin_theta], [-sin_theta, cos_theta]])
         rotated_points = inv_rot_matrix @ centered_points
-        rotated_points += np.array([[cx], [cy]])
+        rotated_points += np.array([[self.cx], [self.cy]])
+        return rotated_points[0].reshape(np.shape(x)), rotated_points[1].reshape(np.shape(y))
+
+    def coordinates(self, rows: np.ndarray, cols: np.ndarray):
+        """Plate coordinates (float32) of the points (rows, cols), equal to those of the grid of create_empty."""
+        x, y = self.to_plate(*self.frame_coordinates(rows, cols))
+        return x.astype(np.float32), y.astype(np.float32)
+
+    def plate_grid(self):
+        """Plate coordinates of all points as two (rows, cols) arrays."""
+        return self.plate_window(0, 0, *self.shape)
+
+    def plate_window(self, row0: int, col0: int, rows: int, cols: int):
+        """Plate coordinates of the rows x cols points from (row0, col0) on, equal to those of the whole grid."""
+        # All points at once, the rows and columns broadcast against each other
+        X, Y = self.frame_coordinates(np.arange(row0, row0 + rows)[:, np.newaxis],
+                                      np.arange(col0, col0 + cols)[np.newaxis, :])
+        return self.to_plate(np.broadcast_to(X, (rows, cols)), np.broadcast_to(Y, (rows, cols)))
+
+
+@dataclass
+class PatternData:
+    grid: np.ndarray  # 2D structured array
+    shape: Tuple[int, int]
+    spacing: float
+    frame: Optional[GridFrame] = None  # Lattice of the grid when it was made by create_empty
+
+    @classmethod
+    def create_empty(
+        cls,
+        xmin: float,
+        ymin: float,
+        xmax: float,
+        ymax: float,
+        point_distance: float,
+        pattern_type: Literal["square", "triangular"] = "square",
+        rotation_deg: float = 0.0,
+        anchored: bool = False,
+    ) -> "PatternData":
+        return cls.from_frame(GridFrame.from_bounds(xmin, ymin, xmax, ymax, point_distance, pattern_type,
+                                                    rotation_deg, anchored))
+
+    @classmethod
+    def from_frame(cls, frame: GridFrame) -> "PatternData":
+        """Empty grid of the points of frame."""
+        # Grid points rotated back by the inverse rotation
+        X_rot, Y_rot = frame.plate_grid()
+
+        # Fill whole fields at once, energy stays zero regardless of position
+        grid = np.zeros(frame.shape, dtype=point_dtype)
+        grid["x"] = X_rot
+        grid["y"] = Y_rot
+
+        return cls(grid=grid, shape=frame.shape, spacing=frame.spacing, frame=frame)
+
+    def active(self):
+        """Rows, columns and energies of the points with energy, row by row."""
+        rows, cols = np.nonzero(self.grid["energy"] > 0)
+        return rows, cols, self.grid["energy"][rows, cols]
+
+    def count_active(self) -> int:
+        return int(np.count_nonzero(self.grid["energy"] > 0))
+
+    def coordinates(self, rows: np.ndarray, cols: np.ndarray):
+        """x and y of the points (rows, cols)."""
+        return self.grid["x"][rows, cols], self.grid["y"][rows, cols]
+
+    def energy_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return self.grid["energy"][rows, cols]
+
+    def mask(self, energy_threshold: float = 0.0) -> np.ndarray:
+        """Boolean grid of the points with more energy than energy_threshold."""
+        return self.grid["energy"] > energy_threshold
+
+    def scale_energy(self, rows: np.ndarray, cols: np.ndarray, factor: np.ndarray):
+        """Multiplies the energy of the points (rows, cols) by factor."""
+        self.grid["energy"][rows, cols] *= factor
+
+
+@dataclass
+class SparsePatternData:
+    """
+    Pattern of a grid made by PatternData.create_empty that only keeps the runs of consecutive points with the same
+    non-zero energy along its rows. The coordinates of a point follow from its (row, col) and the frame of the grid,
+    so memory and time scale with the outline of the melted area instead of its bounding box.
+    """
+    frame: GridFrame
+    row: np.ndarray     # row of every run, runs are ordered by row and column
+    start: np.ndarray   # first column of every run
+    end: np.ndarray     # last column of every run (included)
+    energy: np.ndarray  # float32, energy of the points of every run
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.frame.shape
+
+    @property
+    def spacing(self) -> float:
+        return self.frame.spacing
+
+    def active(self):
+        """Rows, columns and energies of the points with energy, row by row."""
+        lengths = self.end - self.start + 1
+        run = np.repeat(np.arange(len(lengths)), lengths)
+        cols = self.start[run] + np.arange(len(run)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self.row[run], cols, self.energy[run]
+
+    def count_active(self) -> int:
+        return int(np.sum(self.end - self.start + 1))
+
+    def coordinates(self, rows: np.ndarray, cols: np.ndarray):
+        """x and y of the points (rows, cols), equal to those of the dense grid."""
+        return self.frame.coordinates(np.asarray(rows), np.asarray(cols))
+
+    def energy_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # Energy of the run that covers every point, 0 between runs
+        if len(self.row) == 0:
+            return np.zeros(np.shape(rows), dtype=np.float32)
+        row_length = self.shape[1] + 1
+        keys = np.asarray(rows) * row_length + np.asarray(cols)
+        run = np.searchsorted(self.row * row_length + self.start, keys, side="right") - 1
+        covered = (run >= 0) & (keys <= self.row[run] * row_length + self.end[run])
+        return np.where(covered, self.energy[run], np.float32(0.0))
+
+    def mask(self, energy_threshold: float = 0.0) -> np.ndarray:
+        """Boolean grid of the points with more energy than energy_threshold."""
+        mask = np.zeros(self.shape, dtype=bool)
+        rows, cols, energy = self.active()
+        mask[rows, cols] = energy > energy_threshold
+        return mask
+
+    def scale_energy(self, rows: np.ndarray, cols: np.ndarray, factor: np.ndarray):
+        """Multiplies the energy of the points (rows, cols), all points of active(), by factor. Runs are split where
+        the energy changes."""
+        energy = self.energy_at(rows, cols) * factor
+        keep = energy > 0
+        rows, cols, energy = rows[keep], cols[keep], energy[keep]
+        # A run starts wherever the row, the column or the energy does not continue the previous point
+        starts = np.ones(len(rows), dtype=bool)
+        starts[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1) | (energy[1:] != energy[:-1])
+        first = np.flatnonzero(starts)
+        last = np.append(first[1:], len(rows)) - 1
+        self.row, self.start, self.end, self.energy = rows[first], cols[first], cols[last], energy[first]
+
+    def to_dense(self) -> PatternData:
+        """The pattern as a dense grid, as generated without sparse."""
+        grid = np.zeros(self.shape, dtype=point_dtype)
+        grid["x"], grid["y"] = self.frame.plate_grid()
+        rows, cols, energy = self.active()
+        grid["energy"][rows, cols] = energy
+        return PatternData(grid=grid, shape=self.shape, spacing=self.spacing, frame=self.frame)
+
+
+@dataclass
+class IslandPatternData:
+    """
+    Pattern of a grid made by PatternData.create_empty that is only kept around the islands (the separate polygons)
+    of the slice: every island has a dense sub-grid, the window of the grid from origin (row, col) that bounds the
+    island, masked by that island alone. Points are addressed by their (row, col) in the whole grid, so the
+    strategies see the same pattern as the dense grid while memory and time follow the area of the islands.
+    """
+    frame: GridFrame
+    islands: List[PatternData]  # sub-grid of every island
+    origins: List[Tuple[int, int]]  # (row, col) of the first point of every sub-grid in the whole grid
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.frame.shape
+
+    @property
+    def spacing(self) -> float:
+        return self.frame.spacing
+
+    def active(self):
+        """Rows, columns and energies of the points with energy, row by row."""
+        rows, cols, energy = [np.zeros(0, dtype=np.intp)], [np.zeros(0, dtype=np.intp)], [np.zeros(0, np.float32)]
+        for island, (row0, col0) in zip(self.islands, self.origins):
+            island_rows, island_cols, island_energy = island.active()
+            rows.append(island_rows + row0)
+            cols.append(island_cols + col0)
+            energy.append(island_energy)
+        rows, cols, energy = np.concatenate(rows), np.concatenate(cols), np.concatenate(energy)
+        # The islands of a row are merged, no point has energy in two islands
+        order = np.lexsort((cols, rows))
+        return rows[order], cols[order], energy[order]
+
+    def count_active(self) -> int:
+        return sum(island.count_active() for island in self.islands)
+
+    def coordinates(self, rows: np.ndarray, cols: np.ndarray):
+        """x and y of the points (rows, cols), equal to those of the dense grid."""
+        return self.frame.coordinates(np.asarray(rows), np.asarray(cols))
 
-        X_rot = rotated_points[0].reshape(rows, cols)
-        Y_rot = rotated_points[1].reshape(rows, cols)
+    def energy_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        energy = np.zeros(rows.shape, dtype=np.float32)
+        for island, (row0, col0) in zip(self.islands, self.origins):
+            inside = (rows >= row0) & (rows < row0 + island.shape[0]) & (cols >= col0) & (cols < col0 + island.shape[1])
+            island_energy = island.energy_at(rows[inside] - row0, cols[inside] - col0)
+            energy[inside] = np.where(island_energy > 0, island_energy, energy[inside])
+        return energy
 
-        grid = np.zeros((rows, cols), dtype=point_dtype)
+    def mask(self, energy_threshold: float = 0.0) -> np.ndarray:
+        """Boolean grid of the points with more energy than energy_threshold."""
+        mask = np.zeros(self.shape, dtype=bool)
+        for island, (row0, col0) in zip(self.islands, self.origins):
+            rows, cols = island.shape
+            mask[row0:row0 + rows, col0:col0 + cols] |= island.mask(energy_threshold)
+        return mask
 
-        for r in range(rows):
-            for c in range(cols):
-                grid[r, c]["x"] = X_rot[r, c]
-                grid[r, c]["y"] = Y_rot[r, c]
-                grid[r, c]["energy"] = 0.0  # all zero regardless of position
+    def scale_energy(self, rows: np.ndarray, cols: np.ndarray, factor: np.ndarray):
+        """Multiplies the energy of the points (rows, cols), ordered by row, by factor."""
+        for island, (row0, col0) in zip(self.islands, self.origins):
+            first, last = np.searchsorted(rows, [row0, row0 + island.shape[0]])
+            island_rows, island_cols = rows[first:last] - row0, cols[first:last] - col0
+            inside = (island_cols >= 0) & (island_cols < island.shape[1])
+            # Points of other islands in the window have no energy here and stay without
+            island.scale_energy(island_rows[inside], island_cols[inside], factor[first:last][inside])
 
-        return cls(grid=grid, shape=(rows, cols), spacing=point_distance)
\ No newline at end of file
+    def to_dense(self) -> PatternData:
+        """The pattern as a dense grid, as generated without islands."""
+        grid = np.zeros(self.shape, dtype=point_dtype)
+        grid["x"], grid["y"] = self.frame.plate_grid()
+        rows, cols, energy = self.active()
+        grid["energy"][rows, cols] = energy
+        return PatternData(grid=grid, shape=self.shape, spacing=self.spacing, frame=self.frame)
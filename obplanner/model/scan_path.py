@@ -0,0 +1,171 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple
+import numpy as np
+import obplib as obp
+
+# Element kinds
+LINE = 0
+SPOT = 1
+SYNC = 2
+
+
+@dataclass
+class ScanPath:
+    """
+    Columnar scan path, the contract between the sort strategies and the OBP output.
+    Row i of every column describes element i of the path:
+      * LINE: a line from (x0, y0) to (x1, y1) with speed
+      * SPOT: a spot at (x0, y0) with dwell_time, consecutive spots with equal beam parameters form one TimedPoints
+      * SYNC: the sync point sync_points[marker]
+    """
+    kind: np.ndarray        # uint8, LINE/SPOT/SYNC
+    x0: np.ndarray          # int32, µm
+    y0: np.ndarray          # int32, µm
+    x1: np.ndarray          # int32, µm (equal to x0 for spots)
+    y1: np.ndarray          # int32, µm (equal to y0 for spots)
+    speed: np.ndarray       # uint32, µm/s (lines)
+    dwell_time: np.ndarray  # uint32, ns (spots)
+    spot_size: np.ndarray   # float32, µm
+    power: np.ndarray       # float32, W
+    marker: np.ndarray      # int32, index in sync_points (sync), -1 otherwise
+    sync_points: List[Tuple[str, bool, float]] = field(default_factory=list)  # (endpoint, value, duration in ms)
+
+    @classmethod
+    def empty(cls) -> "ScanPath":
+        return cls._from_columns(0)
+
+    @classmethod
+    def lines(cls, x0, y0, x1, y1, speed, spot_size, power) -> "ScanPath":
+        """Lines from coordinates in µm, speed in µm/s, spot size in µm and power in W (scalars or arrays)."""
+        n = len(x0)
+        return cls._from_columns(n, kind=LINE, x0=_to_um(x0), y0=_to_um(y0), x1=_to_um(x1), y1=_to_um(y1),
+                                 speed=speed, spot_size=spot_size, power=power)
+
+    @classmethod
+    def spots(cls, x, y, dwell_time, spot_size, power) -> "ScanPath":
+        """Spots from coordinates in µm, dwell time in ns, spot size in µm and power in W."""
+        n = len(x)
+        x, y = _to_um(x), _to_um(y)
+        return cls._from_columns(n, kind=SPOT, x0=x, y0=y, x1=x, y1=y,
+                                 dwell_time=dwell_time, spot_size=spot_size, power=power)
+
+    @classmethod
+    def sync(cls, endpoint: str, value: bool, duration: float) -> "ScanPath":
+        path = cls._from_columns(1, kind=SYNC, marker=0)
+        path.sync_points.append((endpoint, value, duration))
+        return path
+
+    @classmethod
+    def concatenate(cls, paths: List["ScanPath"]) -> "ScanPath":
+        paths = [p for p in paths if p is not None]
+        if not paths:
+            return cls.empty()
+        sync_points = []
+        markers = []
+        for p in paths:
+            markers.append(np.where(p.marker >= 0, p.marker + len(sync_points), -1))
+            sync_points.extend(p.sync_points)
+        columns = {name: np.concatenate([getattr(p, name) for p in paths]) for name in _COLUMNS if name != "marker"}
+        return cls(**columns, marker=np.concatenate(markers).astype(np.int32), sync_points=sync_points)
+
+    @classmethod
+    def _from_columns(cls, n: int, **values) -> "ScanPath":
+        columns = {}
+        for name, dtype in _COLUMNS.items():
+            default = -1 if name == "marker" else 0
+            columns[name] = np.array(np.broadcast_to(np.asarray(values.get(name, default)).astype(dtype), n))
+        return cls(**columns)
+
+    def __len__(self):
+        return len(self.kind)
+
+    def take(self, index) -> "ScanPath":
+        """New path with the elements in the given order (index array or boolean mask)."""
+        columns = {name: getattr(self, name)[index] for name in _COLUMNS}
+        return ScanPath(**columns, sync_points=list(self.sync_points))
+
+    def bounds(self):
+        """(xmin, ymin, xmax, ymax) in µm of all lines and spots, None for a path without geometry."""
+        scan = self.kind != SYNC
+        if not scan.any():
+            return None
+        xs = np.concatenate((self.x0[scan], self.x1[scan]))
+        ys = np.concatenate((self.y0[scan], self.y1[scan]))
+        return int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())
+
+    def stats(self) -> dict:
+        """
+        Totals of the path: number of spots and lines, line and jump length in mm, beam on time in s (line
+        length / speed and dwell times) and deposited energy in J (power * beam on time).
+        """
+        line = self.kind == LINE
+        spot = self.kind == SPOT
+        scan = line | spot
+        dx = self.x1[line].astype(np.float64) - self.x0[line]
+        dy = self.y1[line].astype(np.float64) - self.y0[line]
+        length = np.hypot(dx, dy)
+        speed = self.speed[line].astype(np.float64)
+        line_time = np.divide(length, speed, out=np.zeros_like(length), where=speed > 0)
+        spot_time = self.dwell_time[spot] * 1e-9
+        x0, y0 = self.x0[scan].astype(np.float64), self.y0[scan].astype(np.float64)
+        x1, y1 = self.x1[scan].astype(np.float64), self.y1[scan].astype(np.float64)
+        return {
+            "spots": int(np.count_nonzero(spot)),
+            "lines": int(np.count_nonzero(line)),
+            "line_length": float(length.sum()) / 1000,
+            "jump_length": float(np.hypot(x0[1:] - x1[:-1], y0[1:] - y1[:-1]).sum()) / 1000,
+            "beam_time": float(line_time.sum() + spot_time.sum()),
+            "energy": float(self.power[line] @ line_time + self.power[spot] @ spot_time),
+        }
+
+    def blocks(self):
+        """
+        Splits the path into (kind, start, stop) blocks of consecutive elements of the same kind.
+        Spots are also split where the beam parameters change (one TimedPoints each) and every sync point
+        is a block of its own.
+        """
+        n = len(self)
+        if n == 0:
+            return []
+        new_block = np.ones(n, dtype=bool)
+        new_block[1:] = (self.kind[1:] != self.kind[:-1]) | (self.kind[1:] == SYNC) | (
+            (self.kind[1:] == SPOT) & ((self.spot_size[1:] != self.spot_size[:-1]) | (self.power[1:] != self.power[:-1])))
+        starts = np.flatnonzero(new_block)
+        stops = np.append(starts[1:], n)
+        return list(zip(self.kind[starts].tolist(), starts.tolist(), stops.tolist()))
+
+    def to_obp(self) -> list:
+        """Converts the path to obplib objects."""
+        objects = []
+        x0, y0, x1, y1 = self.x0.tolist(), self.y0.tolist(), self.x1.tolist(), self.y1.tolist()
+        speed, dwell_time = self.speed.tolist(), self.dwell_time.tolist()
+        spot_size, power = self.spot_size.tolist(), self.power.tolist()
+        for kind, start, stop in self.blocks():
+            if kind == LINE:
+                for i in range(start, stop):
+                    bp = obp.Beamparameters(spot_size[i], power[i])
+                    objects.append(obp.Line(obp.Point(x0[i], y0[i]), obp.Point(x1[i], y1[i]), speed[i], bp))
+            elif kind == SPOT:
+                points = [obp.Point(x0[i], y0[i]) for i in range(start, stop)]
+                bp = obp.Beamparameters(spot_size[start], power[start])
+                objects.append(obp.TimedPoints(points, dwell_time[start:stop], bp))
+            else:
+                objects.append(obp.SyncPoint(*self.sync_points[self.marker[start]]))
+        return objects
+
+
+_COLUMNS = {
+    "kind": np.uint8,
+    "x0": np.int32,
+    "y0": np.int32,
+    "x1": np.int32,
+    "y1": np.int32,
+    "speed": np.uint32,
+    "dwell_time": np.uint32,
+    "spot_size": np.float32,
+    "power": np.float32,
+    "marker": np.int32,
+}
+
+def _to_um(values):
+    return np.rint(np.asarray(values, dtype=np.float64)).astype(np.int32)
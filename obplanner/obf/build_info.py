@@ -0,0 +1,46 @@
+import json
+import os
+
+
+class BuildInfoWriter:
+    """
+    Writes buildInfo.json incrementally: the header entries when the file is opened and every layer as soon
+    as it is added, so the layer list never has to be kept in memory. The result is identical to
+    json.dump({**header, "layers": layers}, f, indent=2).
+
+    The layers are written to a temporary file next to path that only replaces path once all layers were added
+    without an error, so a failed build never leaves a truncated buildInfo.json that looks complete.
+    """
+
+    def __init__(self, path: str, header: dict):
+        self.path = path
+        self.header = header
+        self.layer_count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path + ".tmp", "w")
+        self._file.write("{")
+        for key, value in self.header.items():
+            self._file.write(f"\n  {json.dumps(key)}: {_indent(value, 2)},")
+        self._file.write('\n  "layers": [')
+        return self
+
+    def add_layer(self, layer: dict):
+        separator = "," if self.layer_count else ""
+        self._file.write(f"{separator}\n    {_indent(layer, 4)}")
+        self.layer_count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._file.close()
+            os.remove(self.path + ".tmp")
+            return False
+        self._file.write("\n  ]\n}" if self.layer_count else "]\n}")
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+        return False
+
+
+def _indent(value, level: int) -> str:
+    return json.dumps(value, indent=2).replace("\n", "\n" + " " * level)
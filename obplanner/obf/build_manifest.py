@@ -0,0 +1,38 @@
+from dataclasses import dataclass, field
+import json
+import os
+
+MANIFEST_NAME = "inputManifest.json"
+
+
+@dataclass
+class BuildManifest:
+    """
+    Inputs of the layer OBP files of an OBF directory, stored next to buildInfo.json so that update_build only
+    regenerates the files whose inputs changed.
+      * files: OBP file (relative to the OBF directory) -> content key of the strategy and slices it was made from
+      * geometry: layer -> {"components": geometry digest}, valid for the sliced model with the given fingerprint
+    """
+    path: str = None
+    fingerprint: str = ""
+    files: dict = field(default_factory=dict)
+    geometry: dict = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, obf_path: str) -> "BuildManifest":
+        path = os.path.join(obf_path, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path) as f:
+            data = json.load(f)
+        return cls(path=path, fingerprint=data.get("fingerprint", ""), files=data.get("files", {}),
+                   geometry=data.get("geometry", {}))
+
+    def save(self):
+        if self.path is None:
+            return
+        # Written to a temporary file first so that an interrupted build never leaves half a manifest
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "files": self.files, "geometry": self.geometry}, f)
+        os.replace(temporary, self.path)
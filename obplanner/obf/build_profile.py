@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+import csv
+import json
+import time
+import tracemalloc
+
+PROFILE_NAME = "buildProfile.json"
+PROFILE_CSV_NAME = "buildProfile.csv"
+
+# Stages of prepare_layer_obp in the order they run
+STAGES = ["slicing", "pattern", "compensate", "strategy", "sync", "write"]
+COUNTS = ["points", "active_points", "elements", "spots", "lines", "bytes", "jump_length", "unordered_jump_length"]
+
+
+class StageTimer:
+    """
+    Wall time in seconds and memory high-water mark in kB of the named stages of one OBP file. The high-water mark
+    is the peak of the memory traced by tracemalloc (numpy arrays included) above the memory in use when the stage
+    started, 0 while tracemalloc is not tracing (see trace_memory).
+    """
+
+    def __init__(self):
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.peaks = dict.fromkeys(STAGES, 0)
+
+    @contextmanager
+    def stage(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            in_use = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+            if tracing:
+                peak = (tracemalloc.get_traced_memory()[1] - in_use) // 1024
+                self.peaks[name] = max(self.peaks[name], peak)
+
+
+def trace_memory() -> bool:
+    """Starts tracing the memory for StageTimer, True when it was not traced yet (stop it again when done)."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start()
+    return True
+
+
+def profile_record(layer: int, file: str, timer: StageTimer, counts: dict) -> dict:
+    return {"layer": layer, "file": file, **{name: round(timer.times[name], 6) for name in STAGES},
+            "total": round(sum(timer.times.values()), 6), **counts,
+            **{f"{name}_peak_kb": timer.peaks[name] for name in STAGES}, "peak_kb": max(timer.peaks.values())}
+
+
+def write_profile(obf_path: str, records: list):
+    """
+    Writes the profile records of a build (one per generated layer OBP file) next to buildInfo.json, as JSON
+    with the per-stage totals and as CSV with one row per file.
+    """
+    stage_totals = {name: round(sum(r[name] for r in records), 6) for name in STAGES}
+    with open(f"{obf_path}/{PROFILE_NAME}", "w") as f:
+        json.dump({"stages": stage_totals, "files": records}, f, indent=2)
+    columns = ["layer", "file", *STAGES, "total", *COUNTS, *(f"{name}_peak_kb" for name in STAGES), "peak_kb"]
+    with open(f"{obf_path}/{PROFILE_CSV_NAME}", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def print_profile_summary(records: list, count: int = 5):
+    if not records:
+        print("Profile: no layer files were generated.")
+        return
+    stage_totals = {name: sum(r[name] for r in records) for name in STAGES}
+    total = sum(stage_totals.values())
+    print(f"Profile of {len(records)} layer files, {total:.2f} s:")
+    for name, seconds in stage_totals.items():
+        print(f"  {name:<10} {seconds:>9.2f} s {100 * seconds / total if total else 0:>5.1f} %")
+    unordered = sum(r["unordered_jump_length"] for r in records)
+    ordered = sum(r["jump_length"] for r in records)
+    if unordered != ordered:
+        print(f"Jump length: {unordered / 1000:.2f} m before ordering, {ordered / 1000:.2f} m after")
+
+    layers = {}
+    for record in records:
+        layer = layers.setdefault(record["layer"], {"total": 0.0, "elements": 0, "peak_kb": 0,
+                                                    **dict.fromkeys(STAGES, 0.0)})
+        for name in (*STAGES, "total", "elements"):
+            layer[name] += record[name]
+        layer["peak_kb"] = max(layer["peak_kb"], record["peak_kb"])
+    # The peaks are only traced with profile_memory
+    traced = any(r["peak_kb"] for r in records)
+    print("Slowest layers:")
+    for i, layer in sorted(layers.items(), key=lambda item: item[1]["total"], reverse=True)[:count]:
+        slowest_stage = max(STAGES, key=lambda name: layer[name])
+        peak = f", {layer['peak_kb'] / 1024:.1f} MB peak" if traced else ""
+        print(f"  layer {i}: {layer['total']:.3f} s (mostly {slowest_stage}), {layer['elements']} elements{peak}")
@@ -0,0 +1,176 @@
+import gzip
+
+import numpy as np
+import obplib as obp
+
+from obplanner.model.scan_path import ScanPath, LINE, SPOT
+
+# Protobuf tags (field number << 3 | wire type) of the OBP messages that are encoded directly
+_PACKET_LINE = 0x52          # Packet.line, length delimited
+_PACKET_TIMED_POINTS = 0x5A  # Packet.timed_points, length delimited
+_PARAMS = 0x0A               # Line.params / TimedPoints.params, length delimited
+_SPOT_SIZE = 0x0D            # BeamParameters.spot_size, float
+_BEAM_POWER = 0x15           # BeamParameters.beam_power, float
+_X0, _Y0, _X1, _Y1 = 0x11, 0x19, 0x21, 0x29  # Line.x0..y1, double
+_SPEED = 0x30                # Line.speed, varint
+_POINT = 0x12                # TimedPoints.points, length delimited
+_POINT_X, _POINT_Y = 0x09, 0x11  # TimedPoint.x/y, double
+_POINT_T = 0x18              # TimedPoint.t, varint
+
+
+# Number of elements that are encoded per batch, bounds the memory used by the encoder
+CHUNK_SIZE = 65536
+
+
+def write_obp(obp_elements, filename, compress=None):
+    """
+    Writes OBP elements to an OBP-file while they are produced. obp_elements is a ScanPath or an iterable
+    (e.g. a generator) of ScanPaths and obplib objects, the output is byte-identical to obplib.write_obp on the
+    corresponding obplib objects. The file is gzip compressed when compress is True, or when it is None and
+    the filename ends with .gz.
+    The encoder only holds CHUNK_SIZE elements at a time, but every ScanPath is in memory while it is written:
+    the memory of a layer is bounded by its pattern and scan path (a few tens of bytes per point), not by the
+    encoding.
+    """
+    if isinstance(obp_elements, ScanPath):
+        obp_elements = [obp_elements]
+    if compress is None:
+        compress = str(filename).endswith(".gz")
+    with (gzip.open(filename, "wb", compresslevel=6) if compress else open(filename, "wb")) as out:
+        for element in obp_elements:
+            for chunk in iter_encoded(element):
+                out.write(chunk)
+
+def iter_encoded(element):
+    if isinstance(element, ScanPath):
+        yield from iter_scan_path(element)
+    else:
+        data = element.write_obp()
+        yield _varint_scalar(len(data)) + data
+
+def encode_element(element) -> bytes:
+    return b"".join(iter_encoded(element))
+
+def encode_scan_path(path: ScanPath) -> bytes:
+    return b"".join(iter_scan_path(path))
+
+def iter_scan_path(path: ScanPath, chunk_size: int = CHUNK_SIZE):
+    for kind, start, stop in path.blocks():
+        if kind == LINE:
+            for i in range(start, stop, chunk_size):
+                j = min(i + chunk_size, stop)
+                yield encode_lines(path.x0[i:j], path.y0[i:j], path.x1[i:j], path.y1[i:j],
+                                   path.speed[i:j], path.spot_size[i:j], path.power[i:j])
+        elif kind == SPOT:
+            yield from iter_timed_points(path.x0[start:stop], path.y0[start:stop], path.dwell_time[start:stop],
+                                         path.spot_size[start], path.power[start], chunk_size)
+        else:
+            yield encode_element(obp.SyncPoint(*path.sync_points[path.marker[start]]))
+
+def encode_lines(x0, y0, x1, y1, speed, spot_size, power) -> bytes:
+    """
+    Encodes one length-delimited Line packet per element of the input arrays.
+    """
+    x0, y0, x1, y1 = (np.ascontiguousarray(v, dtype="<f8").ravel() for v in (x0, y0, x1, y1))
+    n = len(x0)
+    if n == 0:
+        return b""
+    speed = np.broadcast_to(np.asarray(speed, dtype=np.uint64), n)
+    spot_size = np.broadcast_to(np.asarray(spot_size, dtype="<f4"), n)
+    power = np.broadcast_to(np.asarray(power, dtype="<f4"), n)
+
+    params = [_fixed_field(_SPOT_SIZE, spot_size), _fixed_field(_BEAM_POWER, power)]
+    params_len = _total_length(params)
+    fields = [_tag_field(_PARAMS, n), _varint_field(None, params_len)] + params
+    fields += [_fixed_field(tag, v) for tag, v in ((_X0, x0), (_Y0, y0), (_X1, x1), (_Y1, y1))]
+    fields.append(_varint_field(_SPEED, speed, present=speed != 0))
+    line_len = _total_length(fields)
+    header = [_tag_field(_PACKET_LINE, n), _varint_field(None, line_len)]
+    packet_len = _total_length(header) + line_len
+    return _assemble([_varint_field(None, packet_len)] + header + fields)
+
+def encode_timed_points(x, y, dwell_time, spot_size, power) -> bytes:
+    """
+    Encodes one length-delimited TimedPoints packet. As in obplib, a dwell time is only written
+    when it differs from the previous one (0 = previous time).
+    """
+    return b"".join(iter_timed_points(x, y, dwell_time, spot_size, power))
+
+def iter_timed_points(x, y, dwell_time, spot_size, power, chunk_size: int = CHUNK_SIZE):
+    x = np.ascontiguousarray(x, dtype="<f8").ravel()
+    y = np.ascontiguousarray(y, dtype="<f8").ravel()
+    dwell_time = np.asarray(dwell_time, dtype=np.int64).ravel()
+    n = len(x)
+
+    params = [_fixed_field(_SPOT_SIZE, np.full(1, spot_size, dtype="<f4")),
+              _fixed_field(_BEAM_POWER, np.full(1, power, dtype="<f4"))]
+    params = _assemble(params)
+    params = bytes([_PARAMS]) + _varint_scalar(len(params)) + params
+
+    previous = np.concatenate(([0], dwell_time[:-1]))
+    t = np.where(dwell_time != previous, dwell_time, 0).astype(np.uint64)
+
+    def point_fields(i, j):
+        point = [_fixed_field(_POINT_X, x[i:j]), _fixed_field(_POINT_Y, y[i:j]),
+                 _varint_field(_POINT_T, t[i:j], present=t[i:j] != 0)]
+        return [_tag_field(_POINT, j - i), _varint_field(None, _total_length(point))] + point
+
+    # The packet length goes first, so the points are measured in a first pass and encoded in a second
+    chunks = [(i, min(i + chunk_size, n)) for i in range(0, n, chunk_size)]
+    body_len = len(params) + sum(int(np.sum(_total_length(point_fields(i, j)))) for i, j in chunks)
+    header = bytes([_PACKET_TIMED_POINTS]) + _varint_scalar(body_len)
+    yield _varint_scalar(len(header) + body_len) + header + params
+    for i, j in chunks:
+        yield _assemble(point_fields(i, j))
+
+# Each field is a (bytes (n, width), lengths (n,)) pair, a length of 0 leaves the field out of that record
+
+def _tag_field(tag, n):
+    return np.full((n, 1), tag, dtype=np.uint8), np.ones(n, dtype=np.int64)
+
+def _fixed_field(tag, values):
+    # proto3 leaves out scalars whose bits are all zero (-0.0 is written)
+    raw = np.ascontiguousarray(values).reshape(-1, 1).view(np.uint8)
+    present = np.any(raw != 0, axis=1)
+    data = np.empty((len(values), 1 + raw.shape[1]), dtype=np.uint8)
+    data[:, 0] = tag
+    data[:, 1:] = raw
+    return data, present * data.shape[1]
+
+def _varint_field(tag, values, present=None):
+    data, lengths = _varint(values)
+    if tag is None:
+        return data, lengths
+    data = np.concatenate((np.full((len(data), 1), tag, dtype=np.uint8), data), axis=1)
+    lengths = lengths + 1
+    if present is not None:
+        lengths = np.where(present, lengths, 0)
+    return data, lengths
+
+def _varint(values):
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    groups = values[:, np.newaxis] >> shifts
+    lengths = 1 + np.count_nonzero(groups[:, 1:], axis=1)
+    data = (groups & np.uint64(0x7F)).astype(np.uint8)
+    data[np.arange(10) < (lengths - 1)[:, np.newaxis]] |= 0x80
+    return data, lengths
+
+def _varint_scalar(value: int) -> bytes:
+    data, lengths = _varint([value])
+    return data[0, :lengths[0]].tobytes()
+
+def _total_length(fields):
+    return sum(lengths for _, lengths in fields)
+
+def _assemble(fields) -> bytes:
+    # Scatter the fields of every record into one buffer, records are laid out back to back
+    record_len = _total_length(fields)
+    position = np.cumsum(record_len) - record_len
+    out = np.empty(int(np.sum(record_len)), dtype=np.uint8)
+    for data, lengths in fields:
+        columns = np.arange(data.shape[1])
+        mask = columns < lengths[:, np.newaxis]
+        out[(position[:, np.newaxis] + columns)[mask]] = data[mask]
+        position = position + lengths
+    return out.tobytes()
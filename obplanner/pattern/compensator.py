@@ -1,5 +1,148 @@
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from scipy.signal import fftconvolve
+
 from obplanner.model.pattern import PatternData
+from obplanner.pattern.layer_cache import layer_cache
+from obplanner.pattern.masking import mask_exact
+
+# Settings of the compensation, all terms are off until their weight is set
+DEFAULT_COMPENSATION = {
+    "fill_radius": 1.0,       # mm, radius of the neighbourhood of a point
+    "fill_weight": 0.0,       # energy removed from a point without melted neighbours
+    "edge_distance": 0.5,     # mm, distance to the contour over which the energy is reduced
+    "edge_weight": 0.0,       # energy removed from a point on the contour
+    "overhang_radius": 1.0,   # mm, radius of the area below a point that supports it
+    "overhang_weight": 0.0,   # energy removed from a point without anything melted below it
+    "min_energy": 0.5,        # lowest energy factor
+    "step": 0.05,             # the factors are rounded to steps, so the runs of equal energy stay long
+}
+# Grid points per side of the tiles that sparse and island patterns are compensated in
+TILE_SIZE = 256
+
+
+def compensate_pattern(pattern: PatternData, settings: dict, sliced_model, layer: int, components=()):
+    """
+    Geometric energy compensation of a square or triangular grid: the energy of every point is multiplied by a
+    factor from its surroundings on the layer (settings as DEFAULT_COMPENSATION):
+      * fill, the melted fraction of the disk of fill_radius around the point
+      * edge, the distance of the point to the contour of the slice below edge_distance
+      * overhang, the fraction of the disk of overhang_radius around the point that was melted on the previous
+        layer (the union of the same components), the first layer lies on the plate
+    Every term gives 1 - weight * (1 - value), with the edge distance as a fraction of edge_distance. The disks are
+    convolved with the grid by FFT, so the cost does not grow with their radius. Dense grids are compensated at
+    once, sparse and island patterns in tiles around their points (extended by the radii), so that memory follows
+    the area of the parts; the factors are the same. Patterns without a grid frame (contour, hatch) are returned
+    as they are.
+    """
+    if not settings or getattr(pattern, "frame", None) is None:
+        return pattern
+    settings = {**DEFAULT_COMPENSATION, **settings}
+    rows, cols, _ = pattern.active()
+    if len(rows) == 0:
+        return pattern
+    frame = pattern.frame
+    steps = (frame.row_height, frame.spacing)
+    previous = None
+    if settings["overhang_weight"] and layer > 0:
+        previous = layer_cache.get_union(sliced_model, layer - 1, components, 0.0)
+    terms = _Terms(settings, steps, previous, frame)
+
+    if isinstance(pattern, PatternData):
+        windows = [(0, 0, *pattern.shape)]
+    else:
+        windows = _tiles(rows, cols, max(TILE_SIZE, 4 * max(terms.pad)))
+    factor = np.ones(len(rows), dtype=np.float32)
+    for row0, col0, window_rows, window_cols in windows:
+        # The points of the window and the mask of the window extended by the reach of the terms
+        first, last = np.searchsorted(rows, [row0 - terms.pad[0], row0 + window_rows + terms.pad[0]])
+        band_rows, band_cols = rows[first:last] - (row0 - terms.pad[0]), cols[first:last] - (col0 - terms.pad[1])
+        shape = (window_rows + 2 * terms.pad[0], window_cols + 2 * terms.pad[1])
+        inside = (band_cols >= 0) & (band_cols < shape[1])
+        mask = np.zeros(shape, dtype=bool)
+        mask[band_rows[inside], band_cols[inside]] = True
+        window_factor = terms.factor(mask, row0, col0)
+        core = ((band_rows >= terms.pad[0]) & (band_rows < terms.pad[0] + window_rows)
+                & (band_cols >= terms.pad[1]) & (band_cols < terms.pad[1] + window_cols))
+        factor[first:last][core] = window_factor[band_rows[core] - terms.pad[0], band_cols[core] - terms.pad[1]]
+
+    if settings["step"] > 0:
+        factor = np.round(factor / settings["step"]) * settings["step"]
+    pattern.scale_energy(rows, cols, np.clip(factor, settings["min_energy"], None).astype(np.float32))
+    return pattern
+
+def uses_previous_layer(settings: dict) -> bool:
+    """Whether the compensation depends on the slices of the previous layer."""
+    return bool(settings and settings.get("overhang_weight"))
+
+def disk_kernel(radius: float, steps) -> np.ndarray:
+    """Kernel of ones at the grid points within radius mm of the center, rows and columns steps mm apart."""
+    half_rows, half_cols = (int(radius // step) for step in steps)
+    rows = np.arange(-half_rows, half_rows + 1)[:, np.newaxis] * steps[0]
+    cols = np.arange(-half_cols, half_cols + 1)[np.newaxis, :] * steps[1]
+    return (rows ** 2 + cols ** 2 <= radius ** 2).astype(np.float32)
+
+
+class _Terms:
+    # The terms of a compensation, evaluated on windows of the grid. pad is the number of rows and columns
+    # around a window that the terms look at.
+
+    def __init__(self, settings: dict, steps, previous, frame):
+        self.settings = settings
+        self.steps = steps
+        self.previous = previous
+        self.frame = frame
+        self.fill_kernel = disk_kernel(settings["fill_radius"], steps) if settings["fill_weight"] else None
+        self.support_kernel = disk_kernel(settings["overhang_radius"], steps) if previous is not None else None
+        pads = [(0, 0)]
+        for kernel in (self.fill_kernel, self.support_kernel):
+            if kernel is not None:
+                pads.append((kernel.shape[0] // 2, kernel.shape[1] // 2))
+        if settings["edge_weight"]:
+            # Outside points further away than edge_distance do not change the factor
+            reach = settings["edge_distance"] + min(steps) / 2
+            pads.append(tuple(int(np.ceil(reach / step)) + 1 for step in steps))
+        self.pad = tuple(max(pad[axis] for pad in pads) for axis in range(2))
+
+    def factor(self, mask: np.ndarray, row0: int, col0: int) -> np.ndarray:
+        # Factor of the points of the window from (row0, col0), mask is the window extended by pad
+        settings = self.settings
+        shape = (mask.shape[0] - 2 * self.pad[0], mask.shape[1] - 2 * self.pad[1])
+        factor = np.ones(shape, dtype=np.float32)
+        if self.fill_kernel is not None:
+            fill = _disk_fraction(self._crop(mask, self.fill_kernel), self.fill_kernel)
+            factor *= 1 - settings["fill_weight"] * (1 - fill)
+        if settings["edge_weight"]:
+            # The contour lies half way between the last point inside and the first point outside
+            distance = distance_transform_edt(np.pad(mask, 1), sampling=self.steps)[1:-1, 1:-1]
+            distance = self._crop(distance, None) - min(self.steps) / 2
+            edge_distance = settings["edge_distance"]
+            ramp = np.clip(1 - distance / edge_distance, 0, 1) if edge_distance > 0 else 0
+            factor *= 1 - settings["edge_weight"] * ramp
+        if self.support_kernel is not None:
+            half_rows, half_cols = self.support_kernel.shape[0] // 2, self.support_kernel.shape[1] // 2
+            x, y = self.frame.plate_window(row0 - half_rows, col0 - half_cols, shape[0] + 2 * half_rows,
+                                           shape[1] + 2 * half_cols)
+            support = _disk_fraction(mask_exact(x, y, self.previous), self.support_kernel)
+            factor *= 1 - settings["overhang_weight"] * (1 - support)
+        return factor
+
+    def _crop(self, values: np.ndarray, kernel) -> np.ndarray:
+        # The window extended by the half size of the kernel
+        half_rows, half_cols = (kernel.shape[0] // 2, kernel.shape[1] // 2) if kernel is not None else (0, 0)
+        return values[self.pad[0] - half_rows:values.shape[0] - self.pad[0] + half_rows,
+                      self.pad[1] - half_cols:values.shape[1] - self.pad[1] + half_cols]
+
+
+def _disk_fraction(values: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    # Fraction of the points of the disk around every point that are set, for the points at least the half size of
+    # the kernel inside values. The counts are rounded, so they do not depend on the FFT size of the window.
+    # The half point shift of the odd rows of triangular grids is left out of the disk.
+    counts = np.rint(fftconvolve(values.astype(np.float32), kernel, mode="valid"))
+    return (counts / kernel.sum()).astype(np.float32)
 
-def compensate_pattern(pattern: PatternData, settings: dict, sliced_model, layer: int):
-    #Expandable to perform geometrical energy compensation
-    return pattern
\ No newline at end of file
+def _tiles(rows: np.ndarray, cols: np.ndarray, size: int):
+    # (row0, col0, rows, cols) of the tiles of size x size points that hold points
+    tiles = np.unique((rows // size) * (cols.max() // size + 1) + cols // size)
+    tile_rows, tile_cols = np.divmod(tiles, cols.max() // size + 1)
+    return [(int(r) * size, int(c) * size, size, size) for r, c in zip(tile_rows, tile_cols)]
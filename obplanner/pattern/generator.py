@@ -1,22 +1,20 @@
 from shapely.geometry import Polygon, MultiPolygon, Point
-from shapely import contains_xy
 import numpy as np
-import py3mf_slicer.get_items
 from obplanner.model.pattern import PatternSettings, PatternData
+from obplanner.pattern.layer_cache import layer_cache
+from obplanner.pattern.grid_cache import grid_cache
+from obplanner.pattern.masking import mask_exact, mask_raster
+from obplanner.pattern.hatching import hatch_pattern
+from obplanner.pattern.sparse import sparse_pattern
+from obplanner.pattern.islands import island_pattern
 
 
 def generate_pattern(sliced_model, layer: int, components: list[int], pattern_settings: PatternSettings) -> PatternData:
-    component_slices = py3mf_slicer.get_items.get_shapely_slice(sliced_model, layer)
+    # Slicing, union and offset are shared by all strategies on the same layer
+    union_polygon = layer_cache.get_union(sliced_model, layer, components, pattern_settings.offset)
 
-    selected_shapes = [component_slices[i] for i in components if component_slices[i] is not None]
-    union_polygon = selected_shapes[0]
-    for shape in selected_shapes[1:]:
-        union_polygon = union_polygon.union(shape)
-
-    if pattern_settings.offset != 0.0:
-        union_polygon = union_polygon.buffer(pattern_settings.offset)
-    
-    rotation = pattern_settings.start_rotation + pattern_settings.layer_rotation * layer
+    # Equal angles give identical grids, the rotations repeat every 360 degrees
+    rotation = (pattern_settings.start_rotation + pattern_settings.layer_rotation * layer) % 360.0
     if pattern_settings.type == "contour":
         x = []
         y = []
@@ -53,24 +51,40 @@ def generate_pattern(sliced_model, layer: int, components: list[int], pattern_se
                 grid[i, j]["energy"] = 1.0  # default energy
         pattern = PatternData(grid=grid, shape=(rows, cols), spacing=1.0)
         return pattern
+    elif pattern_settings.type == "hatch":
+        # Exact segments of the scanlines instead of a point grid, for the line strategies
+        return hatch_pattern(union_polygon, pattern_settings.point_distance, rotation)
+    elif pattern_settings.islands:
+        # A bounded sub-grid per part, aligned with the grid over all parts
+        if pattern_settings.sparse:
+            raise ValueError("Patterns are either sparse or split into islands, not both")
+        return island_pattern(union_polygon, pattern_settings.point_distance, pattern_settings.type, rotation,
+                              pattern_settings.masking, anchored=pattern_settings.anchored)
+    elif pattern_settings.sparse:
+        # Runs of the points inside the parts, without the points of the bounding box outside them
+        if pattern_settings.masking != "exact":
+            raise ValueError(f"Sparse patterns are masked exactly, got masking {pattern_settings.masking}")
+        return sparse_pattern(union_polygon, pattern_settings.point_distance, pattern_settings.type, rotation,
+                              pattern_settings.anchored)
     else:
         xmin, ymin, xmax, ymax = union_polygon.bounds
-        pattern = PatternData.create_empty(
+        # Layers with the same footprint and angle share the grid, anchored grids every grid within an earlier one
+        pattern = grid_cache.create_empty(
             xmin, ymin, xmax, ymax,
             point_distance=pattern_settings.point_distance,
             pattern_type=pattern_settings.type,
-            rotation_deg=rotation
+            rotation_deg=rotation,
+            anchored=pattern_settings.anchored
         )
         
-        x = pattern.grid['x'].ravel()
-        y = pattern.grid['y'].ravel()
-
-        if isinstance(union_polygon, MultiPolygon):
-            inside = np.zeros_like(x, dtype=bool)
-            for poly in union_polygon.geoms:
-                inside |= contains_xy(poly, x, y)
+        if pattern_settings.masking == "exact":
+            # Point in polygon test, culled to the grid tiles that touch the parts
+            inside = mask_exact(pattern.grid['x'], pattern.grid['y'], union_polygon)
+        elif pattern_settings.masking == "raster":
+            inside = mask_raster(pattern.grid['x'], pattern.grid['y'], union_polygon, pattern_settings.point_distance,
+                                 rotation, pattern_settings.type)
         else:
-            inside = contains_xy(union_polygon, x, y)
-        pattern.grid['energy'] = inside.reshape(pattern.grid.shape).astype(float)
+            raise ValueError(f"Unsupported masking: {pattern_settings.masking}")
+        pattern.grid['energy'] = inside
 
         return pattern
\ No newline at end of file
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from dataclasses import astuple, replace
+
+from obplanner.model.pattern import GridFrame, PatternData, point_dtype
+
+# Lattices that are remembered until they are asked for again
+_MAX_SEEN = 1024
+# Bytes of grids kept by a build, split between its worker processes
+DEFAULT_MAX_BYTES = 128 * 2**20
+
+
+class GridCache:
+    """
+    Bounded LRU cache of the empty grids of PatternData.create_empty, keyed by the lattice of their GridFrame
+    (rotation center, origin, point distance, pattern type and rotation). A grid is served as a copy of the window of
+    a cached grid of the same lattice that covers it, with the coordinates it would be computed with. Layers with the
+    same footprint at a rotation that was already used (every layer without layer rotation, every 4th layer with 90
+    degrees, ...) copy the grid instead of computing it; with anchored frames, which share one lattice per rotation,
+    so does every layer within the footprint of earlier layers, as the cached grid grows to cover all of them.
+    A lattice is only kept once it is asked for the second time, so rotations that do not repeat (e.g. 67 degrees
+    per layer) cost no copies. Every process has its own cache, set_workers splits the budget between the worker
+    processes of a build.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._grids = OrderedDict()  # lattice -> (frame, grid)
+        self._bytes = 0
+        self._seen = OrderedDict()  # lattices that were asked for once
+
+    def clear(self):
+        self._grids.clear()
+        self._bytes = 0
+        self._seen.clear()
+
+    def set_workers(self, workers: int, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Limits the cache of one of workers processes to its share of max_bytes."""
+        self.max_bytes = max_bytes // max(workers, 1)
+        self._evict()
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._grids), "bytes": self._bytes,
+                "max_bytes": self.max_bytes}
+
+    def create_empty(self, xmin: float, ymin: float, xmax: float, ymax: float, point_distance: float,
+                     pattern_type: str = "square", rotation_deg: float = 0.0, anchored: bool = False) -> PatternData:
+        """PatternData.create_empty, the grid is a copy that can be changed."""
+        frame = GridFrame.from_bounds(xmin, ymin, xmax, ymax, point_distance, pattern_type, rotation_deg, anchored)
+        key = astuple(replace(frame, shape=(0, 0), row0=0, col0=0))
+        cached = self._grids.get(key)
+        if cached is not None and _covers(cached[0], frame):
+            self._grids.move_to_end(key)
+            self.hits += 1
+            return self._window(*cached, frame)
+        self.misses += 1
+        if cached is None and key not in self._seen:
+            self._seen[key] = None
+            if len(self._seen) > _MAX_SEEN:
+                self._seen.popitem(last=False)
+            return PatternData.from_frame(frame)
+        self._seen.pop(key, None)
+        # The cached grid grows to cover the new one, grids larger than the whole cache are not kept
+        superset = _union(cached[0], frame) if cached is not None else frame
+        if _nbytes(superset) > self.max_bytes:
+            superset = frame
+        if _nbytes(superset) > self.max_bytes:
+            return PatternData.from_frame(frame)
+        if cached is not None:
+            del self._grids[key]
+            self._bytes -= cached[1].nbytes
+        grid = PatternData.from_frame(superset).grid
+        self._grids[key] = (superset, grid)
+        self._bytes += grid.nbytes
+        pattern = self._window(superset, grid, frame)
+        self._evict()
+        return pattern
+
+    @staticmethod
+    def _window(superset: GridFrame, grid, frame: GridFrame) -> PatternData:
+        # Same lattice, so the points of the window have the coordinates of the grid of frame
+        row, col = frame.row0 - superset.row0, frame.col0 - superset.col0
+        rows, cols = frame.shape
+        return PatternData(grid=grid[row:row + rows, col:col + cols].copy(), shape=frame.shape,
+                           spacing=frame.spacing, frame=frame)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            _, (_, grid) = self._grids.popitem(last=False)
+            self._bytes -= grid.nbytes
+
+
+def _covers(superset: GridFrame, frame: GridFrame) -> bool:
+    return (superset.row0 <= frame.row0 and frame.row0 + frame.shape[0] <= superset.row0 + superset.shape[0]
+            and superset.col0 <= frame.col0 and frame.col0 + frame.shape[1] <= superset.col0 + superset.shape[1])
+
+def _union(a: GridFrame, b: GridFrame) -> GridFrame:
+    # Frame of the lattice of a and b that covers both, row0 stays even for triangular grids
+    row0, col0 = min(a.row0, b.row0), min(a.col0, b.col0)
+    row_end = max(a.row0 + a.shape[0], b.row0 + b.shape[0])
+    col_end = max(a.col0 + a.shape[1], b.col0 + b.shape[1])
+    return replace(a, row0=row0, col0=col0, shape=(row_end - row0, col_end - col0))
+
+def _nbytes(frame: GridFrame) -> int:
+    return frame.shape[0] * frame.shape[1] * point_dtype.itemsize
+
+
+grid_cache = GridCache()
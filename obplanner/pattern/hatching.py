@@ -0,0 +1,80 @@
+import numpy as np
+import shapely
+
+from obplanner.model.pattern import PatternData, point_dtype
+
+
+def hatch_pattern(geometry, point_distance: float, rotation_deg: float = 0.0) -> PatternData:
+    """
+    Exact line hatching of a (Multi)Polygon. Scanlines point_distance apart, on the same rows as the square grid of
+    PatternData.create_empty with the same rotation, are intersected with all polygon edges (holes included).
+
+    Every scanline is one row of the returned grid, holding its segments as (start, end, gap) points: start and
+    end have energy 1 and the gap point between two segments has energy 0, so the runs of every row are exactly
+    the segments and the line strategies can use the pattern like any other grid.
+    """
+    xmin, ymin, xmax, ymax = geometry.bounds
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    theta = np.deg2rad(rotation_deg)
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    x1, y1, x2, y2 = frame_edges(geometry, cx, cy, rotation_deg)
+
+    # Rows of the rotated bounding box, as in PatternData.create_empty
+    corners_x = np.array([xmin, xmin, xmax, xmax]) - cx
+    corners_y = np.array([ymin, ymax, ymin, ymax]) - cy
+    rot_ymin = (sin_theta * corners_x + cos_theta * corners_y).min() + cy
+    rot_ymax = (sin_theta * corners_x + cos_theta * corners_y).max() + cy
+    rows = int(np.floor((rot_ymax - rot_ymin) / point_distance)) + 1
+    segment_row, start_x, end_x = scanline_segments(x1, y1, x2, y2, rot_ymin, point_distance, rows)
+
+    # Position of every segment in its row
+    segments_per_row = np.bincount(segment_row, minlength=rows)
+    segment_number = np.arange(len(segment_row)) - np.repeat(np.cumsum(segments_per_row) - segments_per_row,
+                                                            segments_per_row)
+    cols = max(3 * int(segments_per_row.max(initial=0)) - 1, 1)
+
+    grid = np.zeros((rows, cols), dtype=point_dtype)
+    segment_y = rot_ymin + segment_row * point_distance
+    for col_offset, segment_x in ((0, start_x), (1, end_x)):
+        # Back from the frame of the grid by the inverse rotation
+        dx, dy = segment_x - cx, segment_y - cy
+        cols_of_points = 3 * segment_number + col_offset
+        grid["x"][segment_row, cols_of_points] = cos_theta * dx + sin_theta * dy + cx
+        grid["y"][segment_row, cols_of_points] = -sin_theta * dx + cos_theta * dy + cy
+        grid["energy"][segment_row, cols_of_points] = 1.0
+    return PatternData(grid=grid, shape=(rows, cols), spacing=point_distance)
+
+def frame_edges(geometry, cx: float, cy: float, rotation_deg: float):
+    """Edges (x1, y1, x2, y2) of all rings of a (Multi)Polygon in the frame rotated by rotation_deg around (cx, cy)."""
+    theta = np.deg2rad(rotation_deg)
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    rings = shapely.get_rings(shapely.get_parts(shapely.get_parts(geometry)))
+    coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+    fx = cos_theta * (coords[:, 0] - cx) - sin_theta * (coords[:, 1] - cy) + cx
+    fy = sin_theta * (coords[:, 0] - cx) + cos_theta * (coords[:, 1] - cy) + cy
+    same_ring = ring_index[1:] == ring_index[:-1]
+    return fx[:-1][same_ring], fy[:-1][same_ring], fx[1:][same_ring], fy[1:][same_ring]
+
+def scanline_segments(x1, y1, x2, y2, y0: float, row_step: float, rows: int):
+    """
+    Segments (row, start_x, end_x) inside the polygons with the given edges along the scanlines y0 + row * row_step,
+    ordered by row and x.
+    """
+    # Rows crossed by every edge, half open in y so that a vertex is counted once for every ring passing it
+    edge_ymin, edge_ymax = np.minimum(y1, y2), np.maximum(y1, y2)
+    first_row = np.maximum(np.ceil((edge_ymin - y0) / row_step), 0).astype(np.int64)
+    last_row = np.minimum(np.ceil((edge_ymax - y0) / row_step) - 1, rows - 1).astype(np.int64)
+    counts = np.maximum(last_row - first_row + 1, 0)
+    edge = np.repeat(np.arange(len(counts)), counts)
+    row = first_row[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Crossings sorted along every row, consecutive pairs are the segments inside the polygon
+    row_y = y0 + row * row_step
+    crossing_x = x1[edge] + (row_y - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+    # Edges almost along a row divide rounding errors by their tiny height, the crossing stays on the edge
+    crossing_x = np.clip(crossing_x, np.minimum(x1, x2)[edge], np.maximum(x1, x2)[edge])
+    order = np.lexsort((crossing_x, row))
+    row, crossing_x = row[order], crossing_x[order]
+    segment_row, start_x, end_x = row[0::2], crossing_x[0::2], crossing_x[1::2]
+    keep = end_x > start_x
+    return segment_row[keep], start_x[keep], end_x[keep]
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+from obplanner.model.pattern import GridFrame, IslandPatternData, PatternData, point_dtype
+from obplanner.pattern.hatching import frame_edges
+from obplanner.pattern.masking import mask_exact, mask_raster, polygon_parts
+
+# Threads of island_pattern when the caller does not give them, one per CPU unless set_threads is called
+_threads = None
+# (process id, threads, executor) of the threads that are shared by the calls
+_executor = (None, 0, None)
+
+
+def island_pattern(geometry, point_distance: float, pattern_type: str = "square", rotation_deg: float = 0.0,
+                   masking: str = "exact", workers: int = None, anchored: bool = False) -> IslandPatternData:
+    """
+    Pattern of the grid of PatternData.create_empty over the whole geometry, generated only in a window around
+    every polygon of the geometry. The windows are cut from the same grid, so the points keep their positions (and
+    the rows their alignment) across the islands, and with exact masking the points are the same as those of the
+    dense grid. The islands are generated concurrently on workers threads, by default the number given to
+    set_threads or one per CPU. The threads are shared by the calls of a process.
+    """
+    frame = GridFrame.from_bounds(*geometry.bounds, point_distance, pattern_type, rotation_deg, anchored)
+    polygons = polygon_parts(geometry)
+    if len(polygons) == 0:
+        return IslandPatternData(frame=frame, islands=[], origins=[])
+    windows = [_window(frame, polygon) for polygon in polygons]
+
+    def generate(polygon, window):
+        row0, col0, rows, cols = window
+        grid = np.zeros((rows, cols), dtype=point_dtype)
+        grid["x"], grid["y"] = frame.plate_window(row0, col0, rows, cols)
+        if masking == "exact":
+            grid["energy"] = mask_exact(grid["x"], grid["y"], polygon)
+        elif masking == "raster":
+            grid["energy"] = mask_raster(grid["x"], grid["y"], polygon, point_distance, rotation_deg, pattern_type)
+        else:
+            raise ValueError(f"Unsupported masking: {masking}")
+        return PatternData(grid=grid, shape=(rows, cols), spacing=point_distance)
+
+    workers = workers or _threads or os.cpu_count() or 1
+    if workers > 1 and len(polygons) > 1:
+        # The point in polygon tests and the coordinate arithmetic release the GIL
+        islands = list(_shared_executor(workers).map(generate, polygons, windows))
+    else:
+        islands = [generate(polygon, window) for polygon, window in zip(polygons, windows)]
+    return IslandPatternData(frame=frame, islands=islands, origins=[window[:2] for window in windows])
+
+def set_threads(threads: int = None):
+    """
+    Sets the number of threads island_pattern uses by default (None = one per CPU), e.g. 1 in the worker
+    processes of a build, which already use the CPUs.
+    """
+    global _threads
+    _threads = threads
+
+def _shared_executor(threads: int) -> ThreadPoolExecutor:
+    global _executor
+    pid, current_threads, executor = _executor
+    # A forked process starts without the threads of its parent
+    if pid != os.getpid() or current_threads != threads:
+        if pid == os.getpid():
+            executor.shutdown(wait=False)
+        executor = ThreadPoolExecutor(max_workers=threads)
+        _executor = (os.getpid(), threads, executor)
+    return executor
+
+def _window(frame: GridFrame, polygon):
+    # (row0, col0, rows, cols) of the part of the grid that covers the polygon, with a margin of one point
+    x1, y1, _, _ = frame_edges(polygon, frame.cx, frame.cy, frame.rotation_deg)
+    total_rows, total_cols = frame.shape
+    x0 = frame.x0 + frame.col0 * frame.spacing
+    y0 = frame.y0 + frame.row0 * frame.row_height
+    first_row = max(int(np.floor((y1.min() - y0) / frame.row_height)) - 1, 0)
+    if frame.pattern_type == "triangular":
+        first_row -= first_row % 2  # the shifted rows of the window are the shifted rows of the grid
+    last_row = min(int(np.ceil((y1.max() - y0) / frame.row_height)) + 1, total_rows - 1)
+    first_col = max(int(np.floor((x1.min() - x0) / frame.spacing)) - 1, 0)
+    last_col = min(int(np.ceil((x1.max() - x0) / frame.spacing)) + 1, total_cols - 1)
+    return first_row, first_col, max(last_row - first_row + 1, 0), max(last_col - first_col + 1, 0)
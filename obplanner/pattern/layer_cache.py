@@ -0,0 +1,163 @@
+from collections import OrderedDict
+import hashlib
+import json
+
+import numpy as np
+import shapely
+import py3mf_slicer.get_items
+
+from obplanner.pattern.layer_source import LayerSource
+
+
+# Most layers built without comparing them with the previous union
+MAX_REUSE_SKIP = 32
+
+
+class LayerGeometryCache:
+    """
+    Bounded LRU cache for the geometry work in generate_pattern.
+
+    Two levels are cached for the current sliced model:
+      * the shapely slices of a layer (one py3mf_slicer lookup per layer)
+      * the union of the selected components buffered by offset, keyed by (layer, components, offset)
+
+    When a union is missing, a hash of the selected slices without their collinear vertices (which differ from
+    layer to layer) is compared with the previously built union so that consecutive layers with identical geometry
+    (prismatic parts) reuse it instead of rebuilding it. After comparisons that fail, the next 1, 3, 7, ... (at
+    most MAX_REUSE_SKIP) layers are built without one, so models whose layers differ hardly pay for the hash.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.reused = 0
+        self._model = None
+        self._slices = OrderedDict()
+        self._unions = OrderedDict()
+        self._last_union = (None, None)
+        self._failed = 0  # comparisons that failed since the last reuse
+        self._skip = 0  # layers left that are built without comparing
+
+    def clear(self):
+        self._model = None
+        self._slices.clear()
+        self._unions.clear()
+        self._last_union = (None, None)
+        self._failed = 0
+        self._skip = 0
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "reused": self.reused,
+                "size": len(self._unions), "maxsize": self.maxsize}
+
+    def get_slices(self, sliced_model, layer: int):
+        self._check_model(sliced_model)
+        if layer in self._slices:
+            self._slices.move_to_end(layer)
+            return self._slices[layer]
+        if isinstance(sliced_model, LayerSource):
+            component_slices = sliced_model.get_slices(layer)
+        else:
+            component_slices = py3mf_slicer.get_items.get_shapely_slice(sliced_model, layer)
+        self._store(self._slices, layer, component_slices)
+        return component_slices
+
+    def get_union(self, sliced_model, layer: int, components, offset: float):
+        self._check_model(sliced_model)
+        key = (layer, tuple(components), offset)
+        if key in self._unions:
+            self._unions.move_to_end(key)
+            self.hits += 1
+            return self._unions[key]
+        self.misses += 1
+
+        component_slices = self.get_slices(sliced_model, layer)
+        selected_shapes = [component_slices[i] for i in components if component_slices[i] is not None]
+        content_key = None
+        if self._skip > 0:
+            self._skip -= 1
+        else:
+            content_key = (tuple(components), offset, _shape_digest(selected_shapes))
+        if content_key is not None and self._last_union[0] == content_key:
+            self.reused += 1
+            self._failed = 0
+            union_polygon = self._last_union[1]
+        else:
+            union_polygon = shapely.union_all(selected_shapes)
+            if offset != 0.0:
+                union_polygon = union_polygon.buffer(offset)
+            if content_key is not None and self._last_union[0] is not None:
+                self._failed += 1
+                self._skip = min(2 ** self._failed - 1, MAX_REUSE_SKIP)
+            self._last_union = (content_key, union_polygon)
+        self._store(self._unions, key, union_polygon)
+        return union_polygon
+
+    def get_digest(self, sliced_model, layer: int, components) -> bytes:
+        """Content hash of the selected component slices of a layer."""
+        component_slices = self.get_slices(sliced_model, layer)
+        return _wkb_digest([component_slices[i] for i in components if component_slices[i] is not None])
+
+    def _check_model(self, sliced_model):
+        # Entries are only valid for one sliced model, start over when another one is used
+        if sliced_model is not self._model:
+            self.clear()
+            self._model = sliced_model
+
+    def _store(self, cache: OrderedDict, key, value):
+        cache[key] = value
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+
+
+def _shape_digest(shapes) -> bytes:
+    # Hash of the slices without their collinear vertices, equal for slices of the same shape
+    digest = hashlib.blake2b(digest_size=16)
+    for wkb in shapely.to_wkb(shapely.normalize(shapely.simplify(shapes, 0.0))):
+        digest.update(wkb)
+    return digest.digest()
+
+def _wkb_digest(shapes, grid_size: float = 1e-6) -> bytes:
+    # The slicer leaves collinear vertices that differ between layers, canonicalize before hashing
+    canonical = shapely.normalize(shapely.set_precision(shapely.simplify(shapes, 0.0), grid_size))
+    digest = hashlib.blake2b(digest_size=16)
+    for wkb in shapely.to_wkb(canonical):
+        digest.update(wkb)
+    return digest.digest()
+
+
+def number_layers(sliced_model) -> list:
+    """Number of slices of every slice stack of a sliced model or a LayerSource."""
+    if isinstance(sliced_model, LayerSource):
+        return sliced_model.number_layers()
+    return py3mf_slicer.get_items.get_number_layers(sliced_model)
+
+
+def model_fingerprint(sliced_model) -> str:
+    """
+    Fingerprint of a sliced model from the mesh bounding boxes and the z height, vertices and polygons of every
+    slice. Tells whether geometry digests stored for an earlier build can be used without building the shapely
+    slices again; any change of a slice changes it, even when the bounding boxes and the vertex counts stay the
+    same. A LayerSource is fingerprinted by its meshes and layer height instead, without slicing.
+    """
+    if isinstance(sliced_model, LayerSource):
+        return sliced_model.fingerprint()
+    digest = hashlib.blake2b(json.dumps(py3mf_slicer.get_items.get_bounding_boxes(sliced_model)).encode(),
+                             digest_size=16)
+    slice_stacks = sliced_model.GetSliceStacks()
+    while slice_stacks.MoveNext():
+        slice_stack = slice_stacks.GetCurrentSliceStack()
+        digest.update(repr(slice_stack.GetSliceCount()).encode())
+        for i in range(slice_stack.GetSliceCount()):
+            slc = slice_stack.GetSlice(i)
+            polygon_count = slc.GetPolygonCount()
+            digest.update(repr((slc.GetZTop(), slc.GetVertexCount(), polygon_count)).encode())
+            # The float32 vertex coordinates as stored in the model
+            digest.update(b"".join(bytes(vertex.Coordinates) for vertex in slc.GetVertices()))
+            for k in range(polygon_count):
+                indices = slc.GetPolygonIndices(k)
+                digest.update(np.asarray(indices, dtype=np.int64).tobytes() + b";")
+    return digest.hexdigest()
+
+layer_cache = LayerGeometryCache()
@@ -0,0 +1,162 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import math
+import os
+import threading
+
+import numpy as np
+from shapely.geometry import Polygon, MultiPolygon
+from py3mf_slicer.get_items import get_pyvista_meshes
+from py3mf_slicer.slice import identify_pv_polygons2
+
+
+class LayerSource(ABC):
+    """
+    Slices of a model that are produced on demand, in place of a model sliced up front by
+    py3mf_slicer.slice.slice_model. Can be passed everywhere a sliced model is used.
+    """
+
+    @abstractmethod
+    def number_layers(self) -> list:
+        """Number of slices of every slice stack, as get_number_layers."""
+
+    @abstractmethod
+    def get_slices(self, layer: int) -> list:
+        """The shapely geometry of every slice stack on the layer (None where it has no slice), as get_shapely_slice."""
+
+    @abstractmethod
+    def fingerprint(self) -> str:
+        """Fingerprint of the meshes and the layer height, used like model_fingerprint."""
+
+
+class LazySlicedModel(LayerSource):
+    """
+    Sliced model that slices a layer when its slices are first asked for, in place of a model sliced up front by
+    py3mf_slicer.slice.slice_model(model, layer_height).
+
+    The meshes are cut at the same heights as slice_model and the slices are turned into the same shapely
+    geometries as py3mf_slicer.get_items.get_shapely_slice, so the builds are identical. While a layer is used,
+    the next prefetch layers are sliced on a background thread, and only the last window layers are kept.
+    """
+
+    def __init__(self, model, layer_height: float, prefetch: int = 4, window: int = 16):
+        self.layer_height = layer_height
+        self.prefetch = prefetch
+        self.window = max(window, prefetch + 1)
+        self._meshes = get_pyvista_meshes(model)
+        self._heights = [_slice_heights(mesh, layer_height) for mesh in self._meshes]
+        # Layer height as get_layer_height reads it back from the slice heights of the first stack
+        first = self._heights[0] if self._heights else []
+        self._model_layer_height = (first[-1] - first[0]) / (len(first) - 1) if len(first) > 1 else (
+            first[0] if first else 0)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._layers = OrderedDict()
+
+    def number_layers(self) -> list:
+        return [len(heights) for heights in self._heights]
+
+    def get_slices(self, layer: int) -> list:
+        if self.prefetch < 1:
+            return self._slice_layer(layer)
+        future = self._request(layer)
+        for ahead in range(layer + 1, min(layer + 1 + self.prefetch, max(self.number_layers(), default=0))):
+            self._request(ahead)
+        return future.result()
+
+    def fingerprint(self) -> str:
+        # The meshes and the layer height fix all slices
+        digest = hashlib.blake2b(repr(self.layer_height).encode(), digest_size=16)
+        for mesh in self._meshes:
+            digest.update(np.ascontiguousarray(mesh.points).tobytes())
+            digest.update(np.ascontiguousarray(mesh.faces).tobytes())
+        return digest.hexdigest()
+
+    def _request(self, layer: int):
+        with self._lock:
+            # A forked worker process starts without the thread and the layers of its parent
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=1)
+                self._layers = OrderedDict()
+            if layer in self._layers:
+                self._layers.move_to_end(layer)
+                return self._layers[layer]
+            future = self._executor.submit(self._slice_layer, layer)
+            self._layers[layer] = future
+            if len(self._layers) > self.window:
+                self._layers.popitem(last=False)
+            return future
+
+    def _slice_layer(self, layer: int) -> list:
+        # The slice stack lookup of get_shapely_slice
+        eps = 1e-6
+        if self._model_layer_height <= 0:
+            raise ValueError("get_layer_height(model) must be > 0")
+        height = layer * self._model_layer_height
+        slices = []
+        for mesh, heights in zip(self._meshes, self._heights):
+            zmin, zmax = mesh.bounds[4], mesh.bounds[5]
+            stack_layer = int(round((height - zmin) / self._model_layer_height))
+            if zmin - eps <= height <= zmax + eps and 0 <= stack_layer < len(heights):
+                slices.append(_slice_geometry(mesh, heights[stack_layer], eps))
+            else:
+                slices.append(None)
+        return slices
+
+
+def _slice_heights(mesh, layer_height: float) -> list:
+    # Heights at which slice_model cuts the mesh, accumulated in the same way
+    z_min, z_max = mesh.bounds[4], mesh.bounds[5]
+    z = max(math.floor(z_min / layer_height) * layer_height, 0) + layer_height
+    heights = []
+    while z < z_max:
+        heights.append(z)
+        z = z + layer_height
+    return heights
+
+
+def _slice_geometry(mesh, z: float, eps: float):
+    # Polygon or MultiPolygon of the mesh cut at z, None when nothing is left
+    pv_slice = mesh.slice(normal=[0, 0, 1], origin=[0, 0, z])
+    if pv_slice.n_points == 0:
+        return None
+    # The sliced 3mf model stores the vertices as float32
+    vertices = pv_slice.points[:, :2].astype(np.float32).astype(float)
+    polygons = []
+    for indices in identify_pv_polygons2(pv_slice.lines.reshape(-1, 3)[:, 1:]):
+        if len(indices) < 3:
+            continue
+        polygon = Polygon(vertices[np.asarray(indices, dtype=int)])
+        if polygon.is_valid and polygon.area > eps:
+            polygons.append(polygon)
+    if not polygons:
+        return None
+    return polygons[0] if len(polygons) == 1 else _hierarchy(polygons, eps)
+
+
+def _hierarchy(polygons, eps: float):
+    # Outer polygons with the polygons inside them as holes, as in get_shapely_slice
+    polygons = sorted((p for p in polygons if p.is_valid and p.area > 0.0), key=lambda p: p.area, reverse=True)
+    if not polygons:
+        return None
+    outers = [polygons[0]]
+    holes = [[]]
+    for polygon in polygons[1:]:
+        added = False
+        for outer, outer_holes in zip(outers, holes):
+            if outer.buffer(eps).covers(polygon):
+                # Not a hole when it lies inside a hole of the outer polygon
+                if not any(hole.buffer(eps).covers(polygon) for hole in outer_holes):
+                    outer_holes.append(polygon)
+                    added = True
+                    break
+        if not added:
+            outers.append(polygon)
+            holes.append([])
+    parts = [Polygon(outer.exterior, [hole.exterior for hole in outer_holes]) if outer_holes else outer
+             for outer, outer_holes in zip(outers, holes)]
+    return parts[0] if len(parts) == 1 else MultiPolygon(parts)
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import shapely
+
+from obplanner.pattern.layer_source import LayerSource, LazySlicedModel
+
+# Bumped whenever the layout of the cache files changes, older caches are then sliced again
+FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "obplanner", "slices")
+
+# Geometry of a slice
+EMPTY = 0
+POLYGON = 1
+MULTIPOLYGON = 2
+
+_ARRAYS = ["coords", "ring_offsets", "part_offsets", "slice_offsets", "kind"]
+
+
+class SliceCache(LayerSource):
+    """
+    Slices of a model stored on disk in a directory of .npy files that are memory mapped, so the slices of a
+    layer are read straight from the page cache. Slice (layer, stack) is entry layer * stacks + stack:
+      * kind[entry]: EMPTY, POLYGON or MULTIPOLYGON
+      * parts slice_offsets[entry]:slice_offsets[entry + 1], the polygons of the slice
+      * rings part_offsets[part]:part_offsets[part + 1] of every polygon, the exterior first and then the holes
+      * coordinates coords[ring_offsets[ring]:ring_offsets[ring + 1]] of every (closed) ring
+    The coordinates are float32 when that keeps them exact (the vertices of sliced 3mf models are float32).
+    Reading a layer is not free of copies: GEOS keeps its own float64 coordinates, so get_slices copies the
+    mapped coordinates of the layer into the shapely geometries. What the cache saves is the slicing.
+
+    A cache is written in full before it can be read, so the first run of a model slices all layers before the
+    first one is used, and caches are never removed from the cache directory.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Slice cache {path} has format version {meta.get('version')}, not {FORMAT_VERSION}")
+        self.path = path
+        self.layer_height = meta["layer_height"]
+        self._fingerprint = meta["fingerprint"]
+        self._number_layers = meta["number_layers"]
+        self._stacks = len(self._number_layers)
+        for name in _ARRAYS:
+            setattr(self, f"_{name}", np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    @classmethod
+    def open(cls, model, layer_height: float, cache_dir: str = DEFAULT_CACHE_DIR, prefetch: int = 4) -> "SliceCache":
+        """
+        The cache of the model at layer_height in cache_dir, keyed by the fingerprint of the meshes and the layer
+        height. When there is none yet, all layers are sliced (prefetch layers ahead) and written first.
+        """
+        source = LazySlicedModel(model, layer_height, prefetch=prefetch)
+        path = os.path.join(cache_dir, source.fingerprint())
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError):
+            # Missing, from another format version or incomplete
+            shutil.rmtree(path, ignore_errors=True)
+        return cls.write(source, path)
+
+    @classmethod
+    def write(cls, source: LayerSource, path: str) -> "SliceCache":
+        """Slices every layer of source into a new cache at path."""
+        stacks = len(source.number_layers())
+        layers = max(source.number_layers(), default=0)
+        # Arrays of every layer, the slices themselves are dropped as soon as they are packed
+        kinds, coords, ring_lengths, part_rings, slice_parts = [], [], [], [], []
+        for layer in range(layers):
+            geometries = np.array(source.get_slices(layer), dtype=object)
+            present = np.not_equal(geometries, None)
+            kind = np.full(stacks, EMPTY, dtype=np.int8)
+            kind[present] = np.where(shapely.get_type_id(geometries[present]) == 6, MULTIPOLYGON, POLYGON)
+            polygons, slice_index = shapely.get_parts(geometries[present], return_index=True)
+            rings, part_index = shapely.get_rings(polygons, return_index=True)
+            ring_coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+            kinds.append(kind)
+            coords.append(ring_coords)
+            ring_lengths.append(np.bincount(ring_index, minlength=len(rings)))
+            part_rings.append(np.bincount(part_index, minlength=len(polygons)))
+            slice_parts.append(np.bincount(np.flatnonzero(present)[slice_index], minlength=stacks))
+
+        def offsets(counts):
+            return np.concatenate(([0], np.cumsum(np.concatenate(counts + [np.zeros(0, np.int64)])))).astype(np.int64)
+
+        coords = np.concatenate(coords + [np.zeros((0, 2))])
+        if np.array_equal(coords.astype(np.float32), coords):
+            coords = coords.astype(np.float32)
+        arrays = {"coords": coords, "ring_offsets": offsets(ring_lengths), "part_offsets": offsets(part_rings),
+                  "slice_offsets": offsets(slice_parts), "kind": np.concatenate(kinds + [np.zeros(0, np.int8)])}
+        meta = {"version": FORMAT_VERSION, "layer_height": source.layer_height, "fingerprint": source.fingerprint(),
+                "number_layers": source.number_layers()}
+
+        # Written next to the final directory and moved in place, so no reader sees a half written cache
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".slices-")
+        try:
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), values)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, path)
+        except OSError:
+            # Another process wrote the same cache in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                raise
+        return cls(path)
+
+    def number_layers(self) -> list:
+        return list(self._number_layers)
+
+    def get_slices(self, layer: int) -> list:
+        if layer < 0 or layer * self._stacks >= len(self._kind):
+            return [None] * self._stacks
+        first = layer * self._stacks
+        part_start, part_stop = self._slice_offsets[first], self._slice_offsets[first + self._stacks]
+        if part_start == part_stop:
+            return [None] * self._stacks
+        ring_start, ring_stop = self._part_offsets[part_start], self._part_offsets[part_stop]
+        coord_start, coord_stop = self._ring_offsets[ring_start], self._ring_offsets[ring_stop]
+
+        # Rings, polygons and slices of the layer from views of the mapped arrays, shapely copies the coordinates
+        ring_lengths = np.diff(self._ring_offsets[ring_start:ring_stop + 1])
+        rings = shapely.linearrings(np.asarray(self._coords[coord_start:coord_stop], dtype=np.float64),
+                                    indices=np.repeat(np.arange(len(ring_lengths)), ring_lengths))
+        part_rings = np.diff(self._part_offsets[part_start:part_stop + 1])
+        polygons = shapely.polygons(rings, indices=np.repeat(np.arange(len(part_rings)), part_rings))
+        slices = []
+        for entry in range(first, first + self._stacks):
+            parts = polygons[self._slice_offsets[entry] - part_start:self._slice_offsets[entry + 1] - part_start]
+            if self._kind[entry] == EMPTY:
+                slices.append(None)
+            elif self._kind[entry] == POLYGON:
+                slices.append(parts[0])
+            else:
+                slices.append(shapely.MultiPolygon(list(parts)))
+        return slices
+
+    def fingerprint(self) -> str:
+        return self._fingerprint
@@ -0,0 +1,93 @@
+import numpy as np
+import shapely
+from shapely import contains_xy
+
+from obplanner.model.pattern import GridFrame, SparsePatternData
+from obplanner.pattern.hatching import frame_edges, scanline_segments
+
+# Points closer than this (relative to the size of the coordinates) to a polygon edge are tested point by point,
+# well above the float32 rounding of the grid coordinates
+_AMBIGUITY = 1e-6
+
+
+def sparse_pattern(geometry, point_distance: float, pattern_type: str = "square",
+                   rotation_deg: float = 0.0, anchored: bool = False) -> SparsePatternData:
+    """
+    Pattern of the grid of PatternData.create_empty masked by the geometry, as runs of points with energy. The
+    mask is identical to mask_exact (contains_xy) without building the grid.
+
+    The rows of the grid are intersected with the polygon edges in the frame of the grid (as in hatch_pattern),
+    the points between two crossings are inside. Points whose position is within rounding distance of an edge,
+    next to the crossings and along edges that are almost parallel to the rows, are tested with contains_xy on
+    their float32 coordinates like the dense grid. Memory and time follow the number of runs and boundary points.
+    """
+    frame = GridFrame.from_bounds(*geometry.bounds, point_distance, pattern_type, rotation_deg, anchored)
+    rows, cols = frame.shape
+    # Frame position of the first point of the grid
+    x0 = frame.x0 + frame.col0 * point_distance
+    y0 = frame.y0 + frame.row0 * frame.row_height
+    row_length = cols + 1  # keys row * row_length + col leave a gap between the rows
+    eps = _AMBIGUITY * (1.0 + np.abs(geometry.bounds).max() + np.hypot(*frame.shape) * point_distance)
+    x1, y1, x2, y2 = frame_edges(geometry, frame.cx, frame.cy, rotation_deg)
+
+    def columns(row, x_from, x_to):
+        # Columns of the points of every row between x_from and x_to, in the frame
+        shift = np.where(row % 2 == 1, frame.row_shift, 0.0)
+        first = np.maximum(np.ceil((x_from - x0 - shift) / point_distance), 0).astype(np.int64)
+        last = np.minimum(np.floor((x_to - x0 - shift) / point_distance), cols - 1).astype(np.int64)
+        return first, last
+
+    # Runs of points between the crossings of every row
+    run_row, start_x, end_x = scanline_segments(x1, y1, x2, y2, y0, frame.row_height, rows)
+    run_start, run_end = columns(run_row, start_x, end_x)
+    keep = run_start <= run_end
+    # Segments that touch at a vertex can share a point
+    run_first, run_stop = _covered(run_row[keep] * row_length + run_start[keep],
+                                   run_row[keep] * row_length + run_end[keep] + 1)
+
+    # Ambiguous points: the part of every edge within eps of a row, widened by eps along the row
+    edge_ymin, edge_ymax = np.minimum(y1, y2), np.maximum(y1, y2)
+    first_row = np.maximum(np.ceil((edge_ymin - eps - y0) / frame.row_height), 0).astype(np.int64)
+    last_row = np.minimum(np.floor((edge_ymax + eps - y0) / frame.row_height), rows - 1).astype(np.int64)
+    counts = np.maximum(last_row - first_row + 1, 0)
+    edge = np.repeat(np.arange(len(counts)), counts)
+    row = first_row[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+    row_y = y0 + row * frame.row_height
+    y_from = np.maximum(row_y - eps, edge_ymin[edge])
+    y_to = np.minimum(row_y + eps, edge_ymax[edge])
+    dx, dy = (x2 - x1)[edge], (y2 - y1)[edge]
+    slope = np.divide(dx, dy, out=np.zeros_like(dx), where=dy != 0)
+    # Horizontal edges are ambiguous over their whole length
+    x_from = np.where(dy != 0, x1[edge] + (y_from - y1[edge]) * slope, x1[edge])
+    x_to = np.where(dy != 0, x1[edge] + (y_to - y1[edge]) * slope, x2[edge])
+    window_start, window_end = columns(row, np.minimum(x_from, x_to) - eps, np.maximum(x_from, x_to) + eps)
+    lengths = np.maximum(window_end - window_start + 1, 0)
+    window = np.repeat(np.arange(len(lengths)), lengths)
+    ambiguous_cols = window_start[window] + np.arange(len(window)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    ambiguous = np.unique(row[window] * row_length + ambiguous_cols)
+
+    # Test the ambiguous points on the coordinates of the dense grid
+    x, y = frame.coordinates(ambiguous // row_length, ambiguous % row_length)
+    shapely.prepare(geometry)
+    inside = contains_xy(geometry, x, y)
+    run = np.maximum(np.searchsorted(run_first, ambiguous, side="right") - 1, 0)
+    in_run = (ambiguous >= run_first[run]) & (ambiguous < run_stop[run]) if len(run_first) else np.zeros_like(inside)
+
+    # Ambiguous points outside are cut out of the runs, the ones inside are added
+    cut = ambiguous[~inside & in_run]
+    added = ambiguous[inside & ~in_run]
+    first, stop = _covered(np.concatenate((run_first, added)), np.concatenate((run_stop, added + 1)), cut)
+    return SparsePatternData(frame=frame, row=first // row_length, start=first % row_length,
+                             end=stop - 1 - (first // row_length) * row_length,
+                             energy=np.ones(len(first), dtype=np.float32))
+
+def _covered(starts, stops, holes=None):
+    # Union of the half open key ranges [starts, stops) without the keys in holes (each inside at most one range),
+    # as disjoint ranges in key order
+    holes = np.zeros(0, dtype=np.int64) if holes is None else holes
+    positions = np.concatenate((starts, stops, holes, holes + 1))
+    changes = np.concatenate((np.ones(len(starts)), -np.ones(len(stops)), -np.ones(len(holes)), np.ones(len(holes))))
+    positions, index = np.unique(positions, return_inverse=True)
+    coverage = np.rint(np.cumsum(np.bincount(index, weights=changes, minlength=len(positions)))).astype(np.int64)
+    before = np.concatenate(([0], coverage[:-1]))
+    return positions[(coverage > 0) & (before <= 0)], positions[(coverage <= 0) & (before > 0)]
@@ -0,0 +1,35 @@
+from dataclasses import asdict
+import hashlib
+import json
+
+from obplanner.model.strategies import Strategy
+
+# Strategies whose output changes between calls unless a seed is given in the settings
+unseeded_random = {"SpotRandom"}
+
+
+def strategy_content_key(strategy: Strategy, layer: int, geometry_digest: str, previous_digest: str = None) -> str:
+    """
+    Content key of the OBP file that a strategy produces on a layer, geometry_digest is the digest of the selected
+    slices (LayerGeometryCache.get_digest). Two layers get the same key when the selected slices, the strategy
+    parameters and the effective grid rotation are the same, so the file of the first one can be used for both.
+    previous_digest is the digest of the selected slices of the previous layer, for strategies that depend on it.
+    """
+    params = asdict(strategy)
+    params.pop("repetitions")  # only used in buildInfo.json
+    pattern = params["pattern"]
+    rotation = pattern.pop("start_rotation") + pattern.pop("layer_rotation") * layer
+    pattern["rotation"] = round(rotation % 360.0, 9)
+    # Sparse, island and dense patterns give the same output
+    pattern.pop("sparse")
+    pattern.pop("islands")
+    # Keys of builds without compensation stay the same
+    if not pattern["compensation"]:
+        pattern.pop("compensation")
+    if strategy.strategy in unseeded_random and strategy.settings.get("seed") is None:
+        params["layer"] = layer
+    params["geometry_digest"] = geometry_digest
+    if previous_digest is not None:
+        params["previous_geometry_digest"] = previous_digest
+    digest = hashlib.blake2b(json.dumps(params, sort_keys=True, default=str).encode(), digest_size=16)
+    return digest.hexdigest()
@@ -1,14 +1,26 @@
 from obplanner.model.pattern import PatternData
 from obplanner.model.strategies import Strategy
+from obplanner.model.scan_path import ScanPath
 import obplanner.strategy.strategy_mapping as strategy_mapping
+import obplanner.strategy.helpers.path_order as path_order
 
 
-def create_obp_elements(pattern: PatternData, strategy: Strategy):
+def create_obp_elements(pattern: PatternData, strategy: Strategy, stats: dict = None) -> ScanPath:
+    # stats gets the jump length in mm of the path before it is ordered ("unordered_jump_length")
     strategy_name = strategy.strategy # Name of strategy
+    if strategy.pattern.type == "hatch" and strategy_name not in strategy_mapping.hatch_strategies:
+        raise ValueError(f"Hatch patterns can only be scanned by {', '.join(strategy_mapping.hatch_strategies)}, "
+                         f"got {strategy_name}")
     # sort paths
     function_path = strategy_mapping.sort_function_map.get(strategy_name) # Get the sorting function
     if function_path:
-        return function_path(pattern, strategy)  # Call the function
+        scan_path = function_path(pattern, strategy)  # Call the function
+        if stats is not None:
+            stats["unordered_jump_length"] = path_order.jump_length(scan_path)
+        if strategy.settings.get("order") == "nearest":
+            # Reorder the lines and spots to shorten the jumps between them
+            scan_path = path_order.order_nearest(scan_path, strategy.settings.get("flip", True))
+        return scan_path
     else:
         print(f"Sorting function '{strategy_name}' not found.")
-        return None
\ No newline at end of file
+        return ScanPath.empty()
\ No newline at end of file
@@ -1,30 +1,59 @@
 import numpy as np
-from obplanner.model.pattern import PatternData
+from obplanner.model.pattern import IslandPatternData, PatternData, SparsePatternData
 
 # Define the dtype for the array
 point_dtype = np.dtype([("x", np.float32), ("y", np.float32), ("energy", np.float32)])
 
-def find_connections(pattern: PatternData):
-    # Instead of appending in each loop, use a list comprehension
-    return [find_connected_points(row) for row in pattern.grid]
-
-def find_connected_points(row):
-    connected_points = []
-    current_group = []
-    
-    # Iterate through the row and group consecutive points with the same energy
-    for i in range(len(row)):
-        if not current_group:
-            current_group.append(row[i])
-        elif row[i]['energy'] == current_group[-1]['energy']:
-            current_group.append(row[i])
-        else:
-            if len(current_group) > 1:  # Only keep groups with more than one connected point
-                connected_points.append(current_group)  # Append the list directly
-            current_group = [row[i]]
-    
-    # Append the last group if it's valid
-    if len(current_group) > 1:
-        connected_points.append(current_group)
-    
-    return connected_points
+def find_runs(pattern: PatternData, min_length: int = 2):
+    """
+    Finds all runs of consecutive points with equal energy along the rows of the grid in one pass.
+    Sparse and island patterns only have the runs with energy.
+
+    Args:
+        pattern : PatternData, SparsePatternData or IslandPatternData
+        min_length (int): Shortest run (in points) that is kept
+
+    Returns:
+        Tuple of arrays (row, start_col, end_col, energy), ordered by row and then by start column
+    """
+    if isinstance(pattern, SparsePatternData):
+        keep = pattern.end - pattern.start + 1 >= min_length
+        return pattern.row[keep], pattern.start[keep], pattern.end[keep], pattern.energy[keep]
+    if isinstance(pattern, IslandPatternData):
+        runs = [np.zeros(0, dtype=np.intp)] * 3 + [np.zeros(0, dtype=np.float32)]
+        for island, (row0, col0) in zip(pattern.islands, pattern.origins):
+            rows, start_cols, end_cols, energy = find_runs(island, min_length)
+            active = energy > 0
+            runs = [np.concatenate((all_values, values[active] + offset)) for all_values, values, offset
+                    in zip(runs, (rows, start_cols, end_cols, energy), (row0, col0, col0, 0))]
+        order = np.lexsort((runs[1], runs[0]))
+        return tuple(values[order] for values in runs)
+    energy = pattern.grid["energy"]
+    if energy.ndim != 2 or energy.size == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty, np.zeros(0, dtype=energy.dtype)
+
+    # A run starts at the first column and wherever the energy changes, and ends right before a change
+    change = energy[:, 1:] != energy[:, :-1]
+    starts = np.ones(energy.shape, dtype=bool)
+    starts[:, 1:] = change
+    ends = np.ones(energy.shape, dtype=bool)
+    ends[:, :-1] = change
+
+    rows, start_cols = np.nonzero(starts)
+    _, end_cols = np.nonzero(ends)
+
+    keep = end_cols - start_cols + 1 >= min_length
+    rows, start_cols, end_cols = rows[keep], start_cols[keep], end_cols[keep]
+    return rows, start_cols, end_cols, energy[rows, start_cols]
+
+def row_order(total_rows: int, start: int = 1, jump: int = 1):
+    """
+    Order in which rows are visited: every jump:th row beginning at row start (1-based),
+    then the rows in between, and finally the rows that were skipped before start.
+    """
+    order = np.concatenate([np.arange(start - 1 + offset, total_rows, jump) for offset in range(jump)]
+                           + [np.zeros(0, dtype=int)])
+    order = order[(order >= 0) & (order < total_rows)]
+    remaining = np.setdiff1d(np.arange(total_rows), order)
+    return np.concatenate([order, remaining])
@@ -1,23 +1,28 @@
 import numpy as np
-from scipy.ndimage import binary_erosion
+from scipy.ndimage import distance_transform_edt, map_coordinates
 from skimage import measure
 
-from obplanner.model.pattern import PatternData
+from obplanner.model.pattern import IslandPatternData, PatternData
 
-def offset_all(pattern: PatternData, offset_mm: float, energy_threshold: float = 0.0):
-    contours = []
-    all_same = False
-    offset = 0
-    while not all_same:
-        offset_contour = extract_offset_contour_by_distance(pattern, offset, energy_threshold)
-        if contours and contours[-1] and len(contours[-1][0]) > 0:
-            all_same = np.all(contours[-1][0] == contours[-1][0][0, 0])
-        if not all_same:
-            contours.append(offset_contour)
-        offset += offset_mm
-    return contours
+# Distance in grid steps below which consecutive contour vertices are the same vertex
+REPEATED_VERTEX = 1e-9
 
+def offset_all(pattern: PatternData, offset_mm: float, energy_threshold: float = 0.0):
+    """
+    Inward offset contours of the pattern every offset_mm, starting at the outer contour and moving inwards until
+    the part is used up. All offsets are iso-contours of a single distance transform of the mask. Island patterns
+    are transformed island by island, with the same contours in the same order as their dense grid.
 
+    Returns:
+        List[List[np.ndarray]]: Per offset, a list of contours (each a Nx2 array of [x, y] points)
+    """
+    if offset_mm <= 0:
+        raise ValueError(f"Offset distance must be positive, got {offset_mm}")
+    if isinstance(pattern, IslandPatternData):
+        return _offset_islands(pattern, offset_mm, energy_threshold)
+    distance, first_level = _distance_to_outside(pattern, energy_threshold)
+    levels = np.arange(first_level, distance.max(), offset_mm)
+    return [_contours_at(pattern, distance, level) for level in levels]
 
 def extract_offset_contour_by_distance(pattern: PatternData, offset_mm: float, energy_threshold: float = 0.0):
     """
@@ -31,42 +36,98 @@ def extract_offset_contour_by_distance(pattern: PatternData, offset_mm: float, e
     Returns:
         List[np.ndarray]: A list of contours (each a Nx2 array of [x, y] points)
     """
-    grid = pattern.grid
-    # Extract fields
-    energy = grid['energy']
-    x_coords = grid['x']
-    y_coords = grid['y']
+    distance, first_level = _distance_to_outside(pattern, energy_threshold)
+    return _contours_at(pattern, distance, first_level + offset_mm)
 
-    # Estimate physical spacing from grid
-    dx = np.mean(np.abs(np.diff(x_coords, axis=1)))
-    dy = np.mean(np.abs(np.diff(y_coords, axis=0)))
-    pixel_size = np.mean([dx, dy])
+def _distance_to_outside(pattern: PatternData, energy_threshold: float):
+    # Euclidean distance in mm from every grid point to the closest point outside the mask. The grid is padded
+    # by one outside point on every side so that all contours are closed.
+    mask = np.pad(pattern.mask(energy_threshold), 1)
+    if not mask.any():
+        return np.zeros(mask.shape), 0.0
+    # Physical distance between neighbouring points along the rows, and between the rows (perpendicular to them,
+    # rows of triangular grids are shifted half a point). Grids with a frame know them exactly.
+    if pattern.frame is not None:
+        row_step, col_step = pattern.frame.row_height, pattern.spacing
+    else:
+        row_step, col_step = _grid_steps(pattern)
+    distance = distance_transform_edt(mask, sampling=(row_step, col_step))
+    # The outer contour lies half way between the last point inside and the first point outside
+    return distance, min(row_step, col_step) / 2
 
-    # Convert offset distance to erosion steps
-    erosion_steps = int(round(offset_mm / pixel_size))
-    if erosion_steps <= 0:
-        erosion_steps = 1
+def _offset_islands(pattern: IslandPatternData, offset_mm: float, energy_threshold: float):
+    # The window of an island has a margin of outside points, so the distances of its points are those of the
+    # whole grid.
+    steps = (pattern.frame.row_height, pattern.spacing)
+    distances = []
+    for island in pattern.islands:
+        mask = np.pad(island.mask(energy_threshold), 1)
+        distances.append(distance_transform_edt(mask, sampling=steps) if mask.any() else np.zeros(mask.shape))
+    top = max((distance.max() for distance in distances), default=0.0)
+    if top == 0.0:
+        return []
+    offsets = []
+    for level in np.arange(min(steps) / 2, top, offset_mm):
+        contours = [contour + origin for distance, origin in zip(distances, pattern.origins)
+                    for contour in measure.find_contours(distance, level=level)]
+        offsets.append(_contour_points(pattern, contours))
+    return offsets
 
-    # Create initial mask
-    mask = energy > energy_threshold
+def _grid_steps(pattern: PatternData):
+    grid = pattern.grid
+    col_step = pattern.spacing
+    row_step = pattern.spacing
+    if grid.shape[1] > 1:
+        col_x, col_y = np.mean(np.diff(grid['x'], axis=1)), np.mean(np.diff(grid['y'], axis=1))
+        col_step = np.hypot(col_x, col_y)
+        if grid.shape[0] > 1:
+            row_x, row_y = np.mean(np.diff(grid['x'], axis=0)), np.mean(np.diff(grid['y'], axis=0))
+            row_step = abs(row_x * col_y - row_y * col_x) / col_step
+    elif grid.shape[0] > 1:
+        row_step = np.hypot(np.mean(np.diff(grid['x'], axis=0)), np.mean(np.diff(grid['y'], axis=0)))
+    return row_step, col_step
 
-    # Apply erosion
-    for _ in range(erosion_steps):
-        if not mask.any():
-            return []  # no contour possible
-        mask = binary_erosion(mask)
+def _contours_at(pattern: PatternData, distance: np.ndarray, level: float):
+    return _contour_points(pattern, measure.find_contours(distance, level=level))
 
-    # Extract contours from eroded mask
-    contours = measure.find_contours(mask.astype(float), level=0.5)
-    real_contours = []
+def _contour_points(pattern: PatternData, contours):
+    # x and y of the contours given by fractional (row, col) of the padded grid. Where the level passes (within
+    # rounding) through a grid point, marching squares leaves repeated vertices and starts contours at vertices
+    # that depend on the magnitude of the indices. The contours are made independent of the part of the grid
+    # they were found in: repeated vertices are dropped, closed contours start at their first vertex in row-major
+    # order and the contours are ordered by it.
+    contours = [_canonical_contour(contour) for contour in contours]
+    if not contours:
+        return []
+    contours.sort(key=lambda contour: tuple(np.round(contour[0], 6)))
+    indices = np.concatenate(contours).T
+    points = np.column_stack(_padded_coordinates(pattern, indices))
+    return np.split(points, np.cumsum([len(c) for c in contours])[:-1])
 
-    for c in contours:
-        pts = []
-        for y, x in c:
-            yi, xi = int(round(y)), int(round(x))
-            if 0 <= yi < grid.shape[0] and 0 <= xi < grid.shape[1]:
-                pts.append([x_coords[yi, xi], y_coords[yi, xi]])
-        if pts:
-            real_contours.append(np.array(pts))
+def _canonical_contour(contour: np.ndarray) -> np.ndarray:
+    keep = np.ones(len(contour), dtype=bool)
+    keep[1:] = np.hypot(*np.diff(contour, axis=0).T) > REPEATED_VERTEX
+    contour = contour[keep]
+    if len(contour) < 3 or not np.allclose(contour[0], contour[-1], rtol=0, atol=REPEATED_VERTEX):
+        return contour
+    ring = contour[:-1]
+    rounded = np.round(ring, 6)
+    first = np.lexsort((rounded[:, 1], rounded[:, 0]))[0]
+    ring = np.roll(ring, -first, axis=0)
+    return np.concatenate((ring, ring[:1]))
 
-    return real_contours
+def _padded_coordinates(pattern: PatternData, indices: np.ndarray):
+    # x and y at fractional (row, col) of the padded grid, the padding continues the grid linearly
+    if pattern.frame is not None:
+        frame = pattern.frame
+        rows, cols = indices[0] - 1, indices[1] - 1
+        # The shift of the odd rows is interpolated between two rows as well
+        below = np.floor(rows)
+        fraction = rows - below
+        shift = frame.row_shift * np.where(below % 2 == 1, 1 - fraction, fraction)
+        return frame.to_plate(frame.x0 + (frame.col0 + cols) * frame.spacing + shift,
+                              frame.y0 + (frame.row0 + rows) * frame.row_height)
+    x = np.pad(pattern.grid['x'].astype(np.float64), 1, mode="reflect", reflect_type="odd")
+    y = np.pad(pattern.grid['y'].astype(np.float64), 1, mode="reflect", reflect_type="odd")
+    return (map_coordinates(x, indices, order=1, mode="nearest"),
+            map_coordinates(y, indices, order=1, mode="nearest"))
@@ -0,0 +1,124 @@
+import bisect
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from obplanner.model.scan_path import ScanPath, LINE, SYNC
+
+
+def jump_length(path: ScanPath) -> float:
+    """Total length in mm of the jumps between consecutive lines and spots of a path."""
+    scan = path.kind != SYNC
+    x0, y0 = path.x0[scan].astype(np.float64), path.y0[scan].astype(np.float64)
+    x1, y1 = path.x1[scan].astype(np.float64), path.y1[scan].astype(np.float64)
+    return float(np.hypot(x0[1:] - x1[:-1], y0[1:] - y1[:-1]).sum()) / 1000
+
+def order_nearest(path: ScanPath, flip: bool = True, two_opt_rounds: int = 20, neighbours: int = 8) -> ScanPath:
+    """
+    Reorders the lines and spots of a path to shorten the jumps between them. A nearest neighbour tour is built
+    from the first element of the path with a KD-tree, where lines may also be scanned in reverse when flip is set,
+    and refined with 2-opt moves between elements that are close to each other. 2-opt reverses parts of the tour,
+    so it is only used when every element can be flipped (flip set, or spots only).
+    Paths with sync points are returned unchanged.
+    """
+    n = len(path)
+    if n < 3 or np.any(path.kind == SYNC):
+        return path
+    start = np.column_stack((path.x0, path.y0)).astype(np.float64)
+    end = np.column_stack((path.x1, path.y1)).astype(np.float64)
+    flippable = (path.kind == LINE) & flip
+    order, flipped = _nearest_tour(start, end, flippable)
+    if np.all(flippable | np.all(start == end, axis=1)):
+        order, flipped = _two_opt(start, end, order, flipped, two_opt_rounds, neighbours)
+
+    ordered = path.take(order)
+    # Flipped lines are scanned from their end to their start
+    ordered.x0, ordered.x1 = np.where(flipped, ordered.x1, ordered.x0), np.where(flipped, ordered.x0, ordered.x1)
+    ordered.y0, ordered.y1 = np.where(flipped, ordered.y1, ordered.y0), np.where(flipped, ordered.y0, ordered.y1)
+    return ordered
+
+def _nearest_tour(start, end, flippable):
+    n = len(start)
+    # Every element can be entered at its start, flippable elements also at their end
+    candidate_unit = np.concatenate((np.arange(n), np.flatnonzero(flippable)))
+    candidate_reversed = np.concatenate((np.zeros(n, dtype=bool), np.ones(np.count_nonzero(flippable), dtype=bool)))
+    candidate_point = np.concatenate((start, end[flippable]))
+
+    visited = np.zeros(n, dtype=bool)
+    order = np.zeros(n, dtype=np.intp)
+    flipped = np.zeros(n, dtype=bool)
+    visited[0] = True
+    position = end[0]
+    alive = np.flatnonzero(~visited[candidate_unit])
+    tree = cKDTree(candidate_point[alive])
+    units, reversed_, alive_list = candidate_unit.tolist(), candidate_reversed.tolist(), alive.tolist()
+    dead = 0
+    for step in range(1, n):
+        # Widen the search until an unvisited element is found
+        k = 8
+        candidate = None
+        while candidate is None:
+            k = min(k, len(alive_list))
+            _, index = tree.query(position, k=k)
+            for c in np.atleast_1d(index).tolist():
+                if not visited[units[alive_list[c]]]:
+                    candidate = alive_list[c]
+                    break
+            k *= 2
+        unit = units[candidate]
+        order[step] = unit
+        flipped[step] = reversed_[candidate]
+        visited[unit] = True
+        position = start[unit] if flipped[step] else end[unit]
+        dead += 2 if flippable[unit] else 1
+        # Rebuild the tree without the visited elements once half of it is dead
+        if dead * 2 > len(alive_list) and step < n - 1:
+            alive = np.flatnonzero(~visited[candidate_unit])
+            tree = cKDTree(candidate_point[alive])
+            alive_list = alive.tolist()
+            dead = 0
+    return order, flipped
+
+def _two_opt(start, end, order, flipped, rounds, neighbours, min_gain=1e-3):
+    # Reversing the elements i+1..j of the tour replaces the jumps i -> i+1 and j -> j+1 by i -> j and i+1 -> j+1.
+    # Candidate moves pair i with the elements whose exit is closest to its exit; every round applies the best
+    # improving moves that do not overlap, until a round gains less than min_gain of the jump length.
+    n = len(order)
+    k = min(neighbours + 1, n)
+    for _ in range(rounds):
+        entry = np.where(flipped[:, np.newaxis], end[order], start[order])
+        exit = np.where(flipped[:, np.newaxis], start[order], end[order])
+        _, near = cKDTree(exit).query(exit, k=k)
+        i = np.repeat(np.arange(n), k)
+        j = near.ravel()
+        i, j = np.minimum(i, j), np.maximum(i, j)
+        keep = j > i
+        i, j = i[keep], j[keep]
+        has_next = j + 1 < n
+        j_next = np.minimum(j + 1, n - 1)
+        delta = (np.hypot(*(exit[i] - exit[j]).T) - np.hypot(*(exit[i] - entry[i + 1]).T)
+                 + np.where(has_next, np.hypot(*(entry[i + 1] - entry[j_next]).T)
+                            - np.hypot(*(exit[j] - entry[j_next]).T), 0.0))
+        improving = np.flatnonzero(delta < -1e-6)
+        if len(improving) == 0:
+            break
+        length = np.hypot(*(entry[1:] - exit[:-1]).T).sum()
+        # Best moves first, each one touches the tour from i to j + 1
+        accepted_starts, accepted_stops = [], []
+        gain = 0.0
+        best = improving[np.argsort(delta[improving])]
+        for first, last, change in zip(i[best].tolist(), (j[best] + 1).tolist(), delta[best].tolist()):
+            position = bisect.bisect_left(accepted_starts, first)
+            if position > 0 and accepted_stops[position - 1] >= first:
+                continue
+            if position < len(accepted_starts) and accepted_starts[position] <= last:
+                continue
+            accepted_starts.insert(position, first)
+            accepted_stops.insert(position, last)
+            gain -= change
+        for first, last in zip(accepted_starts, accepted_stops):
+            order[first + 1:last] = order[first + 1:last][::-1]
+            flipped[first + 1:last] = ~flipped[first + 1:last][::-1]
+        if gain < min_gain * length:
+            break
+    return order, flipped
@@ -1,8 +1,10 @@
 import numpy as np
 import obplib as obp
+import shapely
 
 from obplanner.model.pattern import PatternData
 from obplanner.model.strategies import Strategy
+from obplanner.model.scan_path import ScanPath
 
 
 import obplanner.strategy.helpers.find_contours as find_contours
@@ -10,17 +12,31 @@ import obplanner.strategy.helpers.find_connected as find_connected
 import obplanner.strategy.helpers.offset_pattern as offset_pattern
 
 def ContourLine(pattern: PatternData, strategy: Strategy):
-    objects = []
-    bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-    for row in range(pattern.grid.shape[0]):
-        for col in range(pattern.grid.shape[1]-1):
-            if pattern.grid.shape[1] > 1:
-                point1 = pattern.grid[row, col]
-                point2 = pattern.grid[row, col+1]
-                if point1["energy"] > 0 and point2["energy"] > 0:
-                    a = obp.Point(point1["x"]*1000, point1["y"]*1000)
-                    b = obp.Point(point2["x"]*1000, point2["y"]*1000)
-                    speed = strategy.speed * point1["energy"]
-                    objects.append(obp.Line(a, b, int(speed), bp))
+    # Lines along every row of contour points that have energy. Stretches of equal energy are simplified with
+    # Douglas-Peucker, no point moves more than max_deviation mm (0 only merges collinear lines).
+    max_deviation = strategy.settings.get("max_deviation", 0.0)
+    rows, start_cols, end_cols, energy = find_connected.find_runs(pattern, min_length=1)
+    active = energy > 0
+    rows, start_cols, end_cols, energy = rows[active], start_cols[active], end_cols[active], energy[active]
+    # A stretch also covers the line to the next point when that point has another (non zero) energy
+    cols_per_row = pattern.shape[1]
+    next_col = np.minimum(end_cols + 1, cols_per_row - 1)
+    end_cols = np.where((end_cols + 1 < cols_per_row) & (pattern.energy_at(rows, next_col) > 0), next_col, end_cols)
+    lengths = end_cols - start_cols + 1
+    keep = lengths > 1
+    rows, start_cols, lengths, energy = rows[keep], start_cols[keep], lengths[keep], energy[keep]
+    if len(rows) == 0:
+        return ScanPath.empty()
 
-    return objects
\ No newline at end of file
+    stretch = np.repeat(np.arange(len(rows)), lengths)
+    cols = np.repeat(start_cols, lengths) + np.arange(len(stretch)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    x, y = pattern.coordinates(np.repeat(rows, lengths), cols)
+    lines = shapely.linestrings(np.column_stack((x, y)).astype(np.float64), indices=stretch)
+    lines = shapely.simplify(lines, max_deviation, preserve_topology=False)
+    coords, index = shapely.get_coordinates(lines, return_index=True)
+
+    # Lines between the consecutive points of every simplified stretch
+    same = index[1:] == index[:-1]
+    point1, point2, energy = coords[:-1][same], coords[1:][same], energy[index[:-1][same]]
+    return ScanPath.lines(point1[:, 0]*1000, point1[:, 1]*1000, point2[:, 0]*1000, point2[:, 1]*1000,
+                          (strategy.speed / energy).astype(np.int64), strategy.spot_size, strategy.power)
@@ -3,6 +3,7 @@ import obplib as obp
 
 from obplanner.model.pattern import PatternData
 from obplanner.model.strategies import Strategy
+from obplanner.model.scan_path import ScanPath
 
 
 import obplanner.strategy.helpers.find_contours as find_contours
@@ -10,96 +11,65 @@ import obplanner.strategy.helpers.find_connected as find_connected
 import obplanner.strategy.helpers.offset_pattern as offset_pattern
 
 def LineSort(pattern: PatternData, strategy: Strategy):
-    start = strategy.settings.get("start", 1)
-    jump = strategy.settings.get("jump", 1)
-    connected = find_connected.find_connections(pattern)
-    objects = []
-    total_rows = len(connected)
-    visited_rows = []
-    # Generate the reordered row indices
-    for offset in range(jump):
-        for i in range(start - 1 + offset, total_rows, jump):
-            visited_rows.append(i)
-    # Append remaining rows not yet included (e.g., row 1 if start=2)
-    for i in range(total_rows):
-        if i not in visited_rows:
-            visited_rows.append(i)
-    # Process each row in the new order
-    for i in visited_rows:
-        row = connected[i]
-        for el in row:
-            if len(el) > 1 and el[0]["energy"] > 0:
-                bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-                a = obp.Point(el[0]["x"] * 1000, el[0]["y"] * 1000)
-                b = obp.Point(el[-1]["x"] * 1000, el[-1]["y"] * 1000)
-                speed = strategy.speed * el[0]["energy"]
-                objects.append(obp.Line(a, b, int(speed), bp))
-    return objects
-    
+    return _ordered_lines(pattern, strategy, snake=False)
+
 def LineSnake(pattern: PatternData, strategy: Strategy):
+    return _ordered_lines(pattern, strategy, snake=True)
+
+def _ordered_lines(pattern: PatternData, strategy: Strategy, snake: bool):
     start = strategy.settings.get("start", 1)
     jump = strategy.settings.get("jump", 1)
+    rows, start_cols, end_cols, energy = find_connected.find_runs(pattern, min_length=1)
+    active = energy > 0
+    rows, start_cols, end_cols, energy = rows[active], start_cols[active], end_cols[active], energy[active]
+    # A line also covers the step to the next point when that point has another (non zero) energy
+    cols_per_row = pattern.shape[1]
+    next_col = np.minimum(end_cols + 1, cols_per_row - 1)
+    end_cols = np.where((end_cols + 1 < cols_per_row) & (pattern.energy_at(rows, next_col) > 0), next_col, end_cols)
+    keep = end_cols > start_cols
+    rows, start_cols, end_cols, energy = rows[keep], start_cols[keep], end_cols[keep], energy[keep]
 
-    connected = find_connected.find_connections(pattern)
-    objects = []
-    total_rows = len(connected)
-
-    # Build the row visitation order just like LineSort
-    visited_rows = []
-    for offset in range(jump):
-        for i in range(start - 1 + offset, total_rows, jump):
-            visited_rows.append(i)
-    # Append any rows not yet included (e.g., row 0 when start=2)
-    for i in range(total_rows):
-        if i not in visited_rows:
-            visited_rows.append(i)
-
-    # Process rows in the computed order; alternate direction per processed row
-    for seq_idx, row_idx in enumerate(visited_rows):
-        row = connected[row_idx]
-        if seq_idx % 2 == 0:
-            # forward
-            for el in row:
-                if len(el) > 1 and el[0]["energy"] > 0:
-                    bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-                    a = obp.Point(el[0]["x"] * 1000, el[0]["y"] * 1000)
-                    b = obp.Point(el[-1]["x"] * 1000, el[-1]["y"] * 1000)
-                    speed = strategy.speed * el[0]["energy"]
-                    objects.append(obp.Line(a, b, int(speed), bp))
-        else:
-            # reverse
-            for el in reversed(row):
-                if len(el) > 1 and el[0]["energy"] > 0:
-                    bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-                    # Note: reverse the segment endpoints (last -> first)
-                    a = obp.Point(el[-1]["x"] * 1000, el[-1]["y"] * 1000)
-                    b = obp.Point(el[0]["x"] * 1000, el[0]["y"] * 1000)
-                    speed = strategy.speed * el[0]["energy"]
-                    objects.append(obp.Line(a, b, int(speed), bp))
+    # Position of every row in the visiting order
+    order = find_connected.row_order(pattern.shape[0], start, jump)
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    run_rank = rank[rows]
+    if snake:
+        # Every second processed row is scanned backwards with reversed segment endpoints
+        reverse = run_rank % 2 == 1
+        sort = np.lexsort((np.where(reverse, -start_cols, start_cols), run_rank))
+        start_cols, end_cols = np.where(reverse, end_cols, start_cols), np.where(reverse, start_cols, end_cols)
+    else:
+        sort = np.argsort(run_rank, kind="stable")
+    rows, start_cols, end_cols, energy = rows[sort], start_cols[sort], end_cols[sort], energy[sort]
 
-    return objects
+    x0, y0 = pattern.coordinates(rows, start_cols)
+    x1, y1 = pattern.coordinates(rows, end_cols)
+    return ScanPath.lines(
+        x0=x0 * 1000,
+        y0=y0 * 1000,
+        x1=x1 * 1000,
+        y1=y1 * 1000,
+        speed=(strategy.speed / energy).astype(np.int64),  # more energy per length at lower speed
+        spot_size=strategy.spot_size,
+        power=strategy.power,
+    )
 
 def LineConcentric(pattern: PatternData, strategy: Strategy):
     direction = strategy.settings.get("direction", "inward")
-    bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-    objects = []
-    offset_contour = offset_pattern.offset_all(pattern, 0.35)
+    line_distance = strategy.settings.get("line_distance", 0.35)
+    offset_contour = offset_pattern.offset_all(pattern, line_distance)
     if direction == "inward":
-        for contour in offset_contour:
-            for c in contour:
-                for i in range(len(c)-1):
-                    a = obp.Point(c[i, 0]*1000, c[i, 0]*1000)
-                    b = obp.Point(c[i+1, 0]*1000, c[i+1, 0]*1000)
-                    speed = strategy.speed
-                    objects.append(obp.Line(a,b,int(speed),bp))
+        contours = [c for contour in offset_contour for c in contour]
     elif direction == "outward":
-        for contour in reversed(offset_contour):
-            for c in contour:
-                for i in range(len(c)-1):
-                    a = obp.Point(c[i, 0]*1000, c[i, 0]*1000)
-                    b = obp.Point(c[i+1, 0]*1000, c[i+1, 0]*1000)
-                    speed = strategy.speed
-                    objects.append(obp.Line(a,b,int(speed),bp))
+        contours = [c for contour in reversed(offset_contour) for c in contour]
     else:
         print("Wrong in setting for direction of concentric scan")
-    return objects
\ No newline at end of file
+        contours = []
+    contours = [c for c in contours if len(c) > 1]
+    if not contours:
+        return ScanPath.empty()
+    start = np.concatenate([c[:-1] for c in contours]) * 1000
+    end = np.concatenate([c[1:] for c in contours]) * 1000
+    return ScanPath.lines(start[:, 0], start[:, 1], end[:, 0], end[:, 1],
+                          int(strategy.speed), strategy.spot_size, strategy.power)
@@ -3,34 +3,84 @@ import obplib as obp
 
 from obplanner.model.pattern import PatternData
 from obplanner.model.strategies import Strategy
+from obplanner.model.scan_path import ScanPath
 
 def SpotRandom(pattern: PatternData, strategy: Strategy):
-    spots = pattern.grid.ravel()
-    spots = spots[spots["energy"] > 0]
-    seed = strategy.settings.get("seed", None)
-    if seed != None:
-        np.random.seed(seed)
-    np.random.shuffle(spots)
-    points = []
-    dwell_time = []
-    for spot in spots:
-        points.append(obp.Point(spot["x"]*1000, spot["y"]*1000))
-        dwell_time.append(int(strategy.dwell_time*spot["energy"]))
-    bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-    return [obp.TimedPoints(points, dwell_time, bp)]
-    
+    rows, cols, energy = pattern.active()
+    x, y = pattern.coordinates(rows, cols)
+    # A generator per call keeps seeded results independent of other strategies and processes
+    rng = np.random.default_rng(strategy.settings.get("seed", None))
+    min_distance = strategy.settings.get("min_distance", None)
+    if min_distance:
+        order = dispersed_order(x, y, min_distance, rng)
+    else:
+        order = rng.permutation(len(energy))
+    x, y, energy = x[order], y[order], energy[order]
+    return ScanPath.spots(x*1000, y*1000, (strategy.dwell_time*energy).astype(np.int64),
+                          strategy.spot_size, strategy.power)
+
 def SpotOrdered(pattern: PatternData, strategy: Strategy):
     x_jump = strategy.settings.get("x_jump", 1)
     y_jump = strategy.settings.get("y_jump", 1)
-    points = []
-    dwell_time = []
-    for xi in range(x_jump):
-        for yi in range(y_jump):
-            subgrid = pattern.grid[xi::x_jump, yi::y_jump]
-            # Now process all elements in subgrid at once or with a simple loop
-            for element in subgrid.ravel():  # Flatten if needed
-                if element["energy"] > 0:
-                    points.append(obp.Point(element["x"]*1000, element["y"]*1000))
-                    dwell_time.append(int(strategy.dwell_time*element["energy"]))
-    bp = obp.Beamparameters(strategy.spot_size, strategy.power)
-    return [obp.TimedPoints(points, dwell_time, bp)]
\ No newline at end of file
+    # Subgrid by subgrid (every x_jump:th row and y_jump:th column), each one row by row
+    rows, cols, energy = pattern.active()
+    subgrid = (rows % x_jump) * y_jump + cols % y_jump
+    order = np.lexsort((cols, rows, subgrid))
+    x, y = pattern.coordinates(rows[order], cols[order])
+    return ScanPath.spots(x*1000, y*1000, (strategy.dwell_time*energy[order]).astype(np.int64),
+                          strategy.spot_size, strategy.power)
+
+def dispersed_order(x, y, min_distance: float, rng: np.random.Generator):
+    """
+    Random order of the points (x, y) where consecutive points are at least min_distance apart.
+
+    The points are hashed into square cells of min_distance. Every round takes one random point from each cell,
+    visiting the cells class by class, where a class is the cells with the same (column % 2, row % 2): two cells
+    of a class are never neighbours, so their points are at least min_distance apart. The few points at the
+    boundaries between classes and rounds are repaired locally afterwards. When the remaining points do not
+    allow it (e.g. the last points of a layer all lie in one cell) the separation can not be kept.
+    """
+    n = len(x)
+    if n < 2:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    cell_x = np.floor((x - x.min()) / min_distance).astype(np.int64)
+    cell_y = np.floor((y - y.min()) / min_distance).astype(np.int64)
+    _, cell = np.unique(cell_x * (cell_y.max() + 1) + cell_y, return_inverse=True)
+    cell_class = (cell_x % 2) * 2 + cell_y % 2
+
+    # Round of every point: its random rank within the cell
+    shuffled = rng.permutation(n)
+    by_cell = shuffled[np.argsort(cell[shuffled], kind="stable")]
+    cell_start = np.searchsorted(cell[by_cell], cell[by_cell])
+    point_round = np.empty(n, dtype=np.int64)
+    point_round[by_cell] = np.arange(n) - cell_start
+
+    # Random order of the classes in every round and of the cells in a class, different for every round
+    rounds = point_round.max() + 1
+    class_key = rng.random((rounds, 4))[point_round, cell_class]
+    cell_key = (rng.random(cell.max() + 1)[cell] + point_round * 0.6180339887498949) % 1.0
+    order = np.lexsort((cell_key, class_key, point_round))
+    return _repair_separation(x, y, order, min_distance)
+
+def _repair_separation(x, y, order, min_distance: float, search: int = 64):
+    # Swap the second point of every too close pair with a later point that is far enough from its new neighbours
+    def far(a, b):
+        return np.hypot(x[a] - x[b], y[a] - y[b]) >= min_distance
+
+    n = len(order)
+    close = np.flatnonzero(np.hypot(np.diff(x[order]), np.diff(y[order])) < min_distance)
+    for i in close.tolist():
+        if far(order[i], order[i + 1]):
+            continue  # fixed by an earlier swap
+        for j in range(i + 2, min(i + 2 + search, n)):
+            moved, candidate = order[i + 1], order[j]
+            if j == i + 2:
+                fits = far(order[i], candidate) and far(candidate, moved)
+            else:
+                fits = far(order[i], candidate) and far(candidate, order[i + 2]) and far(order[j - 1], moved)
+            if fits and (j + 1 >= n or far(moved, order[j + 1])):
+                order[i + 1], order[j] = candidate, moved
+                break
+    return order
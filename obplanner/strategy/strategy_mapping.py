@@ -8,3 +8,6 @@ sort_function_map = {
     'LineConcentric' : line_sorting.LineConcentric,
     'ContourLine': contour_sorting.ContourLine
 }
+
+# Strategies that can scan hatch patterns, whose rows hold (start, end, gap) segments instead of grid points
+hatch_strategies = ('LineSort', 'LineSnake')
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+import py3mf_slicer.load
+import py3mf_slicer.slice
+
+from obplanner.model.pattern import PatternSettings
+from obplanner.model.strategies import Strategy
+from obplanner.pattern.grid_cache import grid_cache
+from obplanner.pattern.layer_cache import layer_cache
+
+GEOMETRIES = [os.path.join(os.path.dirname(__file__), "geometries", f"test_geometry{i}.stl") for i in (1, 2, 3)]
+COMPONENTS = [0, 1, 2]
+
+
+@pytest.fixture(scope="session")
+def model():
+    return py3mf_slicer.load.load_files(GEOMETRIES)
+
+
+@pytest.fixture(scope="session")
+def sliced_model(model):
+    return py3mf_slicer.slice.slice_model(model, 1.0)
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    # Every test starts without the slices, unions and grids of an earlier one
+    layer_cache.clear()
+    grid_cache.clear()
+    yield
+
+
+def make_strategy(name: str, pattern: PatternSettings = None, settings: dict = None, geometry=None) -> Strategy:
+    return Strategy(geometry=list(COMPONENTS if geometry is None else geometry),
+                    pattern=pattern or PatternSettings(point_distance=0.5), strategy=name, power=660, spot_size=150,
+                    speed=100000, dwell_time=10000, settings=settings or {})
+
+
+def read_build(obf_path: str) -> dict:
+    """buildInfo.json and the layer files of an OBF directory, by path relative to it."""
+    files = {}
+    for name in ["buildInfo.json"] + [f"obp/{name}" for name in sorted(os.listdir(f"{obf_path}/obp"))]:
+        with open(f"{obf_path}/{name}", "rb") as f:
+            files[name] = f.read()
+    return files
@@ -0,0 +1,78 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from obplanner.model.pattern import PatternData, PatternSettings
+from obplanner.obf.obp_writer import encode_scan_path
+from obplanner.pattern.generator import generate_pattern
+from obplanner.pattern.grid_cache import GridCache
+from obplanner.strategy.generate_strategy import create_obp_elements
+
+from conftest import COMPONENTS, make_strategy
+
+
+def assert_fresh(pattern, bounds, *args, **kwargs):
+    expected = PatternData.create_empty(*bounds, *args, **kwargs)
+    assert pattern.frame == expected.frame
+    assert pattern.shape == expected.shape
+    assert np.array_equal(pattern.grid, expected.grid)
+
+
+def test_repeated_frames_are_cached():
+    cache = GridCache()
+    bounds = (-3.0, 1.0, 7.5, 4.2)
+    for _ in range(3):
+        pattern = cache.create_empty(*bounds, 0.3, "triangular", 30.0)
+        assert_fresh(pattern, bounds, 0.3, "triangular", 30.0)
+    # Kept on the second request, served on the third
+    assert (cache.info()["hits"], cache.info()["misses"], cache.info()["size"]) == (1, 2, 1)
+    pattern.grid["energy"] = 1.0
+    assert not cache.create_empty(*bounds, 0.3, "triangular", 30.0).grid["energy"].any()
+    # A shifted footprint has another lattice without anchoring
+    cache.create_empty(-2.0, 1.0, 8.5, 4.2, 0.3, "triangular", 30.0)
+    assert cache.info()["hits"] == 2
+
+
+@pytest.mark.parametrize("pattern_type", ["square", "triangular"])
+@pytest.mark.parametrize("rotation", [0.0, 67.0])
+def test_anchored_windows_are_served_from_the_cache(pattern_type, rotation):
+    cache = GridCache()
+    layers = [(-10.0, -8.0, 12.0, 9.0), (-10.0, -8.0, 12.0, 9.0), (-4.3, -2.1, 6.7, 5.9), (1.05, -7.77, 11.9, 0.3),
+              (-9.9, -7.9, 11.9, 8.9)]
+    for bounds in layers:
+        pattern = cache.create_empty(*bounds, 0.25, pattern_type, rotation, anchored=True)
+        assert_fresh(pattern, bounds, 0.25, pattern_type, rotation, anchored=True)
+    # The shifted and smaller layers are windows of the grid of the first one
+    assert (cache.info()["hits"], cache.info()["misses"]) == (3, 2)
+
+
+def test_anchored_grid_grows_to_cover_the_layers():
+    cache = GridCache()
+    left, right = (0.0, 0.0, 5.0, 5.0), (20.0, 3.0, 26.0, 9.0)
+    for bounds in (left, left, right, left, right):
+        pattern = cache.create_empty(*bounds, 0.5, "triangular", 45.0, anchored=True)
+        assert_fresh(pattern, bounds, 0.5, "triangular", 45.0, anchored=True)
+    assert (cache.info()["hits"], cache.info()["misses"], cache.info()["size"]) == (2, 3, 1)
+    # Without room for the grid over both, the cache keeps the grid of the last layer
+    small = GridCache(max_bytes=PatternData.create_empty(*right, 0.5, anchored=True).grid.nbytes)
+    for bounds in (left, left, right, right):
+        assert_fresh(small.create_empty(*bounds, 0.5, anchored=True), bounds, 0.5, anchored=True)
+    assert (small.info()["hits"], small.info()["misses"]) == (1, 3)
+    assert small.info()["bytes"] <= small.info()["max_bytes"]
+
+
+@pytest.mark.parametrize("name", ["LineSort", "SpotOrdered", "LineConcentric"])
+def test_anchored_patterns(sliced_model, name):
+    # Sparse and island patterns of anchored grids give the output of the dense grid served from the cache
+    settings = PatternSettings(point_distance=0.5, type="triangular", layer_rotation=90.0, anchored=True)
+    strategy = make_strategy(name, settings, {"line_distance": 1.0} if name == "LineConcentric" else None)
+    for layer in range(0, 24, 4):
+        dense = generate_pattern(sliced_model, layer, COMPONENTS, settings)
+        assert dense.frame.cx == dense.frame.cy == 0.0 and dense.frame.row0 % 2 == 0
+        path = encode_scan_path(create_obp_elements(dense, strategy))
+        others = [replace(settings, islands=True)] + ([replace(settings, sparse=True)] if name != "LineConcentric"
+                                                       else [])
+        for other in others:
+            assert encode_scan_path(create_obp_elements(generate_pattern(sliced_model, layer, COMPONENTS, other),
+                                                        strategy)) == path
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon, box
+
+from obplanner.model.pattern import PatternSettings
+from obplanner.pattern.hatching import hatch_pattern
+from obplanner.strategy.generate_strategy import create_obp_elements
+
+from conftest import make_strategy
+
+# A plate with a hole, every scanline through the hole has two segments
+geometry = Polygon(box(0, 0, 10, 6).exterior, [box(3, 2, 7, 4).exterior])
+hatch = PatternSettings(point_distance=0.5, type="hatch")
+
+
+@pytest.mark.parametrize("name", ["LineSort", "LineSnake"])
+def test_line_strategies_scan_the_segments(name):
+    path = create_obp_elements(hatch_pattern(geometry, 0.5), make_strategy(name, hatch))
+    # Scanlines 0.5 mm apart from y = 0 to 5.5 (the edges are half open in y), the four through the hole
+    # (y = 2 to 3.5) are cut in two
+    assert len(path) == 12 + 4
+    assert np.array_equal(path.y0, path.y1)
+    ends = shapely.points(np.concatenate((path.x0, path.x1)) / 1000, np.concatenate((path.y0, path.y1)) / 1000)
+    assert shapely.distance(geometry.boundary, ends).max() < 1e-3
+    line_length = np.abs(path.x1 - path.x0).sum() / 1000
+    assert line_length == pytest.approx(12 * 10 - 4 * 4, abs=0.01)
+
+
+@pytest.mark.parametrize("name", ["SpotRandom", "SpotOrdered", "LineConcentric", "ContourLine"])
+def test_other_strategies_reject_hatch_patterns(name):
+    with pytest.raises(ValueError, match="Hatch patterns"):
+        create_obp_elements(hatch_pattern(geometry, 0.5), make_strategy(name, hatch))
@@ -0,0 +1,82 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from obplanner.model.pattern import IslandPatternData, PatternData, PatternSettings
+from obplanner.obf.obp_writer import encode_scan_path
+from obplanner.pattern import islands
+from obplanner.pattern.generator import generate_pattern
+from obplanner.pattern.islands import island_pattern
+from obplanner.strategy.generate_strategy import create_obp_elements
+
+from conftest import COMPONENTS, make_strategy
+
+# Separate parts: rings, a part in the hole of a ring and parts of a few points
+geometry = MultiPolygon([
+    Polygon(shapely.Point(0, 0).buffer(6, 48).exterior, [shapely.Point(0, 0).buffer(3, 32).exterior]),
+    box(-1, -1, 1, 1),
+    *(box(x, -9, x + 0.6, -8.2) for x in range(-8, 8, 2)),
+    Polygon([(8, 0), (14, 2), (9, 7)]),
+])
+strategies = {
+    "LineSort": {},
+    "LineSnake": {"start": 2, "jump": 3},
+    "SpotOrdered": {"x_jump": 2, "y_jump": 3},
+    "SpotRandom": {"seed": 7},
+    "LineConcentric": {"line_distance": 0.4},
+}
+
+
+def dense_pattern(settings: PatternSettings) -> PatternData:
+    pattern = PatternData.create_empty(*geometry.bounds, settings.point_distance, settings.type,
+                                       settings.start_rotation)
+    pattern.grid["energy"] = shapely.contains_xy(geometry, pattern.grid["x"], pattern.grid["y"])
+    return pattern
+
+
+@pytest.mark.parametrize("name", sorted(strategies))
+@pytest.mark.parametrize("pattern_type", ["square", "triangular"])
+@pytest.mark.parametrize("rotation", [0.0, 67.0])
+def test_islands_give_the_dense_output(name, pattern_type, rotation, monkeypatch):
+    settings = PatternSettings(point_distance=0.25, type=pattern_type, start_rotation=rotation)
+    dense = dense_pattern(settings)
+    island = island_pattern(geometry, settings.point_distance, pattern_type, rotation)
+    assert len(island.islands) == len(geometry.geoms)
+    assert isinstance(island, IslandPatternData)
+    strategy = make_strategy(name, settings, strategies[name])
+    path = create_obp_elements(dense, strategy)
+    assert len(path) > 0
+    # The strategies work island by island, without a mask of the whole grid
+    monkeypatch.setattr(IslandPatternData, "mask", None)
+    assert encode_scan_path(create_obp_elements(island, strategy)) == encode_scan_path(path)
+
+
+@pytest.mark.parametrize("name", sorted(strategies))
+def test_islands_of_sliced_layers(sliced_model, name):
+    settings = PatternSettings(point_distance=0.5, layer_rotation=67.0)
+    strategy = make_strategy(name, settings, strategies[name])
+    for layer in (0, 10, 20):
+        dense = generate_pattern(sliced_model, layer, COMPONENTS, settings)
+        island = generate_pattern(sliced_model, layer, COMPONENTS, replace(settings, islands=True))
+        assert isinstance(island, IslandPatternData) and len(island.islands) > 1
+        assert encode_scan_path(create_obp_elements(island, strategy)) == \
+            encode_scan_path(create_obp_elements(dense, strategy))
+
+
+def test_threads_are_shared():
+    serial = island_pattern(geometry, 0.25, workers=1)
+    try:
+        islands.set_threads(3)
+        threaded = island_pattern(geometry, 0.25)
+        executor = islands._executor[2]
+        assert islands._executor[1] == 3
+        island_pattern(geometry, 0.25)
+        assert islands._executor[2] is executor
+    finally:
+        islands.set_threads(None)
+    for a, b in zip(serial.islands, threaded.islands):
+        assert np.array_equal(a.grid, b.grid)
+    assert serial.origins == threaded.origins
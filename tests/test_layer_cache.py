@@ -0,0 +1,36 @@
+import pytest
+import pyvista as pv
+import shapely
+import py3mf_slicer.slice
+from py3mf_slicer.get_items import get_py3mf_from_pyvista
+
+from obplanner.pattern.layer_cache import LayerGeometryCache
+
+
+def sliced(meshes, layer_height: float = 0.5):
+    return py3mf_slicer.slice.slice_model(get_py3mf_from_pyvista(meshes), layer_height)
+
+
+@pytest.mark.parametrize("offset", [0.0, -0.2])
+def test_prism_reuses_unions(offset):
+    model = sliced([pv.Cube(center=(0, 0, 5), x_length=10, y_length=6, z_length=10),
+                    pv.Cube(center=(12, 0, 5), x_length=4, y_length=4, z_length=10)])
+    cache = LayerGeometryCache()
+    layers = 19  # the layers where both parts are sliced
+    unions = [cache.get_union(model, layer, [0, 1], offset) for layer in range(layers)]
+    assert cache.info()["reused"] == layers - 1
+    fresh = LayerGeometryCache()
+    for layer in (0, layers // 2, layers - 1):
+        slices = [s for s in fresh.get_slices(model, layer) if s is not None]
+        expected = shapely.union_all(slices)
+        if offset != 0.0:
+            expected = expected.buffer(offset)
+        assert shapely.equals(unions[layer], expected)
+
+
+def test_changing_layers_are_not_reused():
+    model = sliced([pv.Cone(center=(0, 0, 5), direction=(0, 0, 1), height=10, radius=5, resolution=40)])
+    cache = LayerGeometryCache()
+    areas = [cache.get_union(model, layer, [0], 0.0).area for layer in range(18)]
+    assert cache.info()["reused"] == 0
+    assert all(a > b for a, b in zip(areas, areas[1:]))
@@ -0,0 +1,51 @@
+import multiprocessing
+
+import pytest
+import shapely
+import py3mf_slicer.get_items
+
+from obplanner.pattern.layer_cache import number_layers
+from obplanner.pattern.layer_source import LayerSource, LazySlicedModel
+
+# Source of the forked workers, inherited from the parent process
+source = None
+
+
+def equal_slices(slices, expected) -> bool:
+    return len(slices) == len(expected) and all(
+        (a is None and b is None) or (a is not None and b is not None and shapely.equals_exact(a, b, 0.0))
+        for a, b in zip(slices, expected))
+
+
+def slices_wkb(layer: int) -> list:
+    return [None if s is None else s.wkb for s in source.get_slices(layer)]
+
+
+def test_layer_source_is_abstract():
+    with pytest.raises(TypeError):
+        LayerSource()
+
+
+@pytest.mark.parametrize("prefetch", [0, 4])
+def test_lazy_slices_match_slice_model(model, sliced_model, prefetch):
+    lazy = LazySlicedModel(model, 1.0, prefetch=prefetch, window=4)
+    assert lazy.number_layers() == number_layers(sliced_model)
+    for layer in range(max(lazy.number_layers())):
+        assert equal_slices(lazy.get_slices(layer), py3mf_slicer.get_items.get_shapely_slice(sliced_model, layer))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method")
+def test_lazy_slices_in_forked_worker(model, sliced_model):
+    global source
+    source = LazySlicedModel(model, 1.0)
+    # The parent has started its prefetch thread and holds layers before the fork
+    source.get_slices(0)
+    layers = list(range(max(source.number_layers())))
+    try:
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            forked = pool.map(slices_wkb, layers)
+    finally:
+        source = None
+    for layer, wkb in zip(layers, forked):
+        slices = [None if w is None else shapely.from_wkb(w) for w in wkb]
+        assert equal_slices(slices, py3mf_slicer.get_items.get_shapely_slice(sliced_model, layer))
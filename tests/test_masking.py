@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import shapely
+from shapely import contains_xy
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from obplanner.model.pattern import PatternData
+from obplanner.pattern.masking import mask_exact
+
+# Parts with holes, several parts, thin walls and parts with edges on the grid lines
+geometries = {
+    "ring": Polygon(shapely.Point(0, 0).buffer(10, 64).exterior, [shapely.Point(1, -1).buffer(4, 32).exterior]),
+    "plate": MultiPolygon([box(x, y, x + 3, y + 2) for x in range(-20, 20, 7) for y in range(-15, 15, 5)]),
+    "thin": shapely.Point(0, 0).buffer(8, 64).difference(shapely.Point(0, 0).buffer(7.7, 64)),
+    "aligned": MultiPolygon([box(0, 0, 5, 5), box(6, 0, 8, 10), Polygon([(0, 6), (5, 6), (0, 11)])]),
+}
+
+
+def random_polygons(seed: int, count: int = 5):
+    rng = np.random.default_rng(seed)
+    parts = [shapely.Point(rng.uniform(-15, 15, 2)).buffer(rng.uniform(0.5, 6), int(rng.integers(3, 40)))
+             for _ in range(count)]
+    return shapely.union_all(parts)
+
+
+@pytest.mark.parametrize("name", sorted(geometries))
+@pytest.mark.parametrize("rotation", [0.0, 30.0, 67.0, 90.0, 180.0, 211.0])
+@pytest.mark.parametrize("pattern_type", ["square", "triangular"])
+@pytest.mark.parametrize("tile_size", [1, 3, 32])
+def test_mask_exact_matches_contains_xy(name, rotation, pattern_type, tile_size):
+    geometry = geometries[name]
+    pattern = PatternData.create_empty(*geometry.bounds, 0.25, pattern_type, rotation)
+    x, y = pattern.grid["x"], pattern.grid["y"]
+    expected = contains_xy(geometry, x, y)
+    assert np.array_equal(mask_exact(x, y, geometry, tile_size), expected)
+
+
+@pytest.mark.parametrize("tile_size", [1, 3, 32])
+@pytest.mark.parametrize("offset", [0.0, 0.5, 1e-7])
+def test_mask_exact_boundary_aligned_grid(tile_size, offset):
+    # Grid points lying exactly on the edges and corners of the parts (or just next to them)
+    geometry = geometries["aligned"]
+    x, y = np.meshgrid(np.arange(-1, 12, 0.5) + offset, np.arange(-1, 12, 0.5))
+    expected = contains_xy(geometry, x, y)
+    assert np.array_equal(mask_exact(x, y, geometry, tile_size), expected)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("tile_size", [1, 3, 32])
+def test_mask_exact_random_parts(seed, tile_size):
+    geometry = random_polygons(seed)
+    rotation = float(np.random.default_rng(seed).uniform(0, 360))
+    pattern = PatternData.create_empty(*geometry.bounds, 0.3, "square", rotation)
+    x, y = pattern.grid["x"], pattern.grid["y"]
+    assert np.array_equal(mask_exact(x, y, geometry, tile_size), contains_xy(geometry, x, y))
+
+
+def test_mask_exact_empty():
+    x, y = np.meshgrid(np.arange(5.0), np.arange(4.0))
+    assert not mask_exact(x, y, shapely.GeometryCollection()).any()
+    assert mask_exact(x[:0], y[:0], geometries["ring"]).shape == (0, 5)
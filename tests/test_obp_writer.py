@@ -0,0 +1,90 @@
+import gzip
+
+import numpy as np
+import obplib as obp
+import pytest
+
+from obplanner.model.scan_path import ScanPath
+from obplanner.obf import obp_writer
+
+
+def lines(n: int, seed: int = 0) -> ScanPath:
+    # Negative, zero and large coordinates, speeds of 0 (left out of the packet) and changing beam parameters
+    rng = np.random.default_rng(seed)
+    x0, y0, x1, y1 = rng.integers(-60000, 60000, (4, n))
+    x0[::7] = 0
+    speed = rng.integers(0, 2 ** 32, n, dtype=np.uint64)
+    speed[::5] = 0
+    spot_size = rng.choice([0.0, 150.0, 212.5], n)
+    power = rng.choice([0.0, 660.0, 1234.5], n)
+    return ScanPath.lines(x0, y0, x1, y1, speed, spot_size, power)
+
+def spots(n: int, seed: int = 0, spot_size: float = 150.0, power: float = 660.0) -> ScanPath:
+    # Runs of equal dwell times, only the changes are written
+    rng = np.random.default_rng(seed)
+    x, y = rng.integers(-60000, 60000, (2, n))
+    dwell_time = np.repeat(rng.integers(0, 100000, n // 3 + 1), 3)[:n]
+    return ScanPath.spots(x, y, dwell_time, spot_size, power)
+
+def curves() -> list:
+    bp = obp.Beamparameters(150.0, 660.0)
+    p = [obp.Point(-1000, 0), obp.Point(0, 2000), obp.Point(3000, -500), obp.Point(4000, 0)]
+    return [obp.Curve(*p, 120000, bp), obp.AcceleratingLine(p[0], p[3], 1000, 90000, bp),
+            obp.AcceleratingCurve(*p, 1000, 90000, bp)]
+
+def obplib_objects(elements) -> list:
+    objects = []
+    for element in elements:
+        objects.extend(element.to_obp() if isinstance(element, ScanPath) else [element])
+    return objects
+
+def written(elements, path, compress=None) -> bytes:
+    obp_writer.write_obp(elements, path, compress)
+    with open(path, "rb") as f:
+        return f.read()
+
+def obplib_bytes(elements, path) -> bytes:
+    obp.write_obp(obplib_objects(elements), path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+cases = {
+    "lines": lambda: [lines(500)],
+    "spots": lambda: [spots(500)],
+    "spot blocks": lambda: [ScanPath.concatenate([spots(10, 1), spots(10, 2, power=0.0),
+                                                  spots(10, 3, spot_size=212.5)])],
+    "sync": lambda: [ScanPath.sync("BeamPowerOn", True, 0.0), ScanPath.sync("Exposure", False, 12.5)],
+    "mixed": lambda: [ScanPath.concatenate([ScanPath.sync("BeamPowerOn", True, 1.0), lines(50), spots(20),
+                                            ScanPath.sync("BeamPowerOn", False, 0.0), spots(20, 1), lines(30, 1)])],
+    "obplib objects": lambda: [lines(10), *curves(), spots(10), obp.SyncPoint("Exposure", True, 3.0)],
+    "empty": lambda: [ScanPath.empty()],
+}
+
+
+@pytest.mark.parametrize("name", sorted(cases))
+def test_write_obp_matches_obplib(name, tmp_path):
+    elements = cases[name]()
+    expected = obplib_bytes(elements, tmp_path / "obplib.obp")
+    assert written(iter(elements), tmp_path / "path.obp") == expected
+    if len(elements) == 1:
+        assert written(elements[0], tmp_path / "single.obp") == expected
+
+
+@pytest.mark.parametrize("name", ["mixed", "obplib objects"])
+def test_write_obp_gzip(name, tmp_path):
+    elements = cases[name]()
+    expected = obplib_bytes(elements, tmp_path / "obplib.obp")
+    for file_name, compress in (("path.obp.gz", None), ("path.obp", True)):
+        data = written(elements, tmp_path / file_name, compress)
+        assert data[:2] == b"\x1f\x8b"
+        assert gzip.decompress(data) == expected
+    assert written(elements, tmp_path / "plain.obp.gz", compress=False) == expected
+
+
+@pytest.mark.parametrize("make", [lines, spots])
+def test_write_obp_more_than_a_chunk(make, tmp_path):
+    # The elements are encoded in several chunks, the spots still form a single TimedPoints packet
+    path = make(obp_writer.CHUNK_SIZE + 1234)
+    assert len(list(obp_writer.iter_scan_path(path))) > 1
+    assert written(path, tmp_path / "path.obp") == obplib_bytes([path], tmp_path / "obplib.obp")
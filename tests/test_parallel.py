@@ -0,0 +1,32 @@
+import multiprocessing as mp
+
+import pytest
+
+from obplanner.main import prepare_build
+from obplanner.model.build import Build
+from obplanner.model.layer_default import LayerStrategies
+from obplanner.model.pattern import PatternSettings
+
+from conftest import make_strategy, read_build
+
+
+def layer_strategies() -> LayerStrategies:
+    return LayerStrategies(
+        melt=[make_strategy("LineSort", PatternSettings(point_distance=0.5, layer_rotation=67.0)),
+              make_strategy("LineSnake", PatternSettings(point_distance=0.5, type="triangular"), {"start": 2, "jump": 3}),
+              make_strategy("SpotRandom", settings={"seed": 3}),
+              make_strategy("ContourLine", PatternSettings(point_distance=0.5, type="contour"))],
+        heat_balance=[make_strategy("SpotOrdered", PatternSettings(point_distance=1.0), {"x_jump": 2, "y_jump": 3})])
+
+
+@pytest.mark.skipif("fork" not in mp.get_all_start_methods(), reason="parallel layers need fork")
+@pytest.mark.parametrize("deduplicate", [False, True])
+def test_parallel_build_is_identical(sliced_model, tmp_path, deduplicate):
+    build = Build(layer_strategies=layer_strategies())
+    serial = prepare_build(build, sliced_model, str(tmp_path / "serial"), workers=1, deduplicate=deduplicate)
+    parallel = prepare_build(build, sliced_model, str(tmp_path / "parallel"), workers=2, deduplicate=deduplicate)
+    serial_files, parallel_files = read_build(serial), read_build(parallel)
+    assert len(serial_files) > 1
+    assert serial_files.keys() == parallel_files.keys()
+    for name, data in serial_files.items():
+        assert parallel_files[name] == data, name
@@ -0,0 +1,28 @@
+import json
+import tracemalloc
+
+import pytest
+
+from obplanner.main import prepare_build
+from obplanner.model.build import Build
+from obplanner.model.layer_default import LayerStrategies
+from obplanner.obf.build_profile import PROFILE_NAME, STAGES
+
+from conftest import make_strategy
+
+
+@pytest.mark.parametrize("profile_memory", [False, True])
+def test_memory_is_only_traced_on_request(sliced_model, tmp_path, profile_memory):
+    build = Build(layer_strategies=LayerStrategies(melt=[make_strategy("LineSort")], heat_balance=[]))
+    obf_path = prepare_build(build, sliced_model, str(tmp_path), profile=not profile_memory,
+                             profile_memory=profile_memory)
+    assert not tracemalloc.is_tracing()
+    with open(f"{obf_path}/{PROFILE_NAME}") as f:
+        records = json.load(f)["files"]
+    assert len(records) == 24
+    assert all(record["total"] > 0 and record["elements"] > 0 for record in records)
+    peaks = [record[f"{name}_peak_kb"] for record in records for name in STAGES]
+    if profile_memory:
+        assert all(record["peak_kb"] > 0 for record in records)
+    else:
+        assert not any(peaks)
@@ -0,0 +1,116 @@
+import numpy as np
+import obplib as obp
+import pytest
+
+from obplanner.model.scan_path import LINE, SPOT, SYNC, ScanPath
+
+
+def mixed_path() -> ScanPath:
+    return ScanPath.concatenate([
+        ScanPath.sync("BeamPowerOn", True, 1.0),
+        ScanPath.lines([0, 3000], [0, 0], [3000, 3000], [0, 4000], 1000, 150.0, 600.0),
+        ScanPath.spots([100, 200, 300], [-100, -200, -300], [10, 10, 20], 150.0, 600.0),
+        ScanPath.spots([400], [-400], [30], 150.0, 300.0),
+        ScanPath.sync("BeamPowerOn", False, 0.0),
+    ])
+
+
+def test_to_um_rounds_to_nearest():
+    path = ScanPath.lines([0.4, 0.5, 1.5, -0.5, -1.6, 2.49999], [0.0] * 6, [1.0] * 6, [0.0] * 6, 1, 1.0, 1.0)
+    assert path.x0.tolist() == [0, 0, 2, 0, -2, 2]
+    assert path.x0.dtype == np.int32
+    spots = ScanPath.spots([999.5, 1000.5], [-0.51, 0.49], [1, 2], 1.0, 1.0)
+    assert spots.x0.tolist() == spots.x1.tolist() == [1000, 1000]
+    assert spots.y0.tolist() == spots.y1.tolist() == [-1, 0]
+
+
+def test_constructors_broadcast_scalars():
+    path = ScanPath.lines([0, 1], [0, 1], [1, 2], [1, 2], 500, [150.0, 200.0], 660.0)
+    assert path.kind.tolist() == [LINE, LINE]
+    assert path.speed.tolist() == [500, 500]
+    assert path.spot_size.tolist() == [150.0, 200.0]
+    assert path.power.tolist() == [660.0, 660.0]
+    assert path.marker.tolist() == [-1, -1]
+    assert path.dwell_time.tolist() == [0, 0]
+    assert len(ScanPath.empty()) == 0
+
+
+def test_concatenate_renumbers_sync_points():
+    path = mixed_path()
+    assert path.kind.tolist() == [SYNC, LINE, LINE, SPOT, SPOT, SPOT, SPOT, SYNC]
+    assert path.sync_points == [("BeamPowerOn", True, 1.0), ("BeamPowerOn", False, 0.0)]
+    assert path.marker.tolist() == [0, -1, -1, -1, -1, -1, -1, 1]
+    assert path.marker.dtype == np.int32
+    twice = ScanPath.concatenate([path, None, path])
+    assert len(twice) == 2 * len(path)
+    assert twice.marker[twice.kind == SYNC].tolist() == [0, 1, 2, 3]
+    assert twice.sync_points == path.sync_points * 2
+    assert len(ScanPath.concatenate([])) == len(ScanPath.concatenate([None])) == 0
+
+
+def test_take_reorders_and_filters():
+    path = mixed_path()
+    reversed_path = path.take(np.arange(len(path))[::-1])
+    assert reversed_path.kind.tolist() == path.kind.tolist()[::-1]
+    assert reversed_path.x0.tolist() == path.x0.tolist()[::-1]
+    assert reversed_path.marker.tolist() == path.marker.tolist()[::-1]
+    assert reversed_path.sync_points == path.sync_points
+    assert reversed_path.sync_points is not path.sync_points
+    lines = path.take(path.kind == LINE)
+    assert lines.kind.tolist() == [LINE, LINE]
+    assert lines.x1.tolist() == [3000, 3000]
+
+
+def test_bounds():
+    assert mixed_path().bounds() == (0, -400, 3000, 4000)
+    assert ScanPath.lines([-5], [7], [-9], [2], 1, 1.0, 1.0).bounds() == (-9, 2, -5, 7)
+    assert ScanPath.sync("Exposure", True, 0.0).bounds() is None
+    assert ScanPath.empty().bounds() is None
+
+
+def test_stats():
+    path = ScanPath.concatenate([
+        ScanPath.lines([0, 3000], [0, 0], [3000, 3000], [0, 4000], [1000, 0], 150.0, [600.0, 100.0]),
+        ScanPath.sync("BeamPowerOn", True, 1.0),
+        ScanPath.spots([6000, 6000], [4000, 8000], [1000000, 3000000], 150.0, 300.0),
+    ])
+    stats = path.stats()
+    assert stats["lines"] == 2
+    assert stats["spots"] == 2
+    assert stats["line_length"] == pytest.approx(7.0)
+    # The jumps from the end of a line or spot to the start of the next one, sync points are left out
+    assert stats["jump_length"] == pytest.approx(3.0 + 4.0)
+    # A line with a speed of 0 has no beam time
+    assert stats["beam_time"] == pytest.approx(3.0 + 0.004)
+    assert stats["energy"] == pytest.approx(600.0 * 3.0 + 300.0 * 0.004)
+    assert ScanPath.empty().stats() == {"spots": 0, "lines": 0, "line_length": 0.0, "jump_length": 0.0,
+                                        "beam_time": 0.0, "energy": 0.0}
+
+
+def test_blocks():
+    # Spots are split where the beam parameters change and every sync point is a block of its own
+    path = ScanPath.concatenate([mixed_path(), ScanPath.sync("Exposure", True, 0.0),
+                                 ScanPath.sync("Exposure", False, 0.0)])
+    assert path.blocks() == [(SYNC, 0, 1), (LINE, 1, 3), (SPOT, 3, 6), (SPOT, 6, 7), (SYNC, 7, 8), (SYNC, 8, 9),
+                             (SYNC, 9, 10)]
+    spot_sizes = ScanPath.spots([0, 1, 2], [0, 0, 0], 10, [150.0, 150.0, 200.0], 660.0)
+    assert spot_sizes.blocks() == [(SPOT, 0, 2), (SPOT, 2, 3)]
+    assert ScanPath.empty().blocks() == []
+
+
+def test_to_obp():
+    objects = mixed_path().to_obp()
+    assert [type(o) for o in objects] == [obp.SyncPoint, obp.Line, obp.Line, obp.TimedPoints, obp.TimedPoints,
+                                          obp.SyncPoint]
+    first, last = objects[0], objects[-1]
+    assert (first.endpoint, first.value, first.duration) == ("BeamPowerOn", True, 1.0)
+    assert (last.endpoint, last.value, last.duration) == ("BeamPowerOn", False, 0.0)
+    line = objects[2]
+    assert (line.P1.x, line.P1.y, line.P2.x, line.P2.y, line.Speed) == (3000, 0, 3000, 4000, 1000)
+    assert type(line.P1.x) is int and type(line.Speed) is int
+    assert (line.bp.spot_size, line.bp.power) == (150.0, 600.0)
+    points = objects[3]
+    assert [(p.x, p.y) for p in points.points] == [(100, -100), (200, -200), (300, -300)]
+    assert list(points.dwellTimes) == [10, 10, 20]
+    assert objects[4].bp.power == 300.0
+    assert ScanPath.empty().to_obp() == []
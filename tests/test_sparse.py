@@ -0,0 +1,74 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from obplanner.model.pattern import PatternData, PatternSettings, SparsePatternData
+from obplanner.obf.obp_writer import encode_scan_path
+from obplanner.pattern.generator import generate_pattern
+from obplanner.pattern.sparse import sparse_pattern
+from obplanner.strategy.generate_strategy import create_obp_elements
+
+from conftest import COMPONENTS, make_strategy
+
+# A lattice of thin walls around a ring with a hole, most points of the bounding box lie outside
+geometry = shapely.union_all([
+    *(box(x, -10, x + 0.4, 10) for x in range(-10, 11, 4)),
+    *(box(-10, y, 10.4, y + 0.4) for y in range(-10, 11, 5)),
+    Polygon(shapely.Point(20, 0).buffer(6, 48).exterior, [shapely.Point(20, 0).buffer(3, 32).exterior]),
+])
+strategies = {
+    "LineSort": {},
+    "LineSnake": {"start": 2, "jump": 3},
+    "SpotOrdered": {"x_jump": 2, "y_jump": 3},
+    "SpotRandom": {"seed": 7},
+}
+
+
+def dense_pattern(settings: PatternSettings) -> PatternData:
+    pattern = PatternData.create_empty(*geometry.bounds, settings.point_distance, settings.type,
+                                       settings.start_rotation)
+    pattern.grid["energy"] = shapely.contains_xy(geometry, pattern.grid["x"], pattern.grid["y"])
+    return pattern
+
+
+@pytest.mark.parametrize("name", sorted(strategies))
+@pytest.mark.parametrize("pattern_type", ["square", "triangular"])
+@pytest.mark.parametrize("rotation", [0.0, 45.0, 67.0])
+def test_sparse_gives_the_dense_output(name, pattern_type, rotation):
+    settings = PatternSettings(point_distance=0.2, type=pattern_type, start_rotation=rotation)
+    dense = dense_pattern(settings)
+    sparse = sparse_pattern(geometry, settings.point_distance, pattern_type, rotation)
+    assert sparse.count_active() == dense.count_active()
+    # Most points of the bounding box are never stored
+    assert sparse.count_active() < 0.3 * np.prod(dense.shape)
+    strategy = make_strategy(name, settings, strategies[name])
+    path = create_obp_elements(dense, strategy)
+    assert len(path) > 0
+    assert encode_scan_path(create_obp_elements(sparse, strategy)) == encode_scan_path(path)
+
+
+@pytest.mark.parametrize("name", sorted(strategies))
+def test_sparse_sliced_layers(sliced_model, name):
+    settings = PatternSettings(point_distance=0.5, layer_rotation=67.0)
+    strategy = make_strategy(name, settings, strategies[name])
+    for layer in (0, 10, 20):
+        dense = generate_pattern(sliced_model, layer, COMPONENTS, settings)
+        sparse = generate_pattern(sliced_model, layer, COMPONENTS, replace(settings, sparse=True))
+        assert isinstance(sparse, SparsePatternData)
+        assert encode_scan_path(create_obp_elements(sparse, strategy)) == \
+            encode_scan_path(create_obp_elements(dense, strategy))
+
+
+def test_sparse_rows_without_points():
+    # Parts far apart leave most rows of the frame without points
+    parts = MultiPolygon([box(0, 0, 1, 1), box(0.5, 30, 1.5, 31)])
+    dense = PatternData.create_empty(*parts.bounds, 0.25)
+    dense.grid["energy"] = shapely.contains_xy(parts, dense.grid["x"], dense.grid["y"])
+    sparse = sparse_pattern(parts, 0.25)
+    assert sparse.count_active() == dense.count_active()
+    strategy = make_strategy("LineSnake", PatternSettings(point_distance=0.25), {"start": 1, "jump": 2})
+    assert encode_scan_path(create_obp_elements(sparse, strategy)) == \
+        encode_scan_path(create_obp_elements(dense, strategy))
@@ -0,0 +1,37 @@
+import numpy as np
+import pyvista as pv
+import py3mf_slicer.slice
+from py3mf_slicer.get_items import get_bounding_boxes, get_py3mf_from_pyvista
+
+from obplanner.main import prepare_build, update_build
+from obplanner.model.build import Build
+from obplanner.model.layer_default import LayerStrategies
+from obplanner.pattern.layer_cache import model_fingerprint
+
+from conftest import make_strategy, read_build
+
+
+def prism(corners, height: float = 5.0):
+    points = np.array([[x, y, 0.0] for x, y in corners])
+    return pv.PolyData(points, faces=[3, 0, 1, 2]).extrude((0, 0, height), capping=True).triangulate()
+
+def sliced(meshes):
+    return py3mf_slicer.slice.slice_model(get_py3mf_from_pyvista(meshes), 1.0)
+
+
+def test_update_regenerates_moved_geometry(tmp_path):
+    # The triangles are mirrored within their bounding boxes: same boxes, slice heights and vertex counts
+    before = sliced([prism([(0, 0), (10, 0), (0, 10)]), prism([(20, 0), (30, 0), (30, 10)])])
+    after = sliced([prism([(0, 0), (10, 0), (10, 10)]), prism([(20, 0), (30, 0), (20, 10)])])
+    assert get_bounding_boxes(before) == get_bounding_boxes(after)
+    assert model_fingerprint(before) != model_fingerprint(after)
+
+    build = Build(layer_strategies=LayerStrategies(melt=[make_strategy("LineSort", geometry=[0, 1])],
+                                                   heat_balance=[]))
+    obf_path = prepare_build(build, before, str(tmp_path / "build"), manifest=True)
+    old_files = read_build(obf_path)
+    update_build(build, after, obf_path)
+    expected = read_build(prepare_build(build, after, str(tmp_path / "fresh")))
+    updated = read_build(obf_path)
+    assert updated == expected
+    assert all(updated[name] != old_files[name] for name in updated if name.endswith(".obp"))